@@ -0,0 +1,49 @@
+"""pip-toolbox: Python 软件包管理工具。
+
+子模块在首次访问时才加载；``import pip_toolbox`` 不会导入 tkinter，也不会创建任何窗口。
+图形界面只在 ``pip_toolbox.main.main()`` 中构建。
+"""
+import importlib
+
+# 公开名称 -> 所在子模块
+_LAZY_ATTRS = {
+    "Environment": "environments",
+    "EnvironmentRegistry": "environments",
+    "InventoryScanner": "inventory",
+    "get_installed_packages": "inventory",
+    "scan_installed": "inventory",
+    "cached_versions": "lookup",
+    "create_check_scheduler": "lookup",
+    "get_index_url": "lookup",
+    "get_latest_version": "lookup",
+    "iter_update_checks": "lookup",
+    "lookup_versions": "lookup",
+    "VersionCache": "version_cache",
+    "VersionDiskCache": "disk_cache",
+    "SimpleIndexClient": "index_client",
+    "LookupScheduler": "scheduler",
+    "run_pip_command": "installer",
+    "update_packages": "installer",
+    "update_packages_batched": "installer",
+}
+
+_SUBMODULES = {"bench", "checkpoints", "cli", "config", "depgraph", "disk_cache", "environments", "hedging", "index_client", "installer",
+               "inventory", "log_stream", "lookup", "main", "mirrors", "preflight", "resilience", "scheduler", "search_index", "snapshots", "speculative",
+               "table_view", "tracing", "ui_events", "version_cache", "versions", "wheelhouse"}
+
+__all__ = sorted(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(f"{__name__}.{_LAZY_ATTRS[name]}")
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | _SUBMODULES)
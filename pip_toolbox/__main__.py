@@ -0,0 +1,4 @@
+from pip_toolbox.cli import main
+import sys
+
+sys.exit(main())
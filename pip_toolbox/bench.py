@@ -0,0 +1,685 @@
+"""性能检查工具。
+
+    python -m pip_toolbox.bench import-time    检查各模块的导入耗时预算
+    python -m pip_toolbox.bench table          测量包表格在 1k/10k/50k 行时的渲染耗时与内存 (需要图形显示)
+    python -m pip_toolbox.bench search         测量逐键输入时的搜索延迟 (需低于一帧)
+    python -m pip_toolbox.bench suite          离线基准套件：合成 site-packages + 本地模拟索引，结果保存为 JSON
+    python -m pip_toolbox.bench mirrors        用几个延迟/同步状态不同的本地模拟镜像验证测速选源的排名
+    python -m pip_toolbox.bench hedge          主索引有长尾延迟时，比较只用主索引与启用对冲查询的检查耗时
+    python -m pip_toolbox.bench speculative    比较关闭/开启推测预取时，滚动后点击一行到取得版本列表的延迟
+
+基准套件不访问网络：它在临时目录中生成 N 个假的 dist-info，并在 127.0.0.1 上启动一个可设置延迟和版本数量的
+Simple API (PEP 691 JSON) 模拟索引，然后测量列出已安装包、搜索、检查更新和表格渲染的吞吐量与延迟。
+用 --output 保存结果，用 --baseline 与之前保存的结果比较。
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 导入耗时预算 (秒，在全新解释器中测得的累计导入时间) ---
+IMPORT_BUDGETS = {
+    "pip_toolbox": 0.02,
+    "pip_toolbox.inventory": 0.10,
+    "pip_toolbox.lookup": 0.20,
+    "pip_toolbox.installer": 0.10,
+    "pip_toolbox.main": 0.50,
+}
+# 无界面核心模块不能导入 tkinter
+HEADLESS_MODULES = ("pip_toolbox", "pip_toolbox.inventory", "pip_toolbox.lookup", "pip_toolbox.installer")
+# 表格基准的行数与实现 ("virtual" = VirtualTreeview，"full" = 旧的每个包插入一行)
+TABLE_SIZES = (1000, 10000, 50000)
+TABLE_MODES = ("virtual", "full")
+# 搜索基准：逐字符输入这些查询，每次按键 (搜索 + 更新表格数据) 需在一帧内完成
+SEARCH_SIZES = (1000, 5000, 10000)
+SEARCH_QUERIES = ("requests", "py_test", "django-rest", "zzz")
+FUZZY_QUERIES = ("rqsts",)
+FRAME_SECONDS = 1 / 60
+_NAME_PARTS = ("py", "django", "flask", "requests", "test", "data", "json", "http", "async", "lib",
+               "tools", "core", "utils", "client", "api", "rest", "plugin", "types", "cli", "sdk")
+
+
+def measure_import_time(module, repeat=3):
+    """在全新解释器中用 -X importtime 测量模块的累计导入时间 (秒)，取多次中的最小值。"""
+    best = None
+    pattern = re.compile(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*" + re.escape(module) + r"\s*$")
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            m = pattern.match(line)
+            if m:
+                seconds = int(m.group(1)) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def check_headless(module):
+    """导入模块后确认没有创建 Tk 窗口；核心模块还不能导入 tkinter。返回问题描述或 None。"""
+    code = (f"import sys, {module}\n"
+            "tk = sys.modules.get('tkinter')\n"
+            "print('tkinter' if tk else '-', 'root' if tk and tk._default_root else '-')")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return f"导入失败: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}"
+    imported_tk, created_root = result.stdout.split()
+    if created_root == "root":
+        return "导入时创建了 Tk 窗口"
+    if module in HEADLESS_MODULES and imported_tk == "tkinter":
+        return "导入了 tkinter"
+    return None
+
+
+def check_import_budget(budgets=IMPORT_BUDGETS):
+    """返回 [(模块, 耗时, 预算, 问题)]；问题为 None 表示通过。"""
+    results = []
+    for module, budget in budgets.items():
+        problem = check_headless(module)
+        seconds = measure_import_time(module) if problem is None else None
+        if problem is None and seconds is not None and seconds > budget:
+            problem = f"超出预算 {budget * 1000:.0f}毫秒"
+        results.append((module, seconds, budget, problem))
+    return results
+
+
+def run_import_time(args):
+    failed = False
+    for module, seconds, budget, problem in check_import_budget():
+        shown = f"{seconds * 1000:8.1f}毫秒" if seconds is not None else "       -"
+        print(f"{module:28} {shown}  (预算 {budget * 1000:.0f}毫秒)  {problem or 'OK'}")
+        failed = failed or problem is not None
+    return 1 if failed else 0
+
+
+def synthetic_rows(count):
+    """生成 count 行 (包名, 版本) 测试数据，按名称排序 (与已安装包列表相同)。"""
+    parts = _NAME_PARTS
+    rows = [(f"{parts[i % 20]}-{parts[i // 20 % 20]}{'_' if i % 3 else '-'}{parts[i // 400 % 20]}{i}",
+             f"{i % 7}.{i % 13}.{i % 101}") for i in range(count)]
+    rows.sort()
+    return rows
+
+
+def _rss_bytes():
+    """当前进程的常驻内存 (字节)；无法读取时返回 None (仅支持 Linux)。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def measure_table(mode, count):
+    """在当前进程中渲染 count 行表格，返回耗时 (秒) 与内存 (字节)。需要图形显示。"""
+    import tkinter as tk
+    from tkinter import ttk
+    from pip_toolbox.table_view import VirtualTreeview
+
+    root = tk.Tk()
+    root.geometry("600x700")
+    try:
+        tracemalloc.start()
+        rows = synthetic_rows(count)
+        rows_bytes = tracemalloc.get_traced_memory()[0]
+        if mode == "virtual":
+            table = VirtualTreeview(root, ("name", "version"))
+            tree = table.tree
+        else:
+            tree = ttk.Treeview(root, columns=("name", "version"), show="headings", selectmode="browse")
+        tree.pack(fill="both", expand=True)
+        root.update()
+        rss_before = _rss_bytes()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        if mode == "virtual":
+            table.set_rows(rows)
+        else:
+            comboboxes = {}  # 与旧实现相同：每行一个组合框字典条目
+            for row in rows:
+                comboboxes[tree.insert("", "end", values=row)] = None
+        root.update()
+        render_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        if mode == "virtual":
+            table.yview("moveto", 0.5)
+        else:
+            tree.yview_moveto(0.5)
+        root.update()
+        scroll_seconds = time.perf_counter() - start
+        rss_after = _rss_bytes()
+        python_bytes = tracemalloc.get_traced_memory()[0] - rows_bytes
+        return {"mode": mode, "rows": count, "items": len(tree.get_children()),
+                "render_seconds": render_seconds, "scroll_seconds": scroll_seconds,
+                "rows_bytes": rows_bytes, "python_bytes": python_bytes,
+                "rss_bytes": rss_after - rss_before if rss_before is not None else None}
+    finally:
+        tracemalloc.stop()
+        root.destroy()
+
+
+def run_table_case(mode, count):
+    """在全新解释器中测量一种情况，避免前一种情况留下的内存影响结果。"""
+    code = ("import json\nfrom pip_toolbox.bench import measure_table\n"
+            f"print(json.dumps(measure_table({mode!r}, {count})))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"mode": mode, "rows": count, "error": lines[-1] if lines else f"exit {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_table(args):
+    results = [run_table_case(mode, count) for count in args.sizes for mode in TABLE_MODES]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 1 if any("error" in r for r in results) else 0
+    print(f"{'实现':8} {'行数':>7} {'条目':>7} {'渲染':>10} {'滚动':>10} {'Python 内存':>12} {'RSS 增量':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['mode']:8} {r['rows']:>7}  失败: {r['error']}")
+            continue
+        rss = f"{r['rss_bytes'] / 1048576:8.1f}MB" if r["rss_bytes"] is not None else "       -"
+        print(f"{r['mode']:8} {r['rows']:>7} {r['items']:>7} {r['render_seconds'] * 1000:8.1f}毫秒 "
+              f"{r['scroll_seconds'] * 1000:8.1f}毫秒 {r['python_bytes'] / 1048576:10.1f}MB {rss}")
+    return 1 if any("error" in r for r in results) else 0
+
+
+def measure_search(count, queries=SEARCH_QUERIES, fuzzy_queries=FUZZY_QUERIES, rows=None):
+    """逐字符输入查询，测量每次按键的搜索 + 表格数据更新耗时 (秒)。不需要图形显示。"""
+    from pip_toolbox.search_index import SearchIndex
+    from pip_toolbox.table_view import TableWindow
+
+    rows = synthetic_rows(count) if rows is None else rows
+    count = len(rows)
+    start = time.perf_counter()
+    index = SearchIndex(rows)
+    build_seconds = time.perf_counter() - start
+    window = TableWindow()
+    window.visible = 30
+    latencies = []
+    for query, fuzzy in [(q, False) for q in queries] + [(q, True) for q in fuzzy_queries]:
+        for length in range(len(query) + 1):
+            start = time.perf_counter()
+            window.set_rows(index.filter(query[:length], fuzzy), keep_selection=True)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {"rows": count, "build_seconds": build_seconds, "keystrokes": len(latencies),
+            "median_seconds": latencies[len(latencies) // 2], "max_seconds": latencies[-1]}
+
+
+def run_search(args):
+    results = [measure_search(count) for count in args.sizes]
+    failed = any(r["max_seconds"] > FRAME_SECONDS for r in results)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 1 if failed else 0
+    for r in results:
+        status = "OK" if r["max_seconds"] <= FRAME_SECONDS else f"超出一帧 ({FRAME_SECONDS * 1000:.1f}毫秒)"
+        print(f"{r['rows']:>7} 行  建索引 {r['build_seconds'] * 1000:7.1f}毫秒  {r['keystrokes']} 次按键  "
+              f"中位数 {r['median_seconds'] * 1000:6.2f}毫秒  最大 {r['max_seconds'] * 1000:6.2f}毫秒  {status}")
+    return 1 if failed else 0
+
+
+# --- 离线基准套件 ---
+SUITE_PACKAGES = 1000
+SUITE_VERSIONS = 30
+SUITE_LATENCY_MS = 20
+SIMPLE_JSON_TYPE = "application/vnd.pypi.simple.v1+json"
+
+
+def build_site_packages(directory, rows):
+    """在 directory 中为 [(包名, 版本)] 生成只含 METADATA 的 dist-info 目录。"""
+    os.makedirs(directory, exist_ok=True)
+    for name, version in rows:
+        dist_info = os.path.join(directory, f"{name.replace('-', '_')}-{version}.dist-info")
+        os.makedirs(dist_info, exist_ok=True)
+        with open(os.path.join(dist_info, "METADATA"), "w", encoding="utf-8") as f:
+            f.write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\n")
+    return directory
+
+
+def fake_versions(index, version_count):
+    """第 index 个模拟包在索引中的版本 (从旧到新，最后一个为预发布版本)。"""
+    versions = [f"{index % 7}.{index % 13}.{n}" for n in range(version_count - 1)]
+    return versions + [f"{index % 7}.{index % 13 + 1}.0rc1"]
+
+
+class FakeIndex:
+    """本地模拟的 Simple API 索引 (PEP 691 JSON)，每个请求先等待 latency 秒以模拟网络往返。
+
+    tail_every 大于 0 时，每 tail_every 个请求中有一个改为等待 tail_latency 秒，模拟降级镜像的长尾延迟。
+    """
+
+    def __init__(self, projects, latency=0.0, tail_latency=0.0, tail_every=0):
+        self.projects = projects  # 规范化包名 -> 版本列表
+        self.latency = latency
+        self.tail_latency = tail_latency
+        self.tail_every = tail_every
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-index", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/simple"
+
+    def _handler_class(self):
+        index = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 保持连接，与真实索引一样可以复用
+            disable_nagle_algorithm = True  # 响应头与正文分两次写出，避免 Nagle 与延迟确认叠加出约 40 毫秒的额外等待
+
+            def do_GET(self):
+                with index._lock:
+                    index.requests += 1
+                    slow = index.tail_every and index.requests % index.tail_every == 0
+                delay = index.tail_latency if slow else index.latency
+                if delay:
+                    time.sleep(delay)
+                parts = [p for p in self.path.split("?")[0].split("/") if p]
+                versions = index.projects.get(parts[1]) if len(parts) == 2 and parts[0] == "simple" else None
+                if versions is None:
+                    body, status = b'{"files": []}', 404
+                else:
+                    files = [{"filename": f"{parts[1].replace('-', '_')}-{v}-py3-none-any.whl", "url": "#"}
+                             for v in versions]
+                    body, status = json.dumps({"meta": {"api-version": "1.0"}, "name": parts[1],
+                                               "files": files}).encode(), 200
+                self.send_response(status)
+                self.send_header("Content-Type", SIMPLE_JSON_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+
+def _latency_stats(latencies):
+    from pip_toolbox.tracing import percentile
+    values = sorted(latencies)
+    return {"p50_seconds": percentile(values, 50), "p90_seconds": percentile(values, 90),
+            "p99_seconds": percentile(values, 99), "max_seconds": values[-1] if values else 0.0}
+
+
+def measure_listing(site_dir):
+    """冷扫描与增量重扫 site_dir 的耗时。"""
+    from pip_toolbox.inventory import InventoryScanner
+    scanner = InventoryScanner(paths=[site_dir])
+    start = time.perf_counter()
+    packages = scanner.scan()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    scanner.scan()
+    warm = time.perf_counter() - start
+    return {"packages": len(packages), "cold_seconds": cold, "warm_seconds": warm,
+            "cold_packages_per_second": len(packages) / cold if cold else None}, packages
+
+
+def measure_check(index_url, packages, workers):
+    """用模拟索引检查 [(包名, 已安装版本)] 的更新：先冷查询 (网络)，再用内存缓存重复一次。"""
+    from pip_toolbox import lookup
+    from pip_toolbox.scheduler import LookupScheduler
+    from pip_toolbox.version_cache import VersionCache
+
+    lookup.set_index_url(index_url)
+    lookup.version_cache = VersionCache()
+    results = {}
+    for phase in ("cold", "warm"):
+        latencies = []
+
+        def timed(pkg):
+            start = time.perf_counter()
+            try:
+                return lookup.resolve_latest_version(pkg[0], {})
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        scheduler = LookupScheduler(timed, max_workers=workers)
+        outdated = errors = 0
+        first_result = None
+        start = time.perf_counter()
+        for result in lookup.iter_update_checks(scheduler, packages):
+            if first_result is None:
+                first_result = time.perf_counter() - start
+            outdated += result.outdated
+            errors += result.error is not None
+        results[phase] = {"checked": scheduler.completed, "outdated": outdated, "errors": errors,
+                          "workers": scheduler.max_workers, "seconds": scheduler.elapsed,
+                          "first_result_seconds": first_result,
+                          "packages_per_second": scheduler.completed / scheduler.elapsed if scheduler.elapsed else None,
+                          **_latency_stats(latencies)}
+    return results
+
+
+def measure_table_model(rows, visible=30):
+    """不需要图形显示的表格数据层耗时：设置全部行并从头滚动到尾。"""
+    from pip_toolbox.table_view import TableWindow
+    window = TableWindow()
+    window.visible = visible
+    start = time.perf_counter()
+    window.set_rows(rows)
+    set_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    steps = 0
+    while True:
+        list(window.window())
+        steps += 1
+        if not window.scroll_by(visible):
+            break
+    scroll_seconds = time.perf_counter() - start
+    return {"rows": len(rows), "set_rows_seconds": set_seconds, "page_scrolls": steps,
+            "seconds_per_page": scroll_seconds / steps}
+
+
+def run_suite_once(packages, version_count, latency, workers):
+    """生成合成环境、启动模拟索引并依次运行各项基准，返回结果字典。"""
+    from pip_toolbox.versions import normalize_name
+
+    os.environ["PIP_TOOLBOX_DISK_CACHE"] = "0"  # 结果不受之前运行留下的磁盘缓存影响
+    # 一半的包已是最新版本，另一半安装的是最旧版本
+    rows = [(name, fake_versions(i, version_count)[-1] if i % 2 else f"{i % 7}.{i % 13}.0")
+            for i, (name, _) in enumerate(synthetic_rows(packages))]
+    tmp = tempfile.mkdtemp(prefix="pip-toolbox-bench-")
+    try:
+        site_dir = build_site_packages(os.path.join(tmp, "site-packages"), rows)
+        listing, installed = measure_listing(site_dir)
+        installed_rows = [(dist.name, dist.version) for dist in installed]
+        projects = {normalize_name(name): fake_versions(i, version_count) for i, (name, _) in enumerate(rows)}
+        with FakeIndex(projects, latency) as index:
+            check = measure_check(index.url, installed_rows, workers)
+            check["requests"] = index.requests
+        table = run_table_case("virtual", len(installed_rows))
+        return {"listing": listing,
+                "search": measure_search(len(installed_rows), rows=installed_rows),
+                "check": check,
+                "table_model": measure_table_model(installed_rows),
+                "table_render": table}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _flatten(data, prefix=""):
+    """把嵌套字典展开为 {"a.b.c": 数值}，用于与基线比较。"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_results(baseline, current):
+    """返回 [(指标, 基线值, 当前值, 变化百分比)]，只包含两边都有的数值指标。"""
+    old, new = _flatten(baseline.get("results", {})), _flatten(current.get("results", {}))
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        change = (new[name] - old[name]) / old[name] * 100 if old[name] else None
+        rows.append((name, old[name], new[name], change))
+    return rows
+
+
+def run_suite(args):
+    results = run_suite_once(args.packages, args.versions, args.latency_ms / 1000, args.workers)
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+                       "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                       "packages": args.packages, "versions": args.versions, "latency_ms": args.latency_ms,
+                       "workers": results["check"]["cold"]["workers"]},
+              "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    listing, check, search = results["listing"], results["check"], results["search"]
+    print(f"列出已安装包: {listing['packages']} 个，冷扫描 {listing['cold_seconds'] * 1000:.1f}毫秒 "
+          f"({listing['cold_packages_per_second']:.0f} 个/秒)，增量重扫 {listing['warm_seconds'] * 1000:.1f}毫秒")
+    print(f"搜索: {search['keystrokes']} 次按键，中位数 {search['median_seconds'] * 1000:.2f}毫秒，"
+          f"最大 {search['max_seconds'] * 1000:.2f}毫秒")
+    for phase, label in (("cold", "检查更新 (冷)"), ("warm", "检查更新 (缓存)")):
+        c = check[phase]
+        print(f"{label}: {c['checked']} 个包 {c['seconds']:.2f}秒 ({c['packages_per_second']:.0f} 个/秒，"
+              f"并发 {c['workers']})，单包 p50 {c['p50_seconds'] * 1000:.1f}毫秒 / p99 {c['p99_seconds'] * 1000:.1f}毫秒，"
+              f"过时 {c['outdated']}，错误 {c['errors']}")
+    model = results["table_model"]
+    print(f"表格数据层: 设置 {model['rows']} 行 {model['set_rows_seconds'] * 1000:.2f}毫秒，"
+          f"每页滚动 {model['seconds_per_page'] * 1000000:.1f}微秒")
+    render = results["table_render"]
+    if "error" in render:
+        print(f"表格渲染: 跳过 ({render['error']})")
+    else:
+        print(f"表格渲染: {render['render_seconds'] * 1000:.1f}毫秒，{render['items']} 个条目")
+    if args.output:
+        print(f"结果已保存到 {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n与基线 {args.baseline} 比较:")
+        for name, old, new, change in compare_results(baseline, report):
+            shown = f"{change:+7.1f}%" if change is not None else "      -"
+            print(f"  {name:44} {old:14.6g} -> {new:14.6g}  {shown}")
+    return 1 if check["cold"]["errors"] else 0
+
+
+# --- 镜像测速 ---
+# (名称, 每个请求的延迟 (毫秒), 是否已同步最新版本)
+MIRROR_SCENARIOS = (("fast-stale", 5, False), ("slow-fresh", 120, True), ("fast-fresh", 10, True))
+
+
+def run_mirrors(args):
+    """启动若干本地模拟镜像，运行测速并检查排名是否为：新鲜且快 > 新鲜但慢 > 未同步。"""
+    from pip_toolbox.mirrors import PROBE_PACKAGES, describe, probe_mirrors
+
+    versions = ["1.0", "1.1", "2.0"]
+    servers = []
+    try:
+        for name, latency_ms, fresh in MIRROR_SCENARIOS:
+            projects = {pkg: versions if fresh else versions[:-1] for pkg in PROBE_PACKAGES}
+            servers.append((name, FakeIndex(projects, latency_ms * args.latency_scale / 1000).__enter__()))
+        names = {index.url: name for name, index in servers}
+        start = time.perf_counter()
+        ranked = probe_mirrors([index.url for _, index in servers])
+        elapsed = time.perf_counter() - start
+    finally:
+        for _, index in servers:
+            index.__exit__(None, None, None)
+    for position, probe in enumerate(ranked, 1):
+        print(f"{position}. [{names[probe.url]}] {describe(probe)}")
+    serial = sum(latency for _, latency, _ in MIRROR_SCENARIOS) * len(PROBE_PACKAGES) * args.latency_scale / 1000
+    print(f"并行测速 {len(ranked)} 个镜像用时 {elapsed * 1000:.0f}毫秒 (逐个测速至少需要 {serial * 1000:.0f}毫秒)")
+    order = [names[probe.url] for probe in ranked]
+    expected = ["fast-fresh", "slow-fresh", "fast-stale"]
+    if order != expected:
+        print(f"排名不符合预期: {order}，应为 {expected}")
+        return 1
+    return 0
+
+
+# --- 对冲查询 ---
+HEDGE_PACKAGES = 200
+HEDGE_LATENCY_MS = 20  # 两个模拟索引的正常延迟
+HEDGE_TAIL_MS = 1500  # 主索引长尾请求的延迟
+HEDGE_TAIL_EVERY = 10  # 主索引每 10 个请求有 1 个落入长尾
+
+
+def run_hedge(args):
+    """主索引有长尾延迟时，比较只用主索引与启用对冲 (备用索引) 两种情况下检查更新的耗时分布。"""
+    from pip_toolbox import lookup
+    from pip_toolbox.hedging import index_stats
+    from pip_toolbox.versions import normalize_name
+
+    os.environ["PIP_TOOLBOX_DISK_CACHE"] = "0"
+    rows = [(name, f"{i % 7}.{i % 13}.0") for i, (name, _) in enumerate(synthetic_rows(args.packages))]
+    projects = {normalize_name(name): fake_versions(i, SUITE_VERSIONS) for i, (name, _) in enumerate(rows)}
+    results = {}
+    with FakeIndex(projects, HEDGE_LATENCY_MS / 1000, HEDGE_TAIL_MS / 1000, HEDGE_TAIL_EVERY) as primary, \
+            FakeIndex(projects, HEDGE_LATENCY_MS / 1000) as secondary:
+        for mode, secondaries in (("primary-only", ()), ("hedged", (secondary.url,))):
+            lookup.set_secondary_index_urls(secondaries, args.hedge_delay_ms / 1000)
+            index_stats.reset()
+            results[mode] = measure_check(primary.url, rows, args.workers)["cold"]
+            results[mode]["index_stats"] = index_stats.stats()
+    lookup.set_secondary_index_urls(())
+    names = {primary.url: "primary", secondary.url: "secondary"}
+    for mode, c in results.items():
+        print(f"{mode:13}: {c['checked']} 个包 {c['seconds']:.2f}秒，单包 p50 {c['p50_seconds'] * 1000:.0f}毫秒 / "
+              f"p99 {c['p99_seconds'] * 1000:.0f}毫秒 / 最大 {c['max_seconds'] * 1000:.0f}毫秒，错误 {c['errors']}")
+        for url, stats in c["index_stats"].items():
+            print(f"    {names.get(url, url)}: 胜出 {stats['wins']}/{stats['requests']}，失败 {stats['errors']}")
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    if results["hedged"]["errors"] or results["hedged"]["p99_seconds"] >= results["primary-only"]["p99_seconds"]:
+        print("启用对冲后 p99 没有下降")
+        return 1
+    return 0
+
+
+# --- 推测预取 ---
+SPECULATIVE_ROWS = 400
+SPECULATIVE_LATENCY_MS = 80
+SPECULATIVE_STEPS = 30  # 模拟的「滚动 -> 停留 -> 点击一行」次数
+SPECULATIVE_DWELL_MS = 400  # 每次滚动后到点击之前的停留时间
+
+
+def measure_clicks(index_url, rows, steps, dwell, prefetch, seed=1):
+    """模拟用户滚动表格后点击可见行，返回点击到取得版本列表的耗时统计。"""
+    import random
+    from pip_toolbox import lookup
+    from pip_toolbox.config import SPECULATIVE_RADIUS
+    from pip_toolbox.speculative import SpeculativePrefetcher
+    from pip_toolbox.table_view import TableWindow
+    from pip_toolbox.version_cache import VersionCache
+
+    lookup.set_index_url(index_url)
+    lookup.version_cache = VersionCache()
+    prefetcher = SpeculativePrefetcher(lookup.cached_versions, lookup.has_cached_versions) if prefetch else None
+    model = TableWindow()
+    model.visible = 25
+    model.set_rows(rows)
+    rng = random.Random(seed)
+    latencies, instant = [], 0
+    for _ in range(steps):
+        model.scroll_by(rng.randint(5, 30))
+        if prefetcher:
+            prefetcher.request([rows[i][0] for i in model.nearby(SPECULATIVE_RADIUS)])
+        time.sleep(dwell)
+        model.selected = rng.choice(model.window())
+        name = model.selected_row()[0]
+        start = time.perf_counter()
+        if lookup.has_cached_versions(name):
+            instant += 1
+        if prefetcher:
+            with prefetcher.foreground():
+                lookup.cached_versions(name)
+            prefetcher.request([rows[i][0] for i in model.nearby(SPECULATIVE_RADIUS)])
+        else:
+            lookup.cached_versions(name)
+        latencies.append(time.perf_counter() - start)
+    result = {"clicks": steps, "instant": instant, **_latency_stats(latencies)}
+    if prefetcher:
+        result["prefetched"], result["dropped"] = prefetcher.fetched, prefetcher.dropped
+        prefetcher.close()
+    return result
+
+
+def run_speculative(args):
+    """比较关闭与开启推测预取时，滚动后点击一行到显示版本列表的耗时。"""
+    from pip_toolbox.versions import normalize_name
+
+    os.environ["PIP_TOOLBOX_DISK_CACHE"] = "0"
+    rows = [(name, "1.0") for name, _ in synthetic_rows(args.rows)]
+    projects = {normalize_name(name): fake_versions(i, SUITE_VERSIONS) for i, (name, _) in enumerate(rows)}
+    results = {}
+    for mode in ("off", "on"):
+        with FakeIndex(projects, args.latency_ms / 1000) as index:
+            results[mode] = measure_clicks(index.url, rows, args.steps, args.dwell_ms / 1000, mode == "on")
+            results[mode]["requests"] = index.requests
+    for mode, r in results.items():
+        extra = f"，预取 {r['prefetched']} 个 (丢弃 {r['dropped']})" if "prefetched" in r else ""
+        print(f"推测预取 {mode:3}: {r['clicks']} 次点击，缓存命中 {r['instant']}，p50 {r['p50_seconds'] * 1000:.1f}毫秒 / "
+              f"p90 {r['p90_seconds'] * 1000:.1f}毫秒 / 最大 {r['max_seconds'] * 1000:.1f}毫秒，"
+              f"索引请求 {r['requests']}{extra}")
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    if results["on"]["p50_seconds"] >= results["off"]["p50_seconds"]:
+        print("开启推测预取后点击延迟没有下降")
+        return 1
+    return 0
+
+
+def parse_sizes(value):
+    try:
+        return tuple(int(v) for v in value.split(",") if v.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的行数列表: {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pip_toolbox.bench", description="pip-toolbox 性能检查")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("import-time", help="检查各模块的导入耗时预算").set_defaults(func=run_import_time)
+    table = subparsers.add_parser("table", help="测量包表格的渲染耗时与内存 (需要图形显示)")
+    table.add_argument("--sizes", type=parse_sizes, default=TABLE_SIZES, help="逗号分隔的行数 (默认 1000,10000,50000)")
+    table.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    table.set_defaults(func=run_table)
+    search = subparsers.add_parser("search", help="测量逐键输入时的搜索延迟")
+    search.add_argument("--sizes", type=parse_sizes, default=SEARCH_SIZES, help="逗号分隔的行数 (默认 1000,5000,10000)")
+    search.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    search.set_defaults(func=run_search)
+    suite = subparsers.add_parser("suite", help="离线基准套件 (合成环境 + 本地模拟索引)")
+    suite.add_argument("-n", "--packages", type=int, default=SUITE_PACKAGES, help=f"合成的包数量 (默认 {SUITE_PACKAGES})")
+    suite.add_argument("--versions", type=int, default=SUITE_VERSIONS, help=f"每个包的版本数 (默认 {SUITE_VERSIONS})")
+    suite.add_argument("--latency-ms", type=float, default=SUITE_LATENCY_MS,
+                       help=f"模拟索引每个请求的延迟 (默认 {SUITE_LATENCY_MS} 毫秒)")
+    suite.add_argument("-j", "--workers", type=int, default=None, help="检查更新的并发数 (默认取 PIP_TOOLBOX_WORKERS)")
+    suite.add_argument("-o", "--output", help="把结果保存为 JSON 文件")
+    suite.add_argument("--baseline", help="与之前保存的 JSON 结果比较")
+    suite.set_defaults(func=run_suite)
+    mirrors = subparsers.add_parser("mirrors", help="用本地模拟镜像验证测速选源")
+    mirrors.add_argument("--latency-scale", type=float, default=1.0, help="模拟延迟的倍数 (默认 1)")
+    mirrors.set_defaults(func=run_mirrors)
+    hedge = subparsers.add_parser("hedge", help="主索引有长尾延迟时，比较启用对冲查询前后的检查耗时")
+    hedge.add_argument("-n", "--packages", type=int, default=HEDGE_PACKAGES, help=f"包数量 (默认 {HEDGE_PACKAGES})")
+    hedge.add_argument("--hedge-delay-ms", type=float, default=200, help="对冲查询的延迟预算 (默认 200 毫秒)")
+    hedge.add_argument("-j", "--workers", type=int, default=None, help="检查更新的并发数 (默认取 PIP_TOOLBOX_WORKERS)")
+    hedge.add_argument("--json", action="store_true", help="同时以 JSON 输出结果")
+    hedge.set_defaults(func=run_hedge)
+    speculative = subparsers.add_parser("speculative", help="比较关闭/开启推测预取时点击一行到显示版本的延迟")
+    speculative.add_argument("-n", "--rows", type=int, default=SPECULATIVE_ROWS, help=f"行数 (默认 {SPECULATIVE_ROWS})")
+    speculative.add_argument("--latency-ms", type=float, default=SPECULATIVE_LATENCY_MS,
+                             help=f"模拟索引每个请求的延迟 (默认 {SPECULATIVE_LATENCY_MS} 毫秒)")
+    speculative.add_argument("--steps", type=int, default=SPECULATIVE_STEPS, help=f"点击次数 (默认 {SPECULATIVE_STEPS})")
+    speculative.add_argument("--dwell-ms", type=float, default=SPECULATIVE_DWELL_MS,
+                             help=f"每次滚动后到点击前的停留时间 (默认 {SPECULATIVE_DWELL_MS} 毫秒)")
+    speculative.add_argument("--json", action="store_true", help="同时以 JSON 输出结果")
+    speculative.set_defaults(func=run_speculative)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""检查更新的磁盘检查点，使中断 (关闭窗口、休眠、Ctrl+C) 的检查可以从中断处继续。
+
+每个 (目标环境, 索引 URL, 版本类型) 组合对应用户缓存目录 checkpoints/ 下的一个 JSONL 文件：
+第一行为说明 (环境、主索引、版本类型、开始时间)，之后每完成一个包追加一行结果 (含给出结果的索引，
+对冲查询时可能是备用索引) 并立即刷新，因此中断时最多丢失正在进行的查询。索引上不存在的包同样记录；
+查询失败 (结果未知) 的包不记录，继续时会重新查询；已安装版本变化的包也会重新查询。检查全部完成后删除检查点。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from pip_toolbox.disk_cache import user_cache_dir
+from pip_toolbox.lookup import CheckResult
+from pip_toolbox.versions import normalize_name
+
+MAX_AGE = 12 * 3600  # 超过这么久 (秒) 的检查点不再用于继续，期间可能有新版本发布
+
+
+def checkpoints_dir():
+    return os.environ.get("PIP_TOOLBOX_CHECKPOINT_DIR") or os.path.join(user_cache_dir(), "checkpoints")
+
+
+class CheckCheckpoint:
+    """一次检查更新的检查点；python 为 None 表示默认环境。"""
+
+    def __init__(self, python, index_url, kinds, directory=None):
+        self.python = python
+        self.index_url = index_url.rstrip("/")
+        self.kinds = sorted(kinds)
+        key = json.dumps([python, self.index_url, self.kinds])
+        self.path = os.path.join(directory or checkpoints_dir(),
+                                 hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".jsonl")
+        self.started = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self, max_age=MAX_AGE):
+        """读取已完成的结果 {规范化包名: CheckResult}；文件不存在、过期或不匹配时返回空字典。"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return {}
+        try:
+            header = json.loads(lines[0])
+        except (ValueError, IndexError):
+            return {}
+        if header.get("python") != self.python or header.get("index_url") != self.index_url or \
+                header.get("kinds") != self.kinds or time.time() - header.get("started", 0) > max_age:
+            return {}
+        results = {}
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 中断时写了一半的最后一行
+            results[normalize_name(record["name"])] = CheckResult(
+                record["name"], record["installed"], record["latest"], record["outdated"], record.get("error"),
+                record.get("not_found", False), record.get("index"))
+        self.started = header["started"]
+        return results
+
+    def split(self, packages, saved):
+        """把 [(包名, 已安装版本)] 分为 (可以沿用的 CheckResult 列表, 仍需查询的包)。"""
+        reused, remaining = [], []
+        for pkg_name, installed in packages:
+            result = saved.get(normalize_name(pkg_name))
+            if result is not None and result.installed == installed:
+                reused.append(result._replace(name=pkg_name))
+            else:
+                remaining.append((pkg_name, installed))
+        return reused, remaining
+
+    def open(self, resume):
+        """开始写入；resume 为 False 或没有可继续的检查点时重新开始。"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if resume and self.started is not None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            return
+        self.started = time.time()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._write({"python": self.python, "index_url": self.index_url, "kinds": self.kinds,
+                     "started": self.started})
+
+    def record(self, result):
+        """追加一个结果 (查询失败的不记录；索引上不存在是确定的结论，照常记录)。"""
+        if (result.error and not result.not_found) or self._file is None:
+            return
+        record = {"name": result.name, "installed": result.installed, "latest": result.latest,
+                  "outdated": result.outdated, "index": result.index}
+        if result.not_found:
+            record.update(not_found=True, error=result.error)
+        self._write(record)
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        """停止写入并保留检查点 (之后可以继续)。"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def finish(self):
+        """检查已全部完成：删除检查点。"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,360 @@
+"""pip-toolbox 命令行入口。
+
+不带参数时启动图形界面；带子命令时以无界面模式运行，结果以 NDJSON (每行一个 JSON 对象)
+的形式在每个查询完成时立即输出：
+
+    pip-toolbox list                  已安装的包
+    pip-toolbox outdated [--resume]   检查更新 (按完成顺序输出；中断后可用 --resume 从检查点继续)
+    pip-toolbox versions <包名>       某个包的可用版本
+    pip-toolbox envs [add|remove]     登记的目标环境 (解释器 / 虚拟环境)
+    pip-toolbox matrix                所有登记环境的过时包矩阵 (环境并行扫描，每个包只查询一次)
+    pip-toolbox snapshots [take]      列出 (或记录) 已安装包的快照
+    pip-toolbox rollback [快照 ID]    从 wheelhouse 离线回滚到快照 (默认最新的快照)
+    pip-toolbox mirrors [URL ...]     并行测速候选索引并排名 (--apply 设置为排名第一的源)
+
+全局参数 --python 让 list / outdated 作用于指定的解释器，而不是 PATH 中的 pip；--secondary-index 配置
+对冲查询的备用索引 (outdated 结束时输出各索引的胜出数与耗时统计)。
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+
+# --- 退出码 (便于 CI 判断) ---
+EXIT_OK = 0
+EXIT_OUTDATED = 1  # outdated: 发现过时包
+EXIT_USAGE = 2  # 参数错误 (argparse 默认)
+EXIT_LOOKUP_ERROR = 3  # 有包无法查询 (结果未知)
+
+_stdout = sys.stdout  # NDJSON 输出目标；运行期间其它 print 输出被重定向到 stderr
+
+
+def emit(record):
+    """输出一行 JSON 并立即刷新，保证调用方能流式读取。"""
+    _stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    _stdout.flush()
+
+
+def parse_kinds(value):
+    from pip_toolbox.versions import VERSION_KINDS
+    kinds = tuple(k.strip() for k in value.split(",") if k.strip())
+    unknown = [k for k in kinds if k not in VERSION_KINDS]
+    if unknown or not kinds:
+        raise argparse.ArgumentTypeError(f"未知的版本类型: {', '.join(unknown) or value} (可选: {','.join(VERSION_KINDS)})")
+    return kinds
+
+
+def run_list(args):
+    from pip_toolbox.inventory import scan_installed
+    for dist in scan_installed():
+        emit({"type": "package", "name": dist.key, "version": dist.version})
+    return EXIT_OK
+
+
+def run_outdated(args):
+    from pip_toolbox.inventory import get_installed_packages
+    from pip_toolbox.lookup import check_status, create_check_scheduler, get_lookup_index_urls, iter_update_checks
+    from pip_toolbox.versions import normalize_name
+
+    packages = get_installed_packages()
+    total = len(packages)
+    checkpoint = None
+    reused = []
+    if args.packages:
+        wanted = {normalize_name(name) for name in args.packages}
+        packages = [pkg for pkg in packages if normalize_name(pkg[0]) in wanted]
+        total = len(packages)
+    else:
+        # 检查全部包时逐个记录检查点，中断后可用 --resume 继续
+        from pip_toolbox import config
+        from pip_toolbox.checkpoints import CheckCheckpoint
+        from pip_toolbox.lookup import get_index_url
+        checkpoint = CheckCheckpoint(config.target_python, get_index_url(), args.kinds)
+        reused, packages = checkpoint.split(packages, checkpoint.load() if args.resume else {})
+        checkpoint.open(resume=bool(reused))
+    scheduler = create_check_scheduler({}, args.kinds, max_workers=args.workers)
+    hedged = len(get_lookup_index_urls()) > 1
+    outdated = errors = not_found = 0
+    start = time.perf_counter()
+    first_result = None
+
+    def report(result, resumed=False):
+        if args.only_outdated and not result.outdated:
+            return
+        emit({"type": "result", "name": result.name, "installed": result.installed, "latest": result.latest,
+              "outdated": result.outdated, "status": check_status(result), "error": result.error,
+              "index": result.index, **({"resumed": True} if resumed else {})})
+    for result in reused:
+        outdated += result.outdated
+        not_found += result.not_found
+        report(result, resumed=True)
+    try:
+        for result in iter_update_checks(scheduler, packages):
+            if first_result is None:
+                first_result = time.perf_counter() - start
+            outdated += result.outdated
+            if result.not_found:
+                not_found += 1  # 索引上没有该项目 (如本地安装的包)：结论明确，不算查询失败
+            elif result.error:
+                errors += 1
+            if checkpoint is not None:
+                checkpoint.record(result)
+            report(result)
+    except KeyboardInterrupt:
+        scheduler.cancel()
+    if checkpoint is not None:
+        if scheduler.cancelled:
+            checkpoint.close()
+        else:
+            checkpoint.finish()
+    emit({"type": "summary", "checked": scheduler.completed + len(reused), "total": total, "outdated": outdated,
+          "unknown": errors, "not_found": not_found, "resumed": len(reused), "cancelled": scheduler.cancelled,
+          "workers": scheduler.max_workers, "duration": round(scheduler.elapsed, 3),
+          "first_result": round(first_result, 3) if first_result is not None else None})
+    if hedged:
+        from pip_toolbox.hedging import index_stats
+        emit({"type": "indexes", "hedged": index_stats.hedged, "stats": index_stats.stats()})
+    if errors:
+        from pip_toolbox.resilience import health_summary
+        health = health_summary()
+        if health:
+            print(health)
+    if outdated:
+        return EXIT_OUTDATED
+    return EXIT_LOOKUP_ERROR if errors else EXIT_OK
+
+
+def run_versions(args):
+    from pip_toolbox.lookup import cached_versions
+    from pip_toolbox.versions import tag_versions
+
+    result = cached_versions(args.package)
+    if result.error:
+        emit({"type": "error", "name": args.package, "error": result.error})
+        return EXIT_LOOKUP_ERROR
+    for version, kind in tag_versions(result.versions):
+        if kind in args.kinds:
+            emit({"type": "version", "name": args.package, "version": version, "kind": kind})
+    return EXIT_OK
+
+
+def run_envs(args):
+    from pip_toolbox.environments import EnvironmentRegistry, InterpreterError, find_interpreters
+    registry = EnvironmentRegistry()
+    if args.action == "add":
+        candidates = [(args.name, python) for python in args.targets]
+        for directory in args.scan or ():
+            candidates += find_interpreters(directory)
+        status = EXIT_OK
+        for name, python in candidates:
+            try:
+                env = registry.add(python, name)
+            except InterpreterError as e:
+                emit({"type": "error", "python": python, "error": str(e)})
+                status = EXIT_LOOKUP_ERROR
+                continue
+            emit({"type": "environment", "name": env.name, "python": env.python, "version": env.version})
+        return status
+    if args.action == "remove":
+        missing = [target for target in args.targets if not registry.remove(target)]
+        for target in missing:
+            emit({"type": "error", "name": target, "error": "未登记"})
+        return EXIT_USAGE if missing else EXIT_OK
+    for env in registry.environments:
+        emit({"type": "environment", "name": env.name, "python": env.python})
+    return EXIT_OK
+
+
+def run_matrix(args):
+    from pip_toolbox.environments import EnvironmentRegistry, is_outdated, outdated_matrix, scan_environments
+
+    registry = EnvironmentRegistry()
+    environments = [registry.find(name) for name in args.env] if args.env else registry.environments
+    unknown = [name for name, env in zip(args.env or (), environments) if env is None]
+    if unknown:
+        emit({"type": "error", "error": f"未登记的环境: {', '.join(unknown)}"})
+        return EXIT_USAGE
+    start = time.perf_counter()
+    inventories = scan_environments(environments, args.workers)
+    scan_seconds = time.perf_counter() - start
+    for env in environments:
+        packages = inventories[env.name]
+        if isinstance(packages, Exception):
+            emit({"type": "environment", "name": env.name, "python": env.python, "error": str(packages)})
+        else:
+            emit({"type": "environment", "name": env.name, "python": env.python, "packages": len(packages)})
+    outdated = errors = 0
+    rows = outdated_matrix(inventories, args.kinds, max_workers=args.workers)
+    for row in rows:
+        cells = {env: {"installed": version, "outdated": is_outdated(version, row.latest)}
+                 for env, version in row.cells.items()}
+        row_outdated = any(cell["outdated"] for cell in cells.values())
+        outdated += row_outdated
+        errors += row.error is not None
+        if args.only_outdated and not row_outdated:
+            continue
+        emit({"type": "row", "name": row.name, "latest": row.latest, "error": row.error, "environments": cells})
+    emit({"type": "summary", "environments": len(environments), "packages": len(rows), "outdated": outdated,
+          "unknown": errors, "scan_duration": round(scan_seconds, 3),
+          "duration": round(time.perf_counter() - start, 3)})
+    if outdated:
+        return EXIT_OUTDATED
+    return EXIT_LOOKUP_ERROR if errors else EXIT_OK
+
+
+def run_snapshots(args):
+    from pip_toolbox import config
+    from pip_toolbox.snapshots import diff, list_snapshots, missing_wheels, restore_targets, take_snapshot
+    if args.action == "take":
+        snapshot = take_snapshot(args.label)
+        emit({"type": "snapshot", "id": snapshot["id"], "label": snapshot["label"],
+              "packages": len(snapshot["packages"]), "path": snapshot["path"]})
+        return EXIT_OK
+    for snapshot in list_snapshots(config.target_python):
+        snapshot_diff = diff(snapshot)
+        emit({"type": "snapshot", "id": snapshot["id"], "label": snapshot["label"], "created": snapshot["created"],
+              "packages": len(snapshot["packages"]), "changed": len(snapshot_diff.changed),
+              "added": len(snapshot_diff.added), "removed": len(snapshot_diff.removed),
+              "modified": len(snapshot_diff.modified),
+              "missing_wheels": missing_wheels(restore_targets(snapshot_diff))})
+    return EXIT_OK
+
+
+def run_rollback(args):
+    from pip_toolbox import config
+    from pip_toolbox.snapshots import list_snapshots, rollback
+    snapshots = list_snapshots(config.target_python)
+    if args.snapshot:
+        snapshots = [s for s in snapshots if s["id"] == args.snapshot]
+    if not snapshots:
+        emit({"type": "error", "error": f"找不到快照: {args.snapshot or '(没有任何快照)'}"})
+        return EXIT_USAGE
+    snapshot = snapshots[0]
+    success = rollback(snapshot, on_log=lambda message: print(message.rstrip("\n")))
+    emit({"type": "rollback", "id": snapshot["id"], "success": success})
+    return EXIT_OK if success else EXIT_LOOKUP_ERROR
+
+
+def run_mirrors(args):
+    from pip_toolbox.config import pip_command
+    from pip_toolbox.installer import run_pip_command
+    from pip_toolbox.mirrors import expected_seconds, is_usable, probe_mirrors
+
+    ranked = probe_mirrors(args.candidates or None, timeout=args.timeout)
+    for position, probe in enumerate(ranked, 1):
+        seconds = expected_seconds(probe)
+        emit({"type": "mirror", "rank": position, "url": probe.url,
+              "connect_seconds": round(probe.connect_seconds, 4) if probe.connect_seconds is not None else None,
+              "ttfb_seconds": round(probe.ttfb_seconds, 4) if probe.ttfb_seconds is not None else None,
+              "throughput": round(probe.throughput) if probe.throughput else None,
+              "expected_seconds": round(seconds, 4) if seconds is not None else None,
+              "fresh": probe.fresh, "checked": probe.checked, "latest": probe.latest, "error": probe.error})
+    best = next((probe for probe in ranked if is_usable(probe)), None)
+    if best is None:
+        return EXIT_LOOKUP_ERROR
+    if args.apply:
+        _, success = run_pip_command(pip_command("config", "set", "global.index-url", best.url), "设置索引")
+        emit({"type": "applied", "url": best.url, "success": success})
+        return EXIT_OK if success else EXIT_LOOKUP_ERROR
+    return EXIT_OK
+
+
+def build_parser():
+    from pip_toolbox.versions import DEFAULT_VERSION_KINDS, VERSION_KINDS
+    parser = argparse.ArgumentParser(prog="pip-toolbox", description="Python pip 包管理器 (不带子命令时启动图形界面)")
+    parser.add_argument("--index-url", help="使用指定的索引 URL，而不是 pip 配置中的索引")
+    parser.add_argument("--secondary-index", metavar="URL", action="append",
+                        help="备用索引 (可重复)：主索引超过延迟预算未响应或失败时同时查询，先返回的结果胜出 "
+                             "(也可设置环境变量 PIP_TOOLBOX_SECONDARY_INDEXES)")
+    parser.add_argument("--hedge-delay", type=float, metavar="SECONDS", help="对冲查询的延迟预算 (秒，默认 0.75)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="记录各阶段耗时，退出时导出为 Chrome trace JSON 并在 stderr 打印百分位数摘要 "
+                             "(也可设置环境变量 PIP_TOOLBOX_TRACE)")
+    parser.add_argument("--python", metavar="PATH", help="管理指定解释器 (如虚拟环境的 python) 的包，而不是 PATH 中的 pip")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("list", help="列出已安装的包").set_defaults(func=run_list)
+
+    outdated = subparsers.add_parser("outdated", help="检查过时包，结果按完成顺序流式输出")
+    outdated.add_argument("packages", nargs="*", help="只检查这些包 (默认检查全部已安装包)")
+    outdated.add_argument("-j", "--workers", type=int, default=None, help="并发查询数 (默认取 PIP_TOOLBOX_WORKERS)")
+    outdated.add_argument("--kinds", type=parse_kinds, default=DEFAULT_VERSION_KINDS,
+                          help=f"计入最新版本的版本类型，逗号分隔 (默认 {','.join(DEFAULT_VERSION_KINDS)}，"
+                               f"可选 {','.join(VERSION_KINDS)})")
+    outdated.add_argument("--only-outdated", action="store_true", help="只输出过时的包")
+    outdated.add_argument("--resume", action="store_true",
+                          help="从上次中断的检查继续 (沿用检查点中仍然有效的结果，只查询其余的包)")
+    outdated.set_defaults(func=run_outdated)
+
+    versions = subparsers.add_parser("versions", help="列出包的可用版本")
+    versions.add_argument("package")
+    versions.add_argument("--kinds", type=parse_kinds, default=VERSION_KINDS, help="只显示这些版本类型，逗号分隔")
+    versions.set_defaults(func=run_versions)
+
+    envs = subparsers.add_parser("envs", help="列出、登记或移除目标环境")
+    envs.add_argument("action", nargs="?", choices=("list", "add", "remove"), default="list")
+    envs.add_argument("targets", nargs="*", help="add: 解释器路径；remove: 环境名称或解释器路径")
+    envs.add_argument("--name", help="add: 环境名称 (默认取虚拟环境目录名)")
+    envs.add_argument("--scan", metavar="DIR", action="append", help="add: 登记 DIR 下所有虚拟环境 (可重复)")
+    envs.set_defaults(func=run_envs)
+
+    matrix = subparsers.add_parser("matrix", help="所有登记环境的过时包矩阵")
+    matrix.add_argument("--env", action="append", help="只包含这些环境 (名称，可重复)")
+    matrix.add_argument("-j", "--workers", type=int, default=None, help="并发查询/扫描数 (默认取 PIP_TOOLBOX_WORKERS)")
+    matrix.add_argument("--kinds", type=parse_kinds, default=DEFAULT_VERSION_KINDS, help="计入最新版本的版本类型，逗号分隔")
+    matrix.add_argument("--only-outdated", action="store_true", help="只输出至少在一个环境中过时的包")
+    matrix.set_defaults(func=run_matrix)
+
+    snapshots = subparsers.add_parser("snapshots", help="列出或记录已安装包的快照 (安装与全部更新前会自动记录)")
+    snapshots.add_argument("action", nargs="?", choices=("list", "take"), default="list")
+    snapshots.add_argument("--label", default="手动快照", help="take: 快照说明")
+    snapshots.set_defaults(func=run_snapshots)
+
+    rollback = subparsers.add_parser("rollback", help="从 wheelhouse 离线回滚到快照 (一次 pip 安装事务)")
+    rollback.add_argument("snapshot", nargs="?", help="快照 ID (默认最新的快照)")
+    rollback.set_defaults(func=run_rollback)
+
+    mirrors = subparsers.add_parser("mirrors", help="并行测速候选索引 (首字节时间、吞吐量、新鲜度) 并排名")
+    mirrors.add_argument("candidates", nargs="*", help="候选索引 URL (默认取 PIP_TOOLBOX_MIRRORS 或内置列表)")
+    mirrors.add_argument("--timeout", type=float, default=10, help="每个请求的超时 (秒)")
+    mirrors.add_argument("--apply", action="store_true", help="把排名第一的索引设置为 pip 的 global.index-url")
+    mirrors.set_defaults(func=run_mirrors)
+    return parser
+
+
+def main(argv=None):
+    global _stdout
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        from pip_toolbox.main import main as gui_main
+        return gui_main()
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        from pip_toolbox.tracing import enable
+        enable(args.trace)
+    if args.command is None:
+        from pip_toolbox.main import main as gui_main
+        return gui_main()
+    if args.python:
+        from pip_toolbox.environments import Environment, InterpreterError, activate
+        env = Environment(args.python, args.python)
+        try:
+            env.probe()
+        except InterpreterError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        activate(env)
+    if args.index_url:
+        from pip_toolbox.lookup import set_index_url
+        set_index_url(args.index_url)
+    if args.secondary_index or args.hedge_delay is not None:
+        from pip_toolbox import lookup
+        lookup.set_secondary_index_urls(args.secondary_index or lookup.secondary_index_urls, args.hedge_delay)
+    _stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import os
+import shutil
+
+# --- 配置 ---
+PIP_COMMAND = shutil.which("pip3") or shutil.which("pip") or "pip"
+DEFAULT_INDEX_URL = "https://pypi.org/simple"
+# 「测速选源」比较的候选索引，可用环境变量 PIP_TOOLBOX_MIRRORS (逗号分隔) 覆盖
+MIRROR_CANDIDATES = tuple(u.strip() for u in os.environ.get("PIP_TOOLBOX_MIRRORS", "").split(",") if u.strip()) or (
+    DEFAULT_INDEX_URL,
+    "https://pypi.tuna.tsinghua.edu.cn/simple",
+    "https://mirrors.aliyun.com/pypi/simple",
+    "https://mirrors.ustc.edu.cn/pypi/simple",
+    "https://mirrors.cloud.tencent.com/pypi/simple",
+)
+# 备用索引 (逗号分隔)：主索引在 HEDGE_DELAY 秒内没有响应或查询失败时，同时向备用索引查询，先返回的结果胜出
+SECONDARY_INDEX_URLS = tuple(u.strip().rstrip("/") for u in os.environ.get("PIP_TOOLBOX_SECONDARY_INDEXES", "").split(",")
+                             if u.strip())
+HEDGE_DELAY = float(os.environ.get("PIP_TOOLBOX_HEDGE_DELAY", "0.75") or 0.75)  # 对冲查询的延迟预算 (秒)
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 4) * 4)
+USE_NATIVE_INDEX = os.environ.get("PIP_TOOLBOX_NATIVE_INDEX", "1") != "0"  # 直接读取 Simple API，不启动 pip 子进程
+LOOKUP_TIMEOUT = 30  # pip index versions 回退查询的超时 (秒)
+PIP_TIMEOUT = 600  # 安装/卸载等 pip 命令的超时 (秒)
+OUTPUT_TAIL_LINES = 200  # 未逐行转发时，pip 输出只保留最后这么多行
+target_python = None  # 正在管理的解释器；None 表示使用 PATH 中的 pip (PIP_COMMAND)
+
+
+def pip_command(*args):
+    """构造针对当前目标环境的 pip 命令；目标为其它解释器时使用 '<python> -m pip'。"""
+    if target_python:
+        return [target_python, "-m", "pip", *args]
+    return [PIP_COMMAND, *args]
+
+
+def set_target_python(python):
+    """切换之后 pip 命令作用的解释器 (None 恢复为 PATH 中的 pip)。"""
+    global target_python
+    target_python = python
+
+
+def get_worker_count(default=DEFAULT_WORKERS):
+    """读取并发查询的工作线程数 (环境变量 PIP_TOOLBOX_WORKERS 优先)。"""
+    try:
+        value = int(os.environ.get("PIP_TOOLBOX_WORKERS", default))
+    except ValueError:
+        value = default
+    return max(1, value)
+
+
+CHECK_WORKERS = get_worker_count()  # 检查更新时的并发查询数 (1 即串行)
+DOWNLOAD_WORKERS = max(1, int(os.environ.get("PIP_TOOLBOX_DOWNLOAD_WORKERS", "4") or 4))  # 预下载的并发数
+USE_PREFETCH = os.environ.get("PIP_TOOLBOX_PREFETCH", "1") != "0"  # 安装前先并行下载到本地 wheelhouse
+USE_SNAPSHOTS = os.environ.get("PIP_TOOLBOX_SNAPSHOTS", "1") != "0"  # 安装前记录快照并保留旧版本发行文件，以便离线回滚
+UPDATE_BATCH_SIZE = int(os.environ.get("PIP_TOOLBOX_UPDATE_BATCH", "0") or 0)  # 全部更新时每个 pip 事务的包数，0 表示一次全部安装
+USE_SPECULATIVE_PREFETCH = os.environ.get("PIP_TOOLBOX_SPECULATIVE", "1") != "0"  # 在后台预取可见行与选中行附近的版本
+HEDGE_WORKERS = CHECK_WORKERS * 2  # 对冲查询中每个索引的线程池大小 (慢索引上落后的请求还会占用一段时间)
+SPECULATIVE_WORKERS = 4  # 推测预取的并发上限 (低于检查更新，避免与用户发起的查询争抢)
+SPECULATIVE_RADIUS = 5  # 预取选中行与可见窗口上下各这么多行
+SPECULATIVE_DELAY_MS = 150  # 滚动/选择停止多久后才预取 (毫秒)，快速滚动经过的行不会被查询
+SEARCH_DEBOUNCE_MS = 80  # 搜索框停止输入多久后才过滤 (毫秒)
+UI_PUMP_MS = 50  # 界面线程处理工作线程事件的间隔 (毫秒)
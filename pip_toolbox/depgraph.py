@@ -0,0 +1,221 @@
+"""已安装包的依赖图。
+
+依赖来自每个发行包元数据中的 Requires-Dist (.egg-info 则为 requires.txt)，只保留当前环境满足环境标记、
+且不依赖 extra 的依赖，并且只记录同样已安装的包。图中同时维护反向索引 (谁依赖了这个包)，用于：
+- 全部更新时按拓扑顺序 (先依赖、后被依赖) 安装，并把互不相关的包组合到同一个 pip 事务中；
+- 卸载前列出依赖该包的其他包；
+- 安装前用依赖者声明的版本范围预检冲突 (见 preflight)。
+"""
+import os
+import threading
+
+from packaging.markers import InvalidMarker, UndefinedComparison, UndefinedEnvironmentName
+from packaging.requirements import InvalidRequirement, Requirement
+
+from pip_toolbox.inventory import scan_installed
+from pip_toolbox.tracing import span
+from pip_toolbox.versions import normalize_name
+
+_requires_cache = {}  # 元数据路径 -> (mtime_ns, [(依赖名, SpecifierSet)])
+_cache_lock = threading.Lock()
+
+
+def _parse_requirement(line):
+    """解析一条依赖声明，返回在当前环境中生效的 (包名, 版本范围)；只在某个 extra 下需要或标记不满足时返回 None。"""
+    try:
+        req = Requirement(line)
+    except InvalidRequirement:
+        return None
+    if req.marker is not None:
+        try:
+            if not req.marker.evaluate({"extra": ""}):
+                return None
+        except (InvalidMarker, UndefinedComparison, UndefinedEnvironmentName):
+            return None
+    return req.name, req.specifier
+
+
+def read_requires(entry_path):
+    """读取 .dist-info / .egg-info 中声明的依赖，返回 [(包名 (未规范化), SpecifierSet)]。"""
+    lines = []
+    try:
+        if entry_path.endswith(".dist-info"):
+            with open(os.path.join(entry_path, "METADATA"), encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    if not line.strip():
+                        break  # 头部结束，后面是描述正文
+                    if line.startswith("Requires-Dist:"):
+                        lines.append(line[14:].strip())
+        elif os.path.isdir(entry_path):
+            with open(os.path.join(entry_path, "requires.txt"), encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith("["):
+                        break  # 之后是 extra 或带条件的分节
+                    if line and not line.startswith("#"):
+                        lines.append(line)
+    except OSError:
+        return []
+    return [req for req in map(_parse_requirement, lines) if req]
+
+
+def cached_requires(entry_path):
+    """带缓存的 read_requires：元数据目录的 mtime 未变化时不重新读取。"""
+    try:
+        mtime = os.stat(entry_path).st_mtime_ns
+    except OSError:
+        return []
+    with _cache_lock:
+        cached = _requires_cache.get(entry_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    requires = read_requires(entry_path)
+    with _cache_lock:
+        _requires_cache[entry_path] = (mtime, requires)
+    return requires
+
+
+class DependencyGraph:
+    """已安装包之间的依赖关系。包名可以用任意写法传入，内部按 PEP 503 规范化。"""
+
+    def __init__(self, names, requires, versions=None):
+        """names: 规范化名 -> 显示名；requires: 规范化名 -> {依赖的规范化名: SpecifierSet} (只含已安装的包)；
+        versions: 规范化名 -> 已安装版本。"""
+        self.names = names
+        self.requires = requires
+        self.versions = versions or {}
+        self.required_by = {key: set() for key in names}
+        for key, deps in requires.items():
+            for dep in deps:
+                self.required_by[dep].add(key)
+        self._rank = None
+
+    @classmethod
+    def from_dists(cls, dists):
+        """由 InstalledDist 列表构建。"""
+        names = {normalize_name(dist.name): dist.name for dist in dists}
+        requires = {}
+        for dist in dists:
+            key = normalize_name(dist.name)
+            deps = requires[key] = {}
+            for name, specifier in cached_requires(dist.path):
+                dep = normalize_name(name)
+                if dep in names and dep != key:
+                    deps[dep] = deps[dep] & specifier if dep in deps else specifier
+        return cls(names, requires, {normalize_name(dist.name): dist.version for dist in dists})
+
+    def __len__(self):
+        return len(self.names)
+
+    def _walk(self, key, edges):
+        """从 key 沿 edges 能到达的所有节点 (不含 key 本身)。"""
+        seen = set()
+        stack = [key]
+        while stack:
+            for nxt in edges.get(stack.pop(), ()):
+                if nxt not in seen and nxt != key:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return seen
+
+    def dependencies(self, name, recursive=False):
+        """name 依赖的已安装包 (显示名，按字母排序)。"""
+        key = normalize_name(name)
+        keys = self._walk(key, self.requires) if recursive else self.requires.get(key, ())
+        return sorted(self.names[k] for k in keys)
+
+    def requirements_on(self, name):
+        """已安装的包对 name 声明的版本范围：{依赖者的规范化名: SpecifierSet}。"""
+        key = normalize_name(name)
+        return {dependent: self.requires[dependent][key] for dependent in self.required_by.get(key, ())}
+
+    def dependents(self, name, recursive=False):
+        """依赖 name 的已安装包 (显示名，按字母排序)；recursive 为 True 时包含间接依赖者。"""
+        key = normalize_name(name)
+        keys = self._walk(key, self.required_by) if recursive else self.required_by.get(key, ())
+        return sorted(self.names[k] for k in keys)
+
+    def _ranks(self):
+        """全图的拓扑序号 (先依赖、后被依赖；同层按名称)；环中的包排在最后。"""
+        if self._rank is None:
+            remaining = {key: len(deps) for key, deps in self.requires.items()}
+            ready = sorted(key for key, count in remaining.items() if count == 0)
+            order = []
+            while ready:
+                next_ready = []
+                for key in ready:
+                    order.append(key)
+                    for dependent in self.required_by[key]:
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            next_ready.append(dependent)
+                ready = sorted(next_ready)
+            placed = set(order)
+            order += sorted(key for key in self.names if key not in placed)
+            self._rank = {key: i for i, key in enumerate(order)}
+        return self._rank
+
+    def topological_order(self, names, key=None):
+        """按拓扑顺序 (依赖在前) 排列 names；key 从元素中取出包名，默认元素本身即包名。"""
+        ranks = self._ranks()
+        key = key or (lambda item: item)
+        unknown = len(ranks)
+        return sorted(names, key=lambda item: (ranks.get(normalize_name(key(item)), unknown), normalize_name(key(item))))
+
+    def independent_groups(self, names, key=None):
+        """把 names 分成互不依赖 (直接或间接) 的组，组内按拓扑顺序排列，各组按第一个元素的拓扑顺序排列。"""
+        key = key or (lambda item: item)
+        items = self.topological_order(names, key)
+        index = {normalize_name(key(item)): i for i, item in enumerate(items)}
+        parent = list(range(len(items)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for name, i in index.items():
+            for dep in self._walk(name, self.requires):
+                j = index.get(dep)
+                if j is not None:
+                    parent[find(i)] = find(j)
+        groups = {}
+        for i, item in enumerate(items):
+            groups.setdefault(find(i), []).append(item)
+        return list(groups.values())  # 字典保持插入顺序，即各组第一个元素的拓扑顺序
+
+
+def build_graph(dists=None):
+    """为当前环境 (或给定的 InstalledDist 列表) 构建依赖图；依赖声明按元数据 mtime 缓存。"""
+    with span("depgraph.build") as s:
+        graph = DependencyGraph.from_dists(scan_installed() if dists is None else dists)
+        s.set(packages=len(graph))
+    return graph
+
+
+def update_batches(graph, packages, batch_size=0):
+    """为全部更新安排 pip 事务：[(包名, 已安装版本, 最新版本)] -> 批次列表。
+
+    batch_size 为 0 时只有一个批次，按拓扑顺序排列；否则把互不依赖的组装入不超过 batch_size 的批次，
+    超过 batch_size 的组按拓扑顺序切分，因此依赖总是在它的依赖者所在的批次或更早的批次中更新。
+    """
+    if not packages:
+        return []
+    if not batch_size or batch_size <= 0:
+        return [graph.topological_order(packages, key=lambda pkg: pkg[0])]
+    batches = []
+    current = []
+    for group in graph.independent_groups(packages, key=lambda pkg: pkg[0]):
+        if len(current) + len(group) > batch_size and current:
+            batches.append(current)
+            current = []
+        for i in range(0, len(group), batch_size):
+            chunk = group[i:i + batch_size]
+            if len(current) + len(chunk) > batch_size:
+                batches.append(current)
+                current = []
+            current += chunk
+    if current:
+        batches.append(current)
+    return batches
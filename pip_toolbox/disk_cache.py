@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# --- 配置 (均可通过环境变量覆盖) ---
+DEFAULT_TTL = 3600  # 秒，超过后需要向索引重新验证
+DEFAULT_MAX_ENTRIES = 20000
+EVICTION_POLICIES = ("lru", "fifo")  # lru: 按最近访问淘汰; fifo: 按获取时间淘汰
+EVICTION_CHECK_INTERVAL = 200  # 每写入多少次检查一次容量
+
+CacheEntry = namedtuple("CacheEntry", "versions fetched_at etag last_modified")
+
+
+def user_cache_dir(app_name="pip-toolbox"):
+    """返回平台相关的用户缓存目录。"""
+    override = os.environ.get("PIP_TOOLBOX_CACHE_DIR")
+    if override:
+        return override
+    if os.name == 'nt':
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        return os.path.join(base, app_name, "Cache")
+    if sys.platform == 'darwin':
+        return os.path.join(os.path.expanduser("~/Library/Caches"), app_name)
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, app_name)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class VersionDiskCache:
+    """以 (索引 URL, 规范化包名) 为键、保存在 SQLite 中的持久版本缓存。
+
+    每个线程使用独立连接，数据库使用 WAL 模式，因此多个线程和多个进程可以同时读写。
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, eviction="lru"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"未知的淘汰策略: {eviction}")
+        self.path = path or os.path.join(user_cache_dir(), "versions.sqlite3")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS versions (
+                index_url TEXT NOT NULL,
+                name TEXT NOT NULL,
+                versions TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                PRIMARY KEY (index_url, name)
+            );
+            CREATE INDEX IF NOT EXISTS versions_accessed ON versions (accessed_at);
+            CREATE INDEX IF NOT EXISTS versions_fetched ON versions (fetched_at);
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def is_fresh(self, entry, now=None):
+        """条目是否仍在 TTL 内 (无需重新验证)。"""
+        return ((now or time.time()) - entry.fetched_at) < self.ttl
+
+    def get(self, index_url, name):
+        """读取条目，不存在时返回 None (不论是否过期)。"""
+        conn = self._connect()
+        row = conn.execute("SELECT versions, fetched_at, etag, last_modified FROM versions "
+                           "WHERE index_url = ? AND name = ?", (index_url, name)).fetchone()
+        if row is None:
+            return None
+        if self.eviction == "lru":
+            conn.execute("UPDATE versions SET accessed_at = ? WHERE index_url = ? AND name = ?",
+                         (time.time(), index_url, name))
+        return CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+
+    def put(self, index_url, name, versions, etag=None, last_modified=None):
+        """写入 (或覆盖) 一个条目。"""
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO versions (index_url, name, versions, fetched_at, accessed_at, etag, last_modified) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (index_url, name, json.dumps(versions), now, now, etag, last_modified))
+        self._after_write()
+
+    def touch(self, index_url, name):
+        """重新验证成功 (304) 后刷新条目的获取时间。"""
+        now = time.time()
+        self._connect().execute("UPDATE versions SET fetched_at = ?, accessed_at = ? WHERE index_url = ? AND name = ?",
+                                (now, now, index_url, name))
+
+    def _after_write(self):
+        with self._lock:
+            self._writes += 1
+            due = self._writes % EVICTION_CHECK_INTERVAL == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """超过容量上限时按淘汰策略删除多余条目，返回删除的数量。"""
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        order_column = "accessed_at" if self.eviction == "lru" else "fetched_at"
+        conn.execute(f"DELETE FROM versions WHERE rowid IN "
+                     f"(SELECT rowid FROM versions ORDER BY {order_column} LIMIT ?)", (excess,))
+        return excess
+
+    def clear(self):
+        self._connect().execute("DELETE FROM versions")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM versions").fetchone()[0]
+
+
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+
+def get_disk_cache():
+    """返回按环境变量配置的共享磁盘缓存；被禁用或无法打开时返回 None。"""
+    global _disk_cache
+    if os.environ.get("PIP_TOOLBOX_DISK_CACHE", "1") == "0":
+        return None
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            try:
+                _disk_cache = VersionDiskCache(
+                    ttl=_env_int("PIP_TOOLBOX_CACHE_TTL", DEFAULT_TTL),
+                    max_entries=_env_int("PIP_TOOLBOX_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+                    eviction=os.environ.get("PIP_TOOLBOX_CACHE_EVICTION", "lru"))
+            except (sqlite3.Error, OSError, ValueError) as e:
+                print(f"无法打开版本磁盘缓存，已禁用: {e}")
+                _disk_cache = False
+        return _disk_cache or None
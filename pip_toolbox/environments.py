@@ -0,0 +1,241 @@
+"""多个 Python 环境 (解释器 / 虚拟环境) 的登记与并行扫描。
+
+每个环境由其解释器路径标识 (不解析符号链接，因为虚拟环境的 python 通常链接到基础解释器)。
+登记表保存在用户缓存目录的 environments.json 中 (可用 PIP_TOOLBOX_ENVIRONMENTS 指定其它文件)。
+扫描时每个解释器只启动一次以取得 sys.path，之后直接读取其 dist-info，多个环境并行扫描；
+检查更新时所有环境共用一个版本缓存，同一个包无论出现在多少个环境中都只查询一次。
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from pip_toolbox.config import LOOKUP_TIMEOUT, get_worker_count, set_target_python
+from pip_toolbox.disk_cache import user_cache_dir
+from pip_toolbox.inventory import InventoryScanner, get_default_scanner, use_scanner
+from pip_toolbox.tracing import span
+from pip_toolbox.versions import DEFAULT_VERSION_KINDS, normalize_name
+
+_PROBE_SCRIPT = ("import json, sys; print(json.dumps({'version': sys.version.split()[0], "
+                 "'prefix': sys.prefix, 'path': [p for p in sys.path if p]}))")
+DEFAULT_ENVIRONMENT = "默认 (PATH 中的 pip)"
+
+# cells 为 {环境名: 已安装版本}，只包含安装了该包的环境
+MatrixRow = namedtuple("MatrixRow", "name latest error cells")
+
+
+class InterpreterError(Exception):
+    """无法使用某个解释器 (不存在、无法运行或输出异常)。"""
+
+
+class Environment:
+    """一个目标环境；python 为 None 时表示默认环境 (当前进程的 sys.path 与 PATH 中的 pip)。"""
+
+    def __init__(self, name, python=None):
+        self.name = name
+        self.python = os.path.abspath(python) if python else None
+        self.version = None
+        self.prefix = None
+        self._paths = None
+        self._scanner = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Environment({self.name!r}, {self.python!r})"
+
+    def probe(self):
+        """运行一次解释器，取得其 Python 版本、sys.prefix 与 sys.path (结果会被缓存)。"""
+        with self._lock:
+            if self._paths is not None:
+                return self._paths
+            if self.python is None:
+                self.version, self.prefix = sys.version.split()[0], sys.prefix
+                self._paths = [p for p in sys.path if p]
+                return self._paths
+            try:
+                with span("environment.probe", env=self.name):
+                    result = subprocess.run([self.python, "-c", _PROBE_SCRIPT], capture_output=True, text=True,
+                                            encoding="utf-8", timeout=LOOKUP_TIMEOUT, check=False,
+                                            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise InterpreterError(f"无法运行 {self.python}: {e}") from e
+            if result.returncode != 0:
+                raise InterpreterError(f"{self.python} 退出码 {result.returncode}: {result.stderr.strip()[-200:]}")
+            try:
+                info = json.loads(result.stdout.strip().splitlines()[-1])
+            except (ValueError, IndexError) as e:
+                raise InterpreterError(f"{self.python} 的输出无法解析") from e
+            self.version, self.prefix, self._paths = info["version"], info["prefix"], info["path"]
+            return self._paths
+
+    @property
+    def scanner(self):
+        """该环境专用的增量扫描器 (默认环境使用全局共享的扫描器)。"""
+        if self._scanner is None:
+            self._scanner = get_default_scanner() if self.python is None else InventoryScanner(paths=self.probe())
+        return self._scanner
+
+    def scan(self):
+        """返回 [(包名, 版本)]，与 get_installed_packages 的格式相同。"""
+        with span("environment.scan", env=self.name):
+            return [(dist.key, dist.version) for dist in self.scanner.scan()]
+
+
+def registry_path():
+    return os.environ.get("PIP_TOOLBOX_ENVIRONMENTS") or os.path.join(user_cache_dir(), "environments.json")
+
+
+def find_interpreters(directory):
+    """在 directory 的直接子目录中查找虚拟环境的解释器 (bin/python 或 Scripts/python.exe)。"""
+    found = []
+    try:
+        entries = sorted(os.scandir(directory), key=lambda e: e.name)
+    except OSError:
+        return found
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        for relative in (("Scripts", "python.exe"), ("bin", "python")):
+            candidate = os.path.join(entry.path, *relative)
+            if os.path.isfile(candidate):
+                found.append((entry.name, candidate))
+                break
+    return found
+
+
+class EnvironmentRegistry:
+    """登记的目标环境，按加入顺序排列；第一个总是默认环境 (不保存到文件)。"""
+
+    def __init__(self, path=None):
+        self.path = path or registry_path()
+        self.environments = [Environment(DEFAULT_ENVIRONMENT)]
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f).get("environments", [])
+        except (OSError, ValueError, AttributeError):
+            return
+        for entry in entries:
+            if isinstance(entry, dict) and entry.get("python") and entry.get("name"):
+                if self.find(entry["python"]) is None:
+                    self.environments.append(Environment(entry["name"], entry["python"]))
+
+    def save(self):
+        entries = [{"name": env.name, "python": env.python} for env in self.environments if env.python]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"environments": entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def find(self, name_or_python):
+        """按名称或解释器路径查找环境。"""
+        python = os.path.abspath(name_or_python) if name_or_python else None
+        for env in self.environments:
+            if env.name == name_or_python or (python and env.python == python):
+                return env
+        return None
+
+    def add(self, python, name=None):
+        """验证并登记解释器，返回 Environment；已登记时返回原有的环境。"""
+        existing = self.find(python)
+        if existing is not None and existing.python:
+            return existing
+        env = Environment(name or self._default_name(python), python)
+        env.probe()
+        if self.find(env.name) is not None:
+            env.name = f"{env.name} ({env.python})"
+        self.environments.append(env)
+        self.save()
+        return env
+
+    def remove(self, name_or_python):
+        env = self.find(name_or_python)
+        if env is None or env.python is None:
+            return False
+        self.environments.remove(env)
+        self.save()
+        return True
+
+    def names(self):
+        return [env.name for env in self.environments]
+
+    @staticmethod
+    def _default_name(python):
+        """虚拟环境用其目录名，其它解释器用路径。"""
+        parent = os.path.dirname(os.path.abspath(python))
+        if os.path.basename(parent) in ("bin", "Scripts"):
+            return os.path.basename(os.path.dirname(parent))
+        return os.path.abspath(python)
+
+
+def activate(env):
+    """让之后的 pip 命令与已安装包扫描作用于 env。"""
+    from pip_toolbox.lookup import reset_index_url
+    set_target_python(env.python)
+    use_scanner(env.scanner)
+    reset_index_url()  # 不同环境可能有不同的 pip 配置
+
+
+def scan_environments(environments, max_workers=None):
+    """并行扫描多个环境，返回 {环境名: [(包名, 版本)] 或 InterpreterError}。"""
+    results = {}
+    if not environments:
+        return results
+    workers = max(1, min(len(environments), max_workers or get_worker_count()))
+
+    def scan(env):
+        try:
+            return env.scan()
+        except InterpreterError as e:
+            return e
+
+    with span("environments.scan", count=len(environments)):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="env-scan") as executor:
+            for env, packages in zip(environments, executor.map(scan, environments)):
+                results[env.name] = packages
+    return results
+
+
+def outdated_matrix(inventories, kinds=DEFAULT_VERSION_KINDS, max_workers=None, scheduler=None):
+    """对所有环境中出现的包各查询一次最新版本，返回按包名排序的 MatrixRow 列表。
+
+    inventories 为 scan_environments 的结果 (扫描失败的环境被跳过)；scheduler 可用于取消。
+    """
+    from pip_toolbox.lookup import create_check_scheduler
+    names = {}  # 规范化名 -> 显示名
+    cells = {}  # 规范化名 -> {环境名: 已安装版本}
+    for env_name, packages in inventories.items():
+        if isinstance(packages, Exception):
+            continue
+        for pkg_name, version in packages:
+            key = normalize_name(pkg_name)
+            names.setdefault(key, pkg_name)
+            cells.setdefault(key, {})[env_name] = version
+    scheduler = scheduler or create_check_scheduler({}, kinds, max_workers=max_workers)
+    rows = []
+    for (key,), resolved, error in scheduler.run([(key,) for key in sorted(names)]):
+        if error:
+            latest, lookup_error = None, f"检查时异常: {error}"
+        else:
+            latest, lookup = resolved
+            lookup_error = lookup.error
+        rows.append(MatrixRow(names[key], latest, lookup_error, cells[key]))
+    rows.sort(key=lambda row: normalize_name(row.name))
+    return rows
+
+
+def is_outdated(installed, latest):
+    """installed 是否低于 latest；无法比较时返回 None。"""
+    from packaging.version import InvalidVersion, Version
+    if not installed or not latest:
+        return None
+    try:
+        return Version(latest) > Version(installed)
+    except InvalidVersion:
+        return None
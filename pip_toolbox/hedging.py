@@ -0,0 +1,140 @@
+"""主/备索引的对冲 (hedged) 查询与各索引的统计。
+
+先只向主索引发出请求；若在延迟预算 (HEDGE_DELAY) 内没有得到结果，再向下一个备用索引发出同样的请求，
+请求失败 (包括 404) 时立即改问下一个索引。先返回有效结果的索引胜出，已排队但尚未开始的请求被取消，
+已经开始的落后请求在线程池中自然结束，其耗时仍计入统计。这样单个镜像变慢或降级时，整次检查不会被它拖到超时。
+每个索引使用各自大小为 HEDGE_WORKERS 的共享线程池，不会为每次尝试创建新线程；慢索引的落后请求占满自己的
+线程池时，新的请求在队列中等待，由备用索引先给出结果后被取消，不会影响其他索引。
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pip_toolbox.config import HEDGE_WORKERS
+from pip_toolbox.tracing import percentile, span
+
+LATENCY_SAMPLES = 512  # 每个索引保留的最近耗时样本数
+
+
+class IndexStats:
+    """各索引的请求数、胜出数、失败数与耗时分布 (线程安全)。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self.hedged = 0  # 发出了备用请求的查询数
+
+    def _entry(self, url):
+        entry = self._indexes.get(url)
+        if entry is None:
+            entry = self._indexes[url] = {"requests": 0, "wins": 0, "errors": 0,
+                                          "latencies": deque(maxlen=LATENCY_SAMPLES)}
+        return entry
+
+    def record(self, url, seconds, ok):
+        with self._lock:
+            entry = self._entry(url)
+            entry["requests"] += 1
+            if ok:
+                entry["latencies"].append(seconds)
+            else:
+                entry["errors"] += 1
+
+    def record_win(self, url, hedged):
+        with self._lock:
+            self._entry(url)["wins"] += 1
+            self.hedged += hedged
+
+    def reset(self):
+        with self._lock:
+            self._indexes.clear()
+            self.hedged = 0
+
+    def stats(self):
+        """{索引 URL: {requests, wins, errors, p50_seconds, p95_seconds}}。"""
+        with self._lock:
+            snapshot = {url: (dict(entry), sorted(entry["latencies"])) for url, entry in self._indexes.items()}
+        result = {}
+        for url, (entry, latencies) in snapshot.items():
+            result[url] = {"requests": entry["requests"], "wins": entry["wins"], "errors": entry["errors"],
+                           "p50_seconds": percentile(latencies, 50) if latencies else None,
+                           "p95_seconds": percentile(latencies, 95) if latencies else None}
+        return result
+
+    def summary(self):
+        parts = []
+        for url, s in self.stats().items():
+            latency = f"p50 {s['p50_seconds'] * 1000:.0f}毫秒 / p95 {s['p95_seconds'] * 1000:.0f}毫秒" \
+                if s["p50_seconds"] is not None else "无成功请求"
+            parts.append(f"{url}: 胜出 {s['wins']}/{s['requests']}，失败 {s['errors']}，{latency}")
+        if not parts:
+            return "索引统计: 无请求"
+        return f"索引统计 (对冲 {self.hedged} 次):\n   " + "\n   ".join(parts)
+
+
+index_stats = IndexStats()  # 全局统计，检查更新结束时显示
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(url):
+    """索引 url 的对冲查询线程池 (首次使用时创建)。"""
+    with _executors_lock:
+        executor = _executors.get(url)
+        if executor is None:
+            executor = _executors[url] = ThreadPoolExecutor(max_workers=HEDGE_WORKERS,
+                                                            thread_name_prefix="hedged-lookup")
+        return executor
+
+
+def hedged_call(fetch, urls, delay, stats=index_stats):
+    """依次对 urls 调用 fetch(url)，返回 (胜出的 URL, 结果)；全部失败时抛出其中一个异常 (优先 not_found)。
+
+    urls[0] 为主索引；每等待 delay 秒仍无结果，或正在等待的请求全部失败时，再启用下一个索引。
+    """
+    results = queue.Queue()
+    futures = []
+
+    def attempt(url):
+        start = time.perf_counter()
+        try:
+            value = fetch(url)
+        except Exception as e:
+            stats.record(url, time.perf_counter() - start, False)
+            results.put((url, None, e))
+        else:
+            stats.record(url, time.perf_counter() - start, True)
+            results.put((url, value, None))
+
+    def launch(url):
+        futures.append(get_executor(url).submit(attempt, url))
+
+    launch(urls[0])
+    launched, pending, errors = 1, 1, {}
+    while True:
+        try:
+            url, value, error = results.get(timeout=delay if launched < len(urls) else None)
+        except queue.Empty:
+            with span("index.hedge", url=urls[launched]):
+                launch(urls[launched])
+            launched += 1
+            pending += 1
+            continue
+        pending -= 1
+        if error is None:
+            stats.record_win(url, launched > 1)
+            for future in futures:
+                future.cancel()  # 只会取消仍在排队的尝试
+            return url, value
+        errors[url] = error
+        if launched < len(urls):
+            launch(urls[launched])
+            launched += 1
+            pending += 1
+        elif not pending:
+            # 明确的「不存在」(如 404) 比连接失败更有参考价值；其次按索引顺序取主索引的错误
+            ordered = [errors[u] for u in urls if u in errors]
+            raise next((e for e in ordered if getattr(e, "not_found", False)), ordered[0])
@@ -0,0 +1,336 @@
+import base64
+import gzip
+import http.client
+import json
+import threading
+import time
+import zlib
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, unquote
+from urllib.request import getproxies, proxy_bypass
+
+from packaging.version import Version, InvalidVersion
+
+from pip_toolbox.config import DEFAULT_INDEX_URL
+from pip_toolbox.tracing import span
+from pip_toolbox.versions import normalize_name
+
+# --- 配置 ---
+USER_AGENT = "pip-toolbox"
+ACCEPT_HEADER = ("application/vnd.pypi.simple.v1+json, "
+                 "application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.01")
+MAX_REDIRECTS = 5
+ARCHIVE_SUFFIXES = (".whl", ".tar.gz", ".zip", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".egg")
+
+# versions 为 None 表示服务器返回 304 (未修改)
+ProjectPage = namedtuple("ProjectPage", "versions etag last_modified")
+
+
+class IndexLookupError(Exception):
+    """从索引查询版本失败。not_found 为 True 表示索引上不存在该项目，index_url 为给出这一答复的索引。"""
+
+    def __init__(self, message, not_found=False, status=None, index_url=None):
+        super().__init__(message)
+        self.not_found = not_found
+        self.status = status
+        self.index_url = index_url
+
+
+def version_from_filename(filename, project_name):
+    """从发行文件名 (wheel 或源码包) 中提取版本号，无法识别时返回 None。"""
+    filename = unquote(filename.split("#", 1)[0].rsplit("/", 1)[-1])
+    lower = filename.lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        if lower.endswith(suffix):
+            stem = filename[:-len(suffix)]
+            break
+    else:
+        return None
+    # 文件名形如 <name>-<version>[-<wheel 标签>]，名称本身可能包含 '-'
+    rest = None
+    normalized = normalize_name(project_name)
+    for i, ch in enumerate(stem):
+        if ch == "-" and normalize_name(stem[:i]) == normalized:
+            rest = stem[i + 1:]
+            break
+    if rest is None:
+        parts = stem.split("-")
+        if len(parts) < 2:
+            return None
+        rest = "-".join(parts[1:])
+    if suffix in (".whl", ".egg"):
+        rest = rest.split("-", 1)[0]
+    return rest or None
+
+
+class _AnchorParser(HTMLParser):
+    """收集 PEP 503 页面中的 <a> 链接 (href, 文本, 是否 yanked)。"""
+
+    def __init__(self):
+        super().__init__()
+        self.anchors = []
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            attrs = dict(attrs)
+            self._current = [attrs.get("href") or "", "", "data-yanked" in attrs]
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._current[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._current is not None:
+            self.anchors.append(tuple(self._current))
+            self._current = None
+
+
+def parse_simple_json(payload, project_name):
+    """解析 PEP 691 JSON 项目页面，返回未被撤回 (yanked) 的版本字符串集合。"""
+    data = json.loads(payload)
+    live, seen = set(), set()
+    for file_info in data.get("files", []):
+        version = version_from_filename(file_info.get("filename", ""), project_name)
+        if not version:
+            continue
+        seen.add(version)
+        if not file_info.get("yanked"):
+            live.add(version)
+    # PEP 700 的 versions 字段包含没有文件名可推断的版本
+    for version in data.get("versions", []):
+        if version not in seen:
+            live.add(version)
+    return live
+
+
+def parse_simple_html(payload, project_name):
+    """解析 PEP 503 HTML 项目页面，返回未被撤回 (yanked) 的版本字符串集合。"""
+    parser = _AnchorParser()
+    parser.feed(payload)
+    parser.close()
+    live = set()
+    for href, text, yanked in parser.anchors:
+        version = version_from_filename(text.strip() or href, project_name)
+        if version and not yanked:
+            live.add(version)
+    return live
+
+
+def sort_versions(version_strings):
+    """丢弃无法解析的版本并按从新到旧排序。"""
+    parsed = []
+    for v_str in version_strings:
+        try:
+            parsed.append(Version(v_str))
+        except InvalidVersion:
+            pass
+    parsed = sorted(set(parsed), reverse=True)
+    return [str(v) for v in parsed]
+
+
+class SimpleIndexClient:
+    """直接读取 Simple API (PEP 691 JSON / PEP 503 HTML) 的索引客户端。
+
+    同一主机的 HTTP 连接在多次查询之间保持 keep-alive 并复用，可被多个线程共享。
+    """
+
+    def __init__(self, index_url=DEFAULT_INDEX_URL, timeout=15, pool_size=16):
+        self.index_url = index_url.rstrip("/") + "/"
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    # --- 连接池 ---
+    def _connection_key(self, scheme, netloc):
+        return scheme, netloc
+
+    def _new_connection(self, scheme, netloc):
+        parts = urlsplit(f"{scheme}://{netloc}")
+        host, port = parts.hostname, parts.port
+        proxy = None if proxy_bypass(host) else getproxies().get(scheme)
+        conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if proxy:
+            proxy_parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            if scheme == "https":
+                # 通过 CONNECT 隧道在代理之上建立到索引的 TLS 连接
+                conn = http.client.HTTPSConnection(proxy_parts.hostname, proxy_parts.port, timeout=self.timeout)
+                conn.set_tunnel(host, port)
+            else:
+                conn = http.client.HTTPConnection(proxy_parts.hostname, proxy_parts.port, timeout=self.timeout)
+                conn._pip_toolbox_absolute = True
+        else:
+            conn = conn_class(host, port, timeout=self.timeout)
+        with self._lock:
+            self.connections_opened += 1
+        return conn
+
+    def _acquire(self, scheme, netloc):
+        key = self._connection_key(scheme, netloc)
+        with self._lock:
+            idle = self._pool.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(scheme, netloc), False
+
+    def _release(self, scheme, netloc, conn):
+        key = self._connection_key(scheme, netloc)
+        with self._lock:
+            idle = self._pool.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """关闭所有空闲连接。"""
+        with self._lock:
+            pools, self._pool = self._pool, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    # --- HTTP ---
+    def request(self, url, headers=None, timings=None, timeout=None):
+        """发送 GET 请求并返回 (状态码, 响应头, 正文字节, 最终 URL)，自动跟随重定向。
+
+        给出 timings 字典时，写入最后一次请求的 first_byte (发出请求到收到响应头的秒数，含建立连接)、
+        total (秒) 与 wire_bytes (解压前的正文字节数)。timeout 覆盖本次请求的套接字超时 (秒)。
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request_once(url, headers or {}, timings, timeout)
+            if status in (301, 302, 303, 307, 308) and response_headers.get("location"):
+                url = urljoin(url, response_headers["location"])
+                continue
+            return status, response_headers, body, url
+        raise IndexLookupError(f"重定向次数过多: {url}")
+
+    def _request_once(self, url, headers, timings=None, timeout=None):
+        parts = urlsplit(url)
+        netloc = parts.netloc.rsplit("@", 1)[-1]
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request_headers = {
+            "Host": netloc,
+            "User-Agent": USER_AGENT,
+            "Accept": ACCEPT_HEADER,
+            "Accept-Encoding": "gzip, deflate",
+        }
+        if parts.username:
+            credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+            request_headers["Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+        request_headers.update(headers)
+        # 复用的连接可能已被服务器关闭，此时用新连接重试一次
+        for attempt in range(2):
+            conn, reused = self._acquire(parts.scheme, netloc)
+            # 池中的连接可能带着上一次请求的超时
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            target = url if getattr(conn, "_pip_toolbox_absolute", False) else path
+            try:
+                with span("http.request", host=netloc, path=path, reused=reused) as s:
+                    start = time.perf_counter()
+                    conn.request("GET", target, headers=request_headers)
+                    response = conn.getresponse()
+                    first_byte = time.perf_counter() - start
+                    body = response.read()
+                    s.set(status=response.status, bytes=len(body))
+                if timings is not None:
+                    timings.update(first_byte=first_byte, total=time.perf_counter() - start, wire_bytes=len(body),
+                                   reused=reused)
+            except (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                    ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise IndexLookupError(f"连接 {netloc} 失败: {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise IndexLookupError(f"请求 {url} 失败: {e}") from e
+            with self._lock:
+                self.requests_sent += 1
+            response_headers = {k.lower(): v for k, v in response.getheaders()}
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(parts.scheme, netloc, conn)
+            try:
+                body = _decode_body(body, response_headers)
+            except (zlib.error, EOFError, OSError) as e:
+                # 响应不完整或损坏 (gzip.BadGzipFile 也是 OSError)，按连接失败处理以便重试
+                raise IndexLookupError(f"解压 {url} 的响应失败: {e}") from e
+            return response.status, response_headers, body
+        raise IndexLookupError(f"连接 {netloc} 失败")
+
+    # --- Simple API ---
+    def project_url(self, pkg_name):
+        return urljoin(self.index_url, normalize_name(pkg_name) + "/")
+
+    def get_project(self, pkg_name, etag=None, last_modified=None, timeout=None):
+        """获取项目页面；提供验证器时发送条件请求，未修改则返回 versions=None 的 ProjectPage。"""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        status, response_headers, body, _ = self.request(self.project_url(pkg_name), headers, timeout=timeout)
+        if status == 304:
+            return ProjectPage(None, response_headers.get("etag", etag),
+                               response_headers.get("last-modified", last_modified))
+        if status == 404:
+            raise IndexLookupError(f"索引中未找到 {pkg_name}", not_found=True, status=status,
+                                   index_url=self.index_url.rstrip("/"))
+        if status != 200:
+            raise IndexLookupError(f"查询 {pkg_name} 返回 HTTP {status}", status=status)
+        with span("parse.project_page", pkg=pkg_name, bytes=len(body)):
+            try:
+                versions = sort_versions(parse_project_page(body, response_headers.get("content-type", ""),
+                                                            pkg_name))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                # 索引给出了无法解析的页面 (json.JSONDecodeError 也是 ValueError)；重试没有意义
+                raise IndexLookupError(f"解析 {pkg_name} 的项目页面失败: {e}", status=status) from e
+        return ProjectPage(versions, response_headers.get("etag"), response_headers.get("last-modified"))
+
+    def get_versions(self, pkg_name):
+        """返回项目的可用版本列表 (从新到旧)。"""
+        return self.get_project(pkg_name).versions
+
+
+def parse_project_page(body, content_type, pkg_name):
+    """按响应类型解析项目页面，返回版本字符串集合。"""
+    text = body.decode("utf-8", errors="replace")
+    if "json" in content_type:
+        return parse_simple_json(text, pkg_name)
+    return parse_simple_html(text, pkg_name)
+
+
+def _decode_body(body, headers):
+    encoding = headers.get("content-encoding", "").lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(index_url=DEFAULT_INDEX_URL):
+    """返回给定索引 URL 的共享客户端 (连接池在所有查询之间共享)。"""
+    key = index_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = SimpleIndexClient(index_url)
+        return client
@@ -0,0 +1,282 @@
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+
+from pip_toolbox.config import OUTPUT_TAIL_LINES, PIP_TIMEOUT, UPDATE_BATCH_SIZE, USE_PREFETCH, USE_SNAPSHOTS, pip_command
+from pip_toolbox.tracing import span
+
+# --- 全局变量 ---
+install_durations = []  # 本会话中单包安装的耗时，用于估算批量更新节省的时间
+_pip_startup_seconds = None
+
+def install_command(*targets):
+    """构造安装/更新指定目标 (如 'pkg==1.0') 的 pip 命令。"""
+    return pip_command("install", "--upgrade", "--no-cache-dir", *targets)
+
+def uninstall_command(pkg_name):
+    return pip_command("uninstall", "-y", pkg_name)
+
+def run_pip_command(command, action_name, on_output=None):
+    """运行 pip 命令并等待结束，返回 (日志文本, 是否成功)。
+
+    pip 的输出 (stdout 与 stderr 合并) 在产生时逐行读取：给出 on_output 时每行立即传给它，返回的日志只含结果；
+    否则只保留最后 OUTPUT_TAIL_LINES 行附在日志中。
+    """
+    with span("pip.command", action=action_name) as s:
+        output_log, success = _run_pip_command(command, action_name, on_output)
+        s.set(success=success)
+    return output_log, success
+
+def _run_pip_command(command, action_name, on_output):
+    tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    timed_out = threading.Event()
+    try:
+        with span("subprocess.spawn", program=os.path.basename(command[0])):
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, encoding='utf-8', errors='replace',
+                                       env=dict(os.environ, PYTHONUNBUFFERED="1"),  # 让 pip 逐行输出，而不是退出时才输出
+                                       creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+    except FileNotFoundError:
+        return f"❌ 命令错误: 无法找到 '{command[0]}'. 请确保 pip 在 PATH 中。\n", False
+    except Exception as e:
+        return f"❌ 执行 {action_name} 时发生意外错误: {str(e)}\n", False
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(PIP_TIMEOUT, kill_on_timeout)
+    timer.daemon = True
+    timer.start()
+    try:
+        for line in process.stdout:
+            line = line.rstrip("\r\n")
+            if on_output:
+                on_output(line)
+            else:
+                tail.append(line)
+        process.wait()
+    except Exception as e:
+        process.kill()
+        process.wait()
+        return f"❌ 执行 {action_name} 时发生意外错误: {str(e)}\n", False
+    finally:
+        timer.cancel()
+        process.stdout.close()
+    output = ""
+    if tail:
+        omitted = "" if len(tail) < OUTPUT_TAIL_LINES else f" (最后 {OUTPUT_TAIL_LINES} 行)"
+        output = f"--- 输出{omitted} ---\n" + "\n".join(tail) + "\n"
+    if timed_out.is_set():
+        return f"⌛ {action_name} 超时 (超过{PIP_TIMEOUT // 60}分钟)。\n{output}", False
+    if process.returncode == 0:
+        return f"✅ {action_name} 成功。\n{output}", True
+    return f"❌ {action_name} 失败 (Code: {process.returncode}).\n{output}", False
+
+def pip_startup_seconds():
+    """测量一次 pip 进程启动的耗时 (结果会被缓存)，用于估算逐个安装的额外开销。"""
+    global _pip_startup_seconds
+    if _pip_startup_seconds is None:
+        start = time.perf_counter()
+        try:
+            subprocess.run(pip_command("--version"), capture_output=True, check=False, timeout=60,
+                           creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+            _pip_startup_seconds = time.perf_counter() - start
+        except (OSError, subprocess.TimeoutExpired):
+            _pip_startup_seconds = 0.0
+    return _pip_startup_seconds
+
+def estimate_serial_seconds(count, elapsed, parallel_saving=0.0):
+    """估算逐个安装 count 个包所需的时间，返回 (秒数, 估算依据)。"""
+    if install_durations:
+        return sum(install_durations) / len(install_durations) * count, "按本会话单包安装的平均耗时"
+    return (elapsed + pip_startup_seconds() * (count - 1) + parallel_saving,
+            "本次耗时 + 额外的 pip 启动开销 + 串行下载耗时")
+
+def snapshot_before(action_name, on_log=print):
+    """安装前记录快照，以便之后离线回滚；USE_SNAPSHOTS 关闭或记录失败时返回 None (不影响安装)。"""
+    if not USE_SNAPSHOTS:
+        return None
+    from pip_toolbox.snapshots import take_snapshot
+    start = time.perf_counter()
+    try:
+        snapshot = take_snapshot(action_name)
+    except OSError as e:
+        on_log(f"⚠️ 记录快照失败: {e}\n")
+        return None
+    on_log(f"📸 已记录快照 {snapshot['id']} ({len(snapshot['packages'])} 个包，"
+           f"{(time.perf_counter() - start) * 1000:.0f}毫秒)。\n")
+    return snapshot
+
+def rollback_targets_before(snapshot, targets):
+    """安装前需要保留到 wheelhouse 的旧版本：targets 将替换掉、且 wheelhouse 中还没有的已安装版本。"""
+    if snapshot is None:
+        return []
+    from pip_toolbox.snapshots import missing_wheels, replaced_targets
+    return missing_wheels(replaced_targets(snapshot, targets))
+
+def warn_missing_rollback_wheels(fetched, old_versions, on_log=print):
+    """旧版本下载失败时提醒：安装仍会进行，但这些包之后无法离线回滚。"""
+    lost = [target for target, _ in fetched.failed if target in old_versions]
+    if lost:
+        on_log(f"⚠️ 无法下载将被替换的 {len(lost)} 个当前版本 ({', '.join(lost)})，安装后这些包无法离线回滚。\n")
+
+def keep_replaced_wheels(old_versions, on_log=print):
+    """不预下载新版本时，仍在安装前单独下载将被替换的当前版本 (old_versions 来自 rollback_targets_before)。"""
+    if not old_versions:
+        return
+    from pip_toolbox.wheelhouse import prefetch
+    on_log(f"💾 安装前为回滚保留 {len(old_versions)} 个当前版本的发行文件...")
+    fetched = prefetch(old_versions, on_log)
+    on_log(fetched.summary())
+    warn_missing_rollback_wheels(fetched, old_versions, on_log)
+
+def keep_rollback_wheels(snapshot, on_log=print):
+    """安装后把被改变的包的旧版本保留在 wheelhouse 中 (包括 pip 顺带升级的依赖)。"""
+    if snapshot is None:
+        return
+    from pip_toolbox.snapshots import keep_old_wheels
+    try:
+        keep_old_wheels(snapshot, on_log)
+    except Exception as e:
+        on_log(f"⚠️ 保留旧版本发行文件失败，该快照可能无法离线回滚: {e}\n")
+
+def install_from_wheelhouse(targets, action_name, on_log=print, offline=True):
+    """从 wheelhouse 安装目标；离线安装失败 (通常是缺少新依赖) 时联网重试。返回是否成功。"""
+    from pip_toolbox.wheelhouse import offline_install_command, online_install_command
+    if offline:
+        command = offline_install_command(*targets)
+        on_log(f"⏳ {action_name} (离线)...\n   命令: {' '.join(command)}\n")
+        output_log, success = run_pip_command(command, f"{action_name} (离线)", on_log)
+        on_log(output_log)
+        if success:
+            return True
+        on_log("↩️ 离线安装失败 (可能缺少新的依赖)，改为联网安装...\n")
+    command = online_install_command(*targets)
+    on_log(f"⏳ {action_name}...\n   命令: {' '.join(command)}\n")
+    output_log, success = run_pip_command(command, action_name, on_log)
+    on_log(output_log)
+    return success
+
+def install_packages(targets, action_name, on_log=print):
+    """两阶段安装: 先并行下载到 wheelhouse，再从 wheelhouse 安装。分别报告下载与安装耗时。
+
+    安装前记录快照，并在 pip 运行之前把将被替换的当前版本下载到 wheelhouse (安装之后索引上可能已经没有，
+    例如被撤回的版本)；安装后再补齐 pip 顺带改变的依赖，以便离线回滚。
+    """
+    snapshot = snapshot_before(action_name, on_log)
+    old_versions = rollback_targets_before(snapshot, targets)
+    if not USE_PREFETCH:
+        keep_replaced_wheels(old_versions, on_log)
+        command = install_command(*targets)
+        on_log(f"⏳ {action_name}...\n   命令: {' '.join(command)}\n")
+        output_log, success = run_pip_command(command, action_name, on_log)
+        on_log(output_log)
+    else:
+        from pip_toolbox.wheelhouse import prefetch
+        fetched = prefetch(list(targets) + old_versions, on_log)
+        on_log(fetched.summary())
+        warn_missing_rollback_wheels(fetched, old_versions, on_log)
+        failed_targets = {target for target, _ in fetched.failed}
+        start = time.perf_counter()
+        success = install_from_wheelhouse(targets, action_name, on_log,
+                                          offline=not failed_targets.intersection(targets))
+        on_log(f"⏱️ 安装阶段耗时 {time.perf_counter() - start:.1f}秒。\n")
+    keep_rollback_wheels(snapshot, on_log)
+    return success
+
+def update_packages(outdated_packages, on_log=print, prefetched=()):
+    """逐个把 [(包名, 已安装版本, 最新版本)] 更新到最新版本，日志通过 on_log 输出。返回失败的包名列表。
+
+    prefetched 中的目标已在 wheelhouse 中，会先尝试离线安装。
+    """
+    failed = []
+    total = len(outdated_packages)
+    for i, (pkg_name, installed_version, latest_version) in enumerate(outdated_packages):
+        target = f"{pkg_name}=={latest_version}"
+        action_name = f"({i+1}/{total}) 更新 {pkg_name} 到 {latest_version}"
+        start = time.perf_counter()
+        if target in prefetched:
+            success = install_from_wheelhouse([target], action_name, on_log)
+        else:
+            command = install_command(target)
+            on_log(f"⏳ {action_name}...\n   命令: {' '.join(command)}\n")
+            output_log, success = run_pip_command(command, action_name, on_log)
+            on_log(output_log)
+        install_durations.append(time.perf_counter() - start)
+        if not success:
+            failed.append(pkg_name)
+    return failed
+
+def update_packages_batched(outdated_packages, on_log=print, batch_size=None):
+    """在一个 (或按 batch_size 分成几个) pip 事务中更新全部过时包。
+
+    包按依赖图的拓扑顺序 (依赖在前) 排列；分批时互不依赖的包组合在同一批中，依赖总在它的依赖者之前或同批更新。
+    某一批失败时，对其中尚未更新到目标版本的包按同样的顺序逐个更新。返回失败的包名列表。
+    开始前记录快照，并在第一批安装之前下载各包当前版本的发行文件 (预下载时一并进行)，结束后补齐 pip 顺带改变的依赖，
+    以便离线回滚。
+    """
+    from pip_toolbox.depgraph import build_graph, update_batches
+    from pip_toolbox.inventory import get_installed_packages
+    batch_size = UPDATE_BATCH_SIZE if batch_size is None else batch_size
+    graph = build_graph()
+    batches = update_batches(graph, list(outdated_packages), batch_size)
+    packages = [pkg for batch in batches for pkg in batch]
+    if len(packages) > 1:
+        groups = len(graph.independent_groups([name for name, _, _ in packages]))
+        on_log(f"🔗 依赖图: {len(graph)} 个已安装包；{len(packages)} 个待更新包分为 {groups} 个互不依赖的组，"
+               f"按依赖顺序安装。\n")
+    failed = []
+    fell_back = False
+    prefetched = set()
+    parallel_saving = 0.0
+    start = time.perf_counter()
+    snapshot = snapshot_before(f"全部更新 {len(packages)} 个包", on_log) if packages else None
+    new_versions = [f"{name}=={latest}" for name, _, latest in packages]
+    old_versions = rollback_targets_before(snapshot, new_versions)
+    if USE_PREFETCH and packages:
+        from pip_toolbox.wheelhouse import prefetch
+        fetched = prefetch(new_versions + old_versions, on_log)
+        on_log(fetched.summary())
+        warn_missing_rollback_wheels(fetched, old_versions, on_log)
+        prefetched = set(fetched.downloaded)
+        parallel_saving = max(fetched.busy_seconds - fetched.seconds, 0.0)
+    else:
+        keep_replaced_wheels(old_versions, on_log)
+    install_start = time.perf_counter()
+    for batch_no, batch in enumerate(batches, 1):
+        targets = [f"{name}=={latest}" for name, _, latest in batch]
+        action_name = f"批量更新 {len(batch)} 个包"
+        if len(batches) > 1:
+            action_name += f" (第 {batch_no}/{len(batches)} 批)"
+        if USE_PREFETCH:
+            success = install_from_wheelhouse(targets, action_name, on_log,
+                                              offline=all(t in prefetched for t in targets))
+        else:
+            command = install_command(*targets)
+            on_log(f"⏳ {action_name}...\n   命令: {' '.join(command)}\n")
+            output_log, success = run_pip_command(command, action_name, on_log)
+            on_log(output_log)
+        if success:
+            continue
+        fell_back = True
+        installed = dict(get_installed_packages())
+        remaining = [pkg for pkg in batch if installed.get(pkg[0]) != pkg[2]]
+        on_log(f"↩️ 批量安装失败，改为逐个更新其中尚未完成的 {len(remaining)} 个包...\n")
+        failed += update_packages(remaining, on_log, prefetched)
+    if USE_PREFETCH and packages:
+        on_log(f"⏱️ 安装阶段耗时 {time.perf_counter() - install_start:.1f}秒。\n")
+    elapsed = time.perf_counter() - start
+    if packages:
+        estimate, basis = estimate_serial_seconds(len(packages), elapsed, parallel_saving)
+        summary = f"⏱️ 全部更新耗时 {elapsed:.1f}秒 ({len(batches)} 个批量 pip 事务)"
+        if fell_back:
+            summary += "，其中部分包回退为逐个安装"
+        summary += f"；逐个安装估计需 {estimate:.1f}秒 ({basis})，节省约 {max(estimate - elapsed, 0):.1f}秒。"
+        on_log(summary + "\n")
+    keep_rollback_wheels(snapshot, on_log)
+    if failed:
+        on_log(f"❌ 以下 {len(failed)} 个包更新失败: {', '.join(failed)}\n")
+    return failed
@@ -0,0 +1,154 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from pip_toolbox.tracing import span
+
+# path 为 .dist-info / .egg-info 的位置，之后读取依赖等元数据时使用
+InstalledDist = namedtuple("InstalledDist", "key name version path")
+
+METADATA_SUFFIXES = (".dist-info", ".egg-info")
+
+
+def safe_key(name):
+    """与 pkg_resources 的 key 相同的规范化: 非字母数字/点的字符序列替换为 '-' 并转小写。"""
+    return re.sub(r"[^A-Za-z0-9.]+", "-", name).lower()
+
+
+def metadata_file(entry_path):
+    """返回元数据条目中保存 Name/Version 的文件路径。"""
+    if entry_path.endswith(".dist-info"):
+        return os.path.join(entry_path, "METADATA")
+    if os.path.isdir(entry_path):
+        return os.path.join(entry_path, "PKG-INFO")
+    return entry_path  # 单文件形式的 .egg-info
+
+
+def read_name_version(entry_path):
+    """只读取元数据头部的 Name 和 Version 字段，返回 (name, version)。"""
+    name = version = None
+    try:
+        with open(metadata_file(entry_path), encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    break  # 头部结束，后面是描述正文
+                if name is None and line.startswith("Name:"):
+                    name = line[5:].strip()
+                elif version is None and line.startswith("Version:"):
+                    version = line[8:].strip()
+                if name and version:
+                    break
+    except OSError:
+        pass
+    if not name or not version:
+        # 元数据缺失时从目录名推断: <name>-<version>.dist-info
+        stem = os.path.basename(entry_path).rsplit(".", 1)[0]
+        parts = stem.split("-")
+        if len(parts) >= 2:
+            name = name or parts[0]
+            version = version or parts[1]
+    return name, version
+
+
+class InventoryScanner:
+    """基于 *.dist-info / *.egg-info 目录的已安装包扫描器，支持增量重扫。
+
+    记录每个路径目录的 mtime 和元数据条目集合；重扫时目录未变化则直接复用，
+    变化时只重新读取新增或修改过的条目。
+    """
+
+    def __init__(self, paths=None):
+        self.paths = paths  # None 表示使用当前解释器的 sys.path
+        self._dirs = {}  # 目录 -> (mtime_ns, {条目名: (mtime_ns, InstalledDist 或 None)})
+        self._lock = threading.Lock()
+        self.last_reads = 0
+        self.last_duration = 0.0
+
+    def _search_paths(self):
+        paths = self.paths if self.paths is not None else sys.path
+        return [os.path.abspath(p or os.curdir) for p in paths]
+
+    def _scan_dir(self, directory):
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._dirs.pop(directory, None)
+            return {}
+        cached = self._dirs.get(directory)
+        if cached and cached[0] == dir_mtime:
+            return cached[1]
+        old_entries = cached[1] if cached else {}
+        entries = {}
+        try:
+            with os.scandir(directory) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith(METADATA_SUFFIXES):
+                        continue
+                    try:
+                        entry_mtime = dir_entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                    previous = old_entries.get(dir_entry.name)
+                    if previous and previous[0] == entry_mtime:
+                        entries[dir_entry.name] = previous
+                        continue
+                    name, version = read_name_version(dir_entry.path)
+                    self.last_reads += 1
+                    dist = InstalledDist(safe_key(name), name, version, dir_entry.path) if name and version else None
+                    entries[dir_entry.name] = (entry_mtime, dist)
+        except OSError:
+            return {}
+        self._dirs[directory] = (dir_mtime, entries)
+        return entries
+
+    def scan(self):
+        """返回按 key 排序的 InstalledDist 列表；同名包以 sys.path 中靠前的为准。"""
+        start = time.perf_counter()
+        with self._lock, span("inventory.scan") as s:
+            self.last_reads = 0
+            seen = {}
+            for directory in self._search_paths():
+                if not os.path.isdir(directory):
+                    continue
+                for _, (_, dist) in sorted(self._scan_dir(directory).items()):
+                    if dist and dist.key not in seen:
+                        seen[dist.key] = dist
+            self.last_duration = time.perf_counter() - start
+            s.set(packages=len(seen), reads=self.last_reads)
+            return sorted(seen.values())
+
+    def invalidate(self):
+        """丢弃所有记录，下次扫描时全部重新读取。"""
+        with self._lock:
+            self._dirs.clear()
+
+
+_default_scanner = InventoryScanner()  # 当前解释器 sys.path 上的扫描器
+_scanner = _default_scanner  # 共享扫描器，切换目标环境时被替换
+
+
+def scan_installed():
+    """使用共享扫描器返回当前环境的已安装包 (增量)。"""
+    return _scanner.scan()
+
+
+def get_scanner():
+    return _scanner
+
+
+def get_default_scanner():
+    return _default_scanner
+
+
+def use_scanner(scanner=None):
+    """替换共享扫描器 (切换目标环境时使用)；None 恢复为当前解释器的扫描器。"""
+    global _scanner
+    _scanner = scanner or _default_scanner
+
+
+def get_installed_packages():
+    """获取所有已安装的 pip 包及其版本 (增量扫描，只重新读取变化过的元数据目录)。"""
+    return [(dist.key, dist.version) for dist in scan_installed()]
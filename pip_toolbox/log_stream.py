@@ -0,0 +1,77 @@
+"""有界的日志缓冲。
+
+工作线程随时写入消息；界面按固定频率一次取走积压的消息，批量插入日志控件。积压数量和控件中的行数都有上限，
+完整日志另外写入按大小轮转的文件，因此长时间运行 (如全部更新) 时内存占用保持不变。
+"""
+import logging
+import logging.handlers
+import os
+import threading
+from collections import deque
+
+from pip_toolbox.disk_cache import user_cache_dir
+
+# --- 配置 ---
+MAX_PENDING = 2000  # 两次刷新之间最多积压的消息数，超出时丢弃最旧的 (文件中仍完整保留)
+LOG_MAX_LINES = 2000  # 日志控件中保留的最大行数
+LOG_FLUSH_MS = 100  # 日志控件的刷新间隔 (毫秒)，即每秒最多刷新 10 次
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+def log_file_path():
+    """日志文件位置；环境变量 PIP_TOOLBOX_LOG_FILE 优先，设为空字符串则不写文件。"""
+    path = os.environ.get("PIP_TOOLBOX_LOG_FILE")
+    if path is None:
+        path = os.path.join(user_cache_dir(), "logs", "pip-toolbox.log")
+    return path or None
+
+
+def _file_logger(path):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS,
+                                                       encoding="utf-8", delay=True)
+    except OSError as e:
+        print(f"警告: 无法写入日志文件 {path}: {e}")
+        return None
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger = logging.getLogger(f"pip_toolbox.log.{path}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.handlers[:] = [handler]
+    return logger
+
+
+class LogBuffer:
+    """线程安全的日志缓冲：write() 可在任意线程调用，drain() 由界面线程定期调用。"""
+
+    def __init__(self, path=None, max_pending=MAX_PENDING):
+        self.path = path
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._logger = _file_logger(path) if path else None
+
+    def write(self, message):
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self._dropped += 1
+            self._pending.append(message)
+        if self._logger:
+            self._logger.info(message.rstrip("\n"))
+
+    def drain(self):
+        """取走积压的消息，返回 (消息列表, 因积压过多而丢弃的条数)。"""
+        with self._lock:
+            messages = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+        return messages, dropped
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._dropped = 0
@@ -0,0 +1,348 @@
+import configparser
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+from packaging.version import parse as parse_version
+
+from pip_toolbox.config import (CHECK_WORKERS, DEFAULT_INDEX_URL, HEDGE_DELAY, SECONDARY_INDEX_URLS, USE_NATIVE_INDEX,
+                                LOOKUP_TIMEOUT, pip_command)
+from pip_toolbox.scheduler import LookupScheduler
+from pip_toolbox.tracing import span
+from pip_toolbox.disk_cache import get_disk_cache
+from pip_toolbox.version_cache import CachedLookup, VersionCache
+from pip_toolbox.versions import DEFAULT_VERSION_KINDS, latest_version, normalize_name
+
+# --- 全局变量 ---
+version_cache = VersionCache()  # 全局版本缓存，键为 (索引 URL, 规范化包名)，检查更新与组合框共用
+configured_index_url = None  # 缓存的 pip 索引 URL，换源后重置
+secondary_index_urls = SECONDARY_INDEX_URLS  # 对冲查询的备用索引
+hedge_delay = HEDGE_DELAY
+
+# error 不为 None 表示无法得到结论 (查询失败或版本无法比较)
+# not_found 为 True 时 error 也不为空：索引上没有该项目 (例如本地安装的包)，这是确定的结论而不是查询失败；
+# index 为给出结果的索引 URL (对冲查询时可能是备用索引)，未知时为 None
+CheckResult = namedtuple("CheckResult", "name installed latest outdated error not_found index",
+                         defaults=(False, None))
+
+def get_current_source():
+    """获取当前配置的 pip 索引 URL。"""
+    try:
+        for scope in ["global", "user"]:
+            result = subprocess.run(pip_command("config", "get", f"{scope}.index-url"),
+                                    capture_output=True, text=True, encoding="utf-8", check=False,
+                                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+            if result.returncode == 0 and result.stdout.strip():
+                return result.stdout.strip()
+        return "默认 PyPI 源"
+    except Exception as e:
+        print(f"获取当前源出错: {e}")
+        return "无法获取"
+
+def reset_index_url():
+    """换源后调用，下次查询时重新读取 pip 配置。"""
+    global configured_index_url
+    configured_index_url = None
+
+def pip_config_files():
+    """按 pip 的覆盖顺序 (global < user < site < PIP_CONFIG_FILE) 返回配置文件路径。"""
+    name = "pip.ini" if os.name == 'nt' else "pip.conf"
+    if os.name == 'nt':
+        global_files = [os.path.join(os.environ.get("ProgramData", "C:\\ProgramData"), "pip", name)]
+        appdata = os.environ.get("APPDATA", os.path.expanduser("~"))
+        user_files = [os.path.join(appdata, "pip", name)]
+    elif sys.platform == 'darwin':
+        global_files = [os.path.join("/Library/Application Support/pip", name)]
+        user_files = [os.path.expanduser(f"~/.pip/{name}"),
+                      os.path.expanduser(f"~/Library/Application Support/pip/{name}")]
+    else:
+        xdg_dirs = os.environ.get("XDG_CONFIG_DIRS", "/etc/xdg").split(os.pathsep)
+        global_files = [os.path.join(d, "pip", name) for d in xdg_dirs if d] + ["/etc/pip.conf"]
+        xdg_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        user_files = [os.path.expanduser(f"~/.pip/{name}"), os.path.join(xdg_home, "pip", name)]
+    files = global_files + user_files + [os.path.join(sys.prefix, name)]
+    env_file = os.environ.get("PIP_CONFIG_FILE")
+    if env_file:
+        if env_file == os.devnull:
+            return []
+        files.append(env_file)
+    return files
+
+def read_pip_config_index_url():
+    """直接读取 pip 配置文件中的 index-url ([install] 优先于 [global])，不启动 pip 进程。"""
+    parser = configparser.RawConfigParser()
+    parser.read([f for f in pip_config_files() if os.path.isfile(f)], encoding="utf-8")
+    for section in ("install", "global"):
+        if parser.has_option(section, "index-url"):
+            return parser.get(section, "index-url").strip()
+    return None
+
+def set_index_url(url):
+    """显式指定本次会话使用的索引 URL (例如命令行参数 --index-url)。"""
+    global configured_index_url
+    configured_index_url = url.rstrip("/")
+
+def get_index_url():
+    """返回 pip 实际使用的索引 URL (环境变量 > pip 配置文件 > 默认 PyPI)。"""
+    global configured_index_url
+    if configured_index_url:
+        return configured_index_url
+    url = os.environ.get("PIP_INDEX_URL", "").strip()
+    if not url:
+        try:
+            url = read_pip_config_index_url()
+        except (configparser.Error, OSError, UnicodeDecodeError) as e:
+            print(f"读取 pip 配置出错: {e}")
+    configured_index_url = url or DEFAULT_INDEX_URL
+    return configured_index_url
+
+def set_secondary_index_urls(urls, delay=None):
+    """设置对冲查询的备用索引 (空列表关闭对冲) 与延迟预算 (秒)。"""
+    global secondary_index_urls, hedge_delay
+    secondary_index_urls = tuple(url.rstrip("/") for url in urls)
+    if delay is not None:
+        hedge_delay = delay
+
+def get_lookup_index_urls():
+    """查询版本时依次使用的索引：主索引在前，之后是与之不同的备用索引。"""
+    primary = get_index_url()
+    return [primary] + [url for url in secondary_index_urls if url != primary.rstrip("/")]
+
+def disk_cached_versions(pkg_name):
+    """返回磁盘缓存中未过期的版本列表，没有时返回 None。"""
+    disk_cache = get_disk_cache()
+    if not disk_cache:
+        return None
+    entry = disk_cache.get(get_index_url(), normalize_name(pkg_name))
+    return entry.versions if entry and disk_cache.is_fresh(entry) else None
+
+def save_versions_to_disk(pkg_name, versions, etag=None, last_modified=None):
+    """把查询结果写入磁盘缓存，供之后的会话使用。"""
+    disk_cache = get_disk_cache()
+    if disk_cache and versions:
+        disk_cache.put(get_index_url(), normalize_name(pkg_name), versions, etag, last_modified)
+
+def query_index_versions(pkg_name):
+    """直接从索引的 Simple API 获取 (版本列表, 给出结果的索引 URL) (含预发布版本，不启动 pip 进程)。
+
+    优先使用磁盘缓存；过期条目通过条件请求 (ETag / Last-Modified) 重新验证。
+    配置了备用索引时进行对冲查询 (见 hedging 模块)，结果仍以主索引为键缓存。
+    每个请求使用自适应超时、重试与断路器 (见 resilience 模块)。
+    """
+    from pip_toolbox.index_client import get_client  # 延迟导入 http.client 等模块
+    from pip_toolbox.resilience import call_with_resilience
+    index_urls = get_lookup_index_urls()
+    index_url = index_urls[0]
+    disk_cache = get_disk_cache()
+    with span("disk_cache.get", pkg=pkg_name) as s:
+        entry = disk_cache.get(index_url, normalize_name(pkg_name)) if disk_cache else None
+        s.set(result="fresh" if entry and disk_cache.is_fresh(entry) else "stale" if entry else "miss")
+    if entry and disk_cache.is_fresh(entry):
+        return entry.versions, index_url
+
+    def fetch(url):
+        # 验证器只对主索引有效，备用索引总是完整获取
+        conditional = bool(entry) and url == index_url
+        validators = (entry.etag, entry.last_modified) if conditional else (None, None)
+        client = get_client(url)
+        with span("index.get_project", pkg=pkg_name, index=url, conditional=conditional):
+            return call_with_resilience(url, lambda timeout: client.get_project(pkg_name, *validators, timeout=timeout))
+    if len(index_urls) > 1:
+        from pip_toolbox.hedging import hedged_call
+        winner, page = hedged_call(fetch, index_urls, hedge_delay)
+    else:
+        winner, page = index_url, fetch(index_url)
+    if entry and page.versions is None:
+        disk_cache.touch(index_url, normalize_name(pkg_name))
+        return entry.versions, index_url
+    if winner == index_url:
+        save_versions_to_disk(pkg_name, page.versions, page.etag, page.last_modified)
+    else:
+        save_versions_to_disk(pkg_name, page.versions)
+    return page.versions, winner
+
+def parse_pip_index_versions(output, pkg_name):
+    """更鲁棒地解析 'pip index versions --pre' 的输出以获取版本列表 (含预发布版本)。"""
+    lines = output.splitlines()
+    versions_str_list = []
+    for line in lines:
+        if "Available versions:" in line:
+            try:
+                versions_part = line.split(":", 1)[1]
+                versions_str_list = [v.strip() for v in versions_part.split(',') if v.strip()]
+                break
+            except IndexError:
+                continue
+    if not versions_str_list:
+        potential_version_lines = []
+        for line in lines:
+            cleaned_line = line.replace(f"{pkg_name}", "").replace("(", "").replace(")", "").strip()
+            if not cleaned_line: continue
+            parts = [p.strip() for p in cleaned_line.split(',') if p.strip()]
+            valid_versions_on_line = 0
+            if len(parts) > 1:
+                for part in parts:
+                    try:
+                        parse_version(part)
+                        valid_versions_on_line += 1
+                    except Exception:
+                        pass
+                if valid_versions_on_line >= len(parts) * 0.8:
+                    potential_version_lines.append((valid_versions_on_line, parts))
+        if potential_version_lines:
+            potential_version_lines.sort(key=lambda x: x[0], reverse=True)
+            versions_str_list = potential_version_lines[0][1]
+    valid_versions = []
+    if versions_str_list:
+        for v_str in versions_str_list:
+            try:
+                parsed_v = parse_version(v_str)
+                valid_versions.append(parsed_v)
+            except Exception:
+                pass     
+    valid_versions.sort(reverse=True)
+    if not valid_versions:
+        print(f"警告: 无法从输出中为 {pkg_name} 解析任何版本:\n---\n{output}\n---")
+    return [str(v) for v in valid_versions]
+
+class VersionLookupError(Exception):
+    """版本查询失败，消息可直接显示在界面上。not_found 为 True 表示 source 索引上不存在该项目。"""
+
+    def __init__(self, message, not_found=False, source=None):
+        super().__init__(message)
+        self.not_found = not_found
+        self.source = source
+
+def lookup_versions(pkg_name):
+    """查询包的全部可用版本 (不经过内存缓存)：优先读取 Simple API，失败时回退到 pip。"""
+    return lookup_versions_with_source(pkg_name)[0]
+
+def lookup_versions_with_source(pkg_name):
+    """同 lookup_versions，但返回 (版本列表, 给出结果的索引 URL)；对冲查询时来源可能是备用索引。"""
+    if USE_NATIVE_INDEX:
+        from pip_toolbox.index_client import IndexLookupError
+        from pip_toolbox.resilience import is_transient
+        try:
+            return query_index_versions(pkg_name)
+        except IndexLookupError as e:
+            if e.not_found:
+                raise VersionLookupError("错误: 未找到可用版本", not_found=True,
+                                         source=e.index_url or get_index_url()) from e
+            if is_transient(e):
+                # 索引不可达或超时 (已重试)：pip 访问的是同一个索引，回退只会再等一次超时
+                raise VersionLookupError(f"错误: 索引不可用: {e}") from e
+            print(f"直接查询索引失败，回退到 pip: {e}")
+    else:
+        versions = disk_cached_versions(pkg_name)
+        if versions:
+            return versions, get_index_url()
+    command = pip_command("index", "versions", "--pre", pkg_name)
+    try:
+        with span("subprocess.pip_index", pkg=pkg_name):
+            result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8", timeout=LOOKUP_TIMEOUT,
+                                   creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+    except subprocess.TimeoutExpired as e:
+        raise VersionLookupError("查询超时") from e
+    if result.returncode != 0 or "ERROR:" in result.stderr or "Could not find" in result.stderr:
+        error_msg = result.stderr.strip() or result.stdout.strip() or '未知查询错误'
+        # pip index versions 找不到项目时报告 "No matching distribution found for <包名>"
+        not_found = "No matching distribution found" in error_msg or \
+            "Could not find a version that satisfies the requirement" in error_msg
+        if not_found:
+            error_msg = "未找到可用版本"
+        elif "ERROR: Exception:" in error_msg:
+            error_msg = "查询时出错 (pip内部错误)"
+        raise VersionLookupError(f"错误: {error_msg}", not_found=not_found,
+                                 source=get_index_url() if not_found else None)
+    with span("parse_pip_index_versions", pkg=pkg_name):
+        versions = parse_pip_index_versions(result.stdout, pkg_name)
+    save_versions_to_disk(pkg_name, versions)
+    return versions, get_index_url()
+
+def cached_versions(pkg_name):
+    """通过全局版本缓存获取版本；并发请求同一个包时只会执行一次查询。"""
+    loaded = []
+
+    def load():
+        loaded.append(True)
+        try:
+            versions, source = lookup_versions_with_source(pkg_name)
+            return CachedLookup(list(versions), None, False, source)
+        except VersionLookupError:
+            raise
+        except Exception as e:
+            print(f"获取 {pkg_name} 版本出错: {e}")
+            raise VersionLookupError("查询出错") from e
+    with span("versions.cached", pkg=pkg_name) as s:
+        result = version_cache.get((get_index_url(), normalize_name(pkg_name)), load)
+        s.set(cache="miss" if loaded else "hit", ok=result.error is None)
+    return result
+
+def peek_versions(pkg_name):
+    """内存缓存中已有的版本列表 (从新到旧)，没有或查询失败时返回 None；不会发起查询。"""
+    result = version_cache.peek((get_index_url(), normalize_name(pkg_name)))
+    if result is None or result.error:
+        return None
+    return result.versions
+
+def has_cached_versions(pkg_name):
+    """内存缓存中是否已有该包未过期的查询结果 (成功或失败)；不会发起查询。"""
+    return version_cache.peek((get_index_url(), normalize_name(pkg_name))) is not None
+
+def resolve_latest_version(pkg_name, session_cache, kinds=DEFAULT_VERSION_KINDS):
+    """返回 (属于给定类型的最新版本, CachedLookup 查询结果)；查询失败时最新版本为 None。"""
+    result = cached_versions(pkg_name)
+    session_cache[pkg_name] = latest_version(result.versions, kinds)
+    return session_cache[pkg_name], result
+
+def get_latest_version(pkg_name, session_cache, kinds=DEFAULT_VERSION_KINDS):
+    """为包获取属于给定版本类型的最新可用版本，使用全局缓存。"""
+    latest, result = resolve_latest_version(pkg_name, session_cache, kinds)
+    if result.error:
+        print(f"检查 {pkg_name} 最新版本出错: {result.error}")
+    return latest
+
+def create_check_scheduler(session_cache, kinds=DEFAULT_VERSION_KINDS, max_workers=None):
+    """创建查找最新版本的调度器，检查过程中可调用其 cancel()。"""
+    def check(pkg):
+        with span("check.package", pkg=pkg[0]):
+            return resolve_latest_version(pkg[0], session_cache, kinds)
+    return LookupScheduler(check, max_workers=max_workers or CHECK_WORKERS)
+
+def check_status(result):
+    """CheckResult 的结论："outdated"、"current"、"not-found" (索引上没有该项目)，
+    或 "unknown" (查询失败或版本无法比较，不代表已是最新)。"""
+    if result.not_found:
+        return "not-found"
+    if result.error:
+        return "unknown"
+    return "outdated" if result.outdated else "current"
+
+def iter_update_checks(scheduler, packages_to_check):
+    """通过调度器并发检查 [(包名, 已安装版本)]，按完成顺序产出 CheckResult。
+
+    查询失败时 latest 为 None 且 error 不为空 (索引上没有该项目时 not_found 同时为 True)；
+    版本无法比较时 latest 不为 None 且 error 不为空。
+    """
+    for (pkg_name, installed_version_str), resolved, error in scheduler.run(packages_to_check):
+        if error:
+            yield CheckResult(pkg_name, installed_version_str, None, False, f"检查时异常: {error}")
+            continue
+        latest_version_str, lookup = resolved
+        if lookup.error:
+            yield CheckResult(pkg_name, installed_version_str, None, False, f"查询 {pkg_name} 失败: {lookup.error}",
+                              lookup.not_found, lookup.source)
+            continue
+        if not latest_version_str:
+            yield CheckResult(pkg_name, installed_version_str, None, False, None, False, lookup.source)
+            continue
+        try:
+            outdated = parse_version(latest_version_str) > parse_version(installed_version_str)
+        except Exception as e:
+            print(f"[线程] 警告: 无法为 {pkg_name} 比较版本 ('{installed_version_str}' vs '{latest_version_str}'): {e}")
+            yield CheckResult(pkg_name, installed_version_str, latest_version_str, False,
+                              f"无法比较版本: {pkg_name} ({installed_version_str} / {latest_version_str})",
+                              False, lookup.source)
+            continue
+        yield CheckResult(pkg_name, installed_version_str, latest_version_str, outdated, None, False, lookup.source)
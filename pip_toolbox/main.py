@@ -1,159 +1,71 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, scrolledtext
-import pkg_resources
+import contextlib
 import subprocess
 import threading
-import shutil
+import time
 import os
 from packaging.version import parse as parse_version  # 用于可靠的版本比较
-import time  # 用于状态更新
 import sys  # 在 __main__ 中用于平台检查
-import re
-
-# --- 配置 ---
-PIP_COMMAND = shutil.which("pip3") or shutil.which("pip") or "pip"
+from pip_toolbox.config import (PIP_COMMAND, CHECK_WORKERS, SEARCH_DEBOUNCE_MS, SPECULATIVE_DELAY_MS, SPECULATIVE_RADIUS,
+                                UI_PUMP_MS, USE_NATIVE_INDEX, USE_SPECULATIVE_PREFETCH, pip_command)
+from pip_toolbox.environments import (EnvironmentRegistry, InterpreterError, activate, is_outdated, outdated_matrix,
+                                      scan_environments)
+from pip_toolbox.inventory import get_installed_packages, get_scanner
+from pip_toolbox.lookup import (cached_versions, create_check_scheduler, get_current_source, get_lookup_index_urls,
+                                has_cached_versions, iter_update_checks, peek_versions, reset_index_url, version_cache)
+from pip_toolbox.installer import (install_packages, uninstall_command, run_pip_command,
+                                   update_packages_batched)
+from pip_toolbox.log_stream import LOG_FLUSH_MS, LOG_MAX_LINES, LogBuffer, log_file_path
+from pip_toolbox.search_index import SearchIndex, normalize_query
+from pip_toolbox.speculative import SpeculativePrefetcher
+from pip_toolbox.table_view import VirtualTreeview
+from pip_toolbox.tracing import span, tracer
+from pip_toolbox.ui_events import EventBus, Progress, VersionsLoaded
+from pip_toolbox.versions import (DEFAULT_VERSION_KINDS, KIND_LABELS, VERSION_KIND_FILTERS,
+                                  filter_versions, tag_versions)
 
 # --- 全局变量 ---
 all_packages = []
-version_comboboxes = {}
+version_comboboxes = {}  # 包名 -> 版本选择组合框 (只为选中过的包创建)
+version_lookup_errors = {}  # 包名 -> 组合框当前显示的查询错误 (没有可安装的版本)
 outdated_packages_data = None  # 存储 [(name, installed_ver, latest_ver)] - 反映最后一次检查
 current_view_mode = "all"  # "all" 或 "outdated"
 checking_updates_thread = None  # 用于管理检查线程
-global_version_cache = {}  # 全局版本缓存，键为包名，值为 (版本列表, 时间戳)
-update_all_button = None  # 全部更新按钮的全局引用
+active_check_scheduler = None  # 正在运行的检查调度器，用于取消
+search_index = None  # 当前视图基础数据上的搜索索引
+last_search = None  # 上一次应用的 (索引, 查询, 模糊)
+search_after_id = None  # 搜索防抖定时器
+log_buffer = None  # 日志缓冲 (在 build_gui 中创建)，由 flush_log 定期批量写入日志控件
+ui_events = EventBus()  # 工作线程只通过它与界面通信，由 pump_ui_events 在界面线程中处理
+combobox_position_pending = False  # 已安排组合框位置更新 (合并连续的滚动/尺寸变化)
+last_log_flush = 0.0
+environment_registry = None  # 登记的目标环境 (在 build_gui 中加载)
+active_environment = None  # 当前管理的环境
+speculative_prefetcher = None  # 为可见行与选中行附近的包预热版本缓存 (在 build_gui 中创建)
+speculative_after_id = None  # 推测预取的防抖定时器
 
-# --- 辅助函数 ---
-def get_installed_packages():
-    """获取所有已安装的 pip 包及其版本。"""
-    pkg_resources._initialize_master_working_set()
-    return sorted([(pkg.key, pkg.version) for pkg in pkg_resources.working_set])
-
-def get_current_source():
-    """获取当前配置的 pip 索引 URL。"""
-    try:
-        for scope in ["global", "user"]:
-            result = subprocess.run([PIP_COMMAND, "config", "get", f"{scope}.index-url"],
-                                    capture_output=True, text=True, encoding="utf-8", check=False,
-                                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-            if result.returncode == 0 and result.stdout.strip():
-                return result.stdout.strip()
-        return "默认 PyPI 源"
-    except Exception as e:
-        print(f"获取当前源出错: {e}")
-        return "无法获取"
-
-def list_rc_versions(package_name):
-    result = subprocess.run(
-        [PIP_COMMAND, "install", f"{package_name}==0.0.89rc1", "--pre"],
-        capture_output=True,
-        text=True
-    )
-    m = re.search(r"from versions: (.+?)\)", result.stderr, re.DOTALL)
-    if not m:
-        return []
-
-    versions = [v.strip() for v in m.group(1).split(",")]
-    rc_versions = [v for v in versions if "rc" in v.lower()]
-    return rc_versions
-
-def parse_pip_index_versions(output, pkg_name):
-    """更鲁棒地解析 'pip index versions' 的输出以获取版本列表。"""
-    lines = output.splitlines()
-    versions_str_list = []
-    for line in lines:
-        if "Available versions:" in line:
-            try:
-                versions_part = line.split(":", 1)[1]
-                versions_str_list = [v.strip() for v in versions_part.split(',') if v.strip()]
-                break
-            except IndexError:
-                continue
-    if not versions_str_list:
-        potential_version_lines = []
-        for line in lines:
-            cleaned_line = line.replace(f"{pkg_name}", "").replace("(", "").replace(")", "").strip()
-            if not cleaned_line: continue
-            parts = [p.strip() for p in cleaned_line.split(',') if p.strip()]
-            valid_versions_on_line = 0
-            if len(parts) > 1:
-                for part in parts:
-                    try:
-                        parse_version(part)
-                        valid_versions_on_line += 1
-                    except Exception:
-                        pass
-                if valid_versions_on_line >= len(parts) * 0.8:
-                    potential_version_lines.append((valid_versions_on_line, parts))
-        if potential_version_lines:
-            potential_version_lines.sort(key=lambda x: x[0], reverse=True)
-            versions_str_list = potential_version_lines[0][1]
-    valid_versions = []
-    if versions_str_list:
-        for v_str in versions_str_list:
-            try:
-                parsed_v = parse_version(v_str)
-                valid_versions.append(parsed_v)
-            except Exception:
-                pass     
-    rc_list = list_rc_versions(pkg_name)
-    for rc_v in rc_list:
-        try:
-            valid_versions.append(parse_version(rc_v))
-        except:
-            pass
-    valid_versions.sort(reverse=True)
-    if not valid_versions:
-        print(f"警告: 无法从输出中为 {pkg_name} 解析任何版本:\n---\n{output}\n---")
-    return [str(v) for v in valid_versions]
-
-def get_latest_version(pkg_name, session_cache):
-    """为包获取最新的可用版本，使用全局缓存。"""
-    if pkg_name in global_version_cache:
-        versions, timestamp = global_version_cache[pkg_name]
-        if time.time() - timestamp < 300:  # 5分钟有效期
-            session_cache[pkg_name] = versions[0] if versions else None
-            return session_cache[pkg_name]
-    try:
-        command = [PIP_COMMAND, "index", "versions", pkg_name]
-        result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8", timeout=25,
-                               creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-        if result.returncode == 0 and result.stdout:
-            available_versions = parse_pip_index_versions(result.stdout, pkg_name)
-            global_version_cache[pkg_name] = (available_versions, time.time())
-            session_cache[pkg_name] = available_versions[0] if available_versions else None
-            return session_cache[pkg_name]
-        else:
-            print(f"检查 {pkg_name} 最新版本出错: {result.stderr or result.stdout or '无输出'}")
-            global_version_cache[pkg_name] = ([], time.time())
-            session_cache[pkg_name] = None
-            return None
-    except subprocess.TimeoutExpired:
-        print(f"检查 {pkg_name} 最新版本超时")
-        global_version_cache[pkg_name] = ([], time.time())
-        session_cache[pkg_name] = None
-        return None
-    except Exception as e:
-        print(f"检查 {pkg_name} 最新版本时异常: {e}")
-        global_version_cache[pkg_name] = ([], time.time())
-        session_cache[pkg_name] = None
-        return None
+# --- 控件 (在 build_gui 中创建，导入本模块不会创建任何窗口) ---
+root = None
+search_var = fuzzy_search_var = version_kind_var = log_visible_var = environment_var = None
+environment_combobox = None
+table = tree = tree_scrollbar = package_count_label = version_kind_combobox = None
+install_button = uninstall_button = check_updates_button = toggle_view_button = None
+cancel_check_button = pause_check_button = update_all_button = change_source_button = rollback_button = None
+status_bar = status_label = log_frame = log_display_area = clear_log_button = None
 
 # --- GUI 函数 ---
 def populate_table(packages_to_display=None, view_mode="all"):
-    """根据视图模式用包数据填充 Treeview 表格。"""
+    """根据视图模式设置表格的基础数据，并应用当前搜索 (只渲染一次)。"""
+    global search_index, last_search
     clear_comboboxes()
-    tree.delete(*tree.get_children())
     if packages_to_display is None:
         if view_mode == "outdated" and outdated_packages_data:
             packages_to_display = [(name, installed) for name, installed, latest in outdated_packages_data]
         else:
             packages_to_display = all_packages
-    for pkg_name, pkg_version in packages_to_display:
-        row_id = tree.insert("", "end", values=(pkg_name, pkg_version))
-        version_comboboxes[row_id] = None
-    count = len(packages_to_display)
-    count_prefix = "过时包数量: " if view_mode == "outdated" else "包数量: "
-    package_count_label.config(text=f"{count_prefix}{count}")
+    search_index = SearchIndex(packages_to_display)
+    last_search = None
     if view_mode == "outdated":
         toggle_view_button.config(text="显示所有包")
         if update_all_button and update_all_button.winfo_exists():
@@ -162,7 +74,7 @@ def populate_table(packages_to_display=None, view_mode="all"):
         toggle_view_button.config(text="仅显示过时包")
         if update_all_button and update_all_button.winfo_exists():
             update_all_button.config(state="disabled")
-    search_packages()
+    apply_search()
 
 def clear_comboboxes():
     """销毁任何活动的版本选择组合框。"""
@@ -173,121 +85,129 @@ def clear_comboboxes():
             except tk.TclError:
                 pass
     version_comboboxes.clear()
+    version_lookup_errors.clear()
 
 def search_packages(event=None):
-    """基于搜索查询过滤表格中当前显示的包。"""
-    query = search_var.get().strip().lower()
-    if current_view_mode == "outdated":
-        base_packages_data = outdated_packages_data or []
-        base_packages_list = [(name, installed) for name, installed, latest in base_packages_data]
-    else:
-        base_packages_list = all_packages
-    if query:
-        filtered_packages = [pkg for pkg in base_packages_list if query in pkg[0].lower()]
-    else:
-        filtered_packages = base_packages_list
-    _populate_table_internal(filtered_packages, current_view_mode)
+    """搜索框输入时调用：防抖，连续按键只在停顿后过滤一次。"""
+    global search_after_id
+    if search_after_id is not None:
+        root.after_cancel(search_after_id)
+    search_after_id = root.after(SEARCH_DEBOUNCE_MS, apply_search)
 
-def _populate_table_internal(packages_list, view_mode):
-    """内部辅助函数，用于更新表格而不更改全局视图状态。"""
-    clear_comboboxes()
-    tree.delete(*tree.get_children())
-    for pkg_name, pkg_version in packages_list:
-        row_id = tree.insert("", "end", values=(pkg_name, pkg_version))
-        version_comboboxes[row_id] = None
-    count = len(packages_list)
-    count_prefix = "过时包数量: " if view_mode == "outdated" else "包数量: "
-    search_active = search_var.get().strip() != ""
-    filter_text = "(搜索中) " if search_active else ""
-    package_count_label.config(text=f"{count_prefix}{filter_text}{count}")
-
-def fetch_versions(pkg_name, combobox):
-    """为包获取可用版本（由组合框使用）。"""
-    if pkg_name in global_version_cache:
-        versions, timestamp = global_version_cache[pkg_name]
-        if time.time() - timestamp < 300:
-            available_versions_str = versions
-            parsed_versions = versions
-        else:
-            available_versions_str = []
-            parsed_versions = []
-    else:
-        available_versions_str = []
-        parsed_versions = []
-    if not parsed_versions:
-        try:
-            command = [PIP_COMMAND, "index", "versions", pkg_name]
-            result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8", timeout=35,
-                                   creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-            if result.returncode != 0 or "ERROR:" in result.stderr or "Could not find" in result.stderr or "No matching index versions found" in result.stderr:
-                error_msg = result.stderr.strip() or result.stdout.strip() or '未知查询错误'
-                if "Could not find a version that satisfies the requirement" in error_msg or \
-                   "No matching index versions found" in error_msg:
-                    error_msg = "未找到可用版本"
-                elif "ERROR: Exception:" in error_msg:
-                    error_msg = "查询时出错 (pip内部错误)"
-                available_versions_str = [f"错误: {error_msg}"]
-                parsed_versions = []
-            else:
-                parsed_versions = parse_pip_index_versions(result.stdout, pkg_name)
-                available_versions_str = parsed_versions if parsed_versions else ["未找到版本"]
-            global_version_cache[pkg_name] = (parsed_versions, time.time())
-        except subprocess.TimeoutExpired:
-            available_versions_str = ["查询超时"]
-            parsed_versions = []
-            global_version_cache[pkg_name] = ([], time.time())
-        except Exception as e:
-            print(f"获取 {pkg_name} 版本出错: {e}")
-            available_versions_str = ["查询出错"]
-            parsed_versions = []
-            global_version_cache[pkg_name] = ([], time.time())
+def apply_search():
+    """用搜索索引过滤当前视图，表格只改写发生变化的行，选中的包仍匹配时保持选中。"""
+    global search_after_id, last_search
+    search_after_id = None
+    if search_index is None:
+        return
+    query = normalize_query(search_var.get())
+    fuzzy = fuzzy_search_var.get()
+    if last_search == (search_index, query, fuzzy):
+        return  # 查询没有变化 (如方向键、Shift)，不打断当前滚动位置
+    last_search = (search_index, query, fuzzy)
+    with span("search.filter", query=query, fuzzy=fuzzy):
+        packages_list = search_index.filter(query, fuzzy)
+    table.set_rows(packages_list, keep_selection=True)
+    count_prefix = "过时包数量: " if current_view_mode == "outdated" else "包数量: "
+    filter_text = "(搜索中) " if query else ""
+    package_count_label.config(text=f"{count_prefix}{filter_text}{len(packages_list)}")
+
+def versions_event(pkg_name, combobox, kinds=DEFAULT_VERSION_KINDS):
+    """构造填充组合框的 VersionsLoaded 事件，只包含属于给定类型的版本 (有缓存时不访问网络)。"""
+    result = cached_versions(pkg_name)
+    parsed_versions = result.versions
+    error = result.error
+    available_versions_str = filter_versions(parsed_versions, kinds) if parsed_versions and not error else []
+    if not error and not available_versions_str:
+        error = "未找到版本"
+    if error:
+        return VersionsLoaded(pkg_name, combobox, [error], 0, error)
     current_installed_version = next((v for p, v in all_packages if p == pkg_name), None)
     latest_known_version = next((latest for name, _, latest in outdated_packages_data if name == pkg_name), None) if outdated_packages_data else None
     display_versions = []
     found_installed = False
     best_match_index = 0
+    version_kinds = dict(tag_versions(parsed_versions))
     for i, v_str in enumerate(available_versions_str):
         label = v_str
-        if not v_str.startswith("错误:") and not v_str.startswith("查询") and not v_str.startswith("未找到"):
-            is_current = (v_str == current_installed_version)
-            is_latest = (latest_known_version is not None and v_str == latest_known_version)
-            if is_current:
-                label += " (当前)"
-                found_installed = True
+        kind = version_kinds.get(v_str)
+        if kind and kind != "final":
+            label += f" [{KIND_LABELS[kind]}]"
+        is_current = (v_str == current_installed_version)
+        is_latest = (latest_known_version is not None and v_str == latest_known_version)
+        if is_current:
+            label += " (当前)"
+            found_installed = True
+            best_match_index = i
+        if is_latest and not is_current:
+            label += " (最新)"
+            if not found_installed:
                 best_match_index = i
-            if is_latest and not is_current:
-                label += " (最新)"
-                if not found_installed:
-                    best_match_index = i
         display_versions.append(label)
+    return VersionsLoaded(pkg_name, combobox, display_versions, best_match_index, None)
+
+def fetch_versions(pkg_name, combobox, kinds=DEFAULT_VERSION_KINDS):
+    """为包获取可用版本（由组合框使用，在工作线程中运行）。"""
+    with foreground_lookups():
+        event = versions_event(pkg_name, combobox, kinds)
+    ui_events.post(event)
+
+def foreground_lookups():
+    """用户发起的查询期间暂停推测预取。"""
+    if speculative_prefetcher is None:
+        return contextlib.nullcontext()
+    return speculative_prefetcher.foreground()
+
+def schedule_speculative_prefetch():
+    """滚动或选择停止 SPECULATIVE_DELAY_MS 后预取附近行的版本 (连续的变化只保留最后一次)。"""
+    global speculative_after_id
+    if speculative_prefetcher is None:
+        return
+    if speculative_after_id is not None:
+        root.after_cancel(speculative_after_id)
+    speculative_after_id = root.after(SPECULATIVE_DELAY_MS, run_speculative_prefetch)
+
+def run_speculative_prefetch():
+    global speculative_after_id
+    speculative_after_id = None
+    rows = table.rows
+    speculative_prefetcher.request([rows[i][0] for i in table.model.nearby(SPECULATIVE_RADIUS)])
+
+def show_versions(event):
+    """把工作线程取得的版本列表填入组合框 (在主线程中运行)。"""
+    combobox, display_versions = event.target, event.values
+    if event.error:
+        version_lookup_errors[event.pkg_name] = event.error
+    else:
+        version_lookup_errors.pop(event.pkg_name, None)
     try:
         if combobox.winfo_exists():
-            combobox.configure(state="readonly")
+            # 查询失败时组合框保持禁用，只显示错误说明，不能被当作版本选中安装
+            combobox.configure(state="disabled" if event.error else "readonly")
             combobox["values"] = display_versions
-            combobox.set(display_versions[best_match_index] if display_versions else "无可用版本")
+            combobox.set(display_versions[event.selected] if display_versions else "无可用版本")
     except tk.TclError:
-        print(f"信息: 为 {pkg_name} 的组合框在设置版本前已被销毁。")
+        print(f"信息: 为 {event.pkg_name} 的组合框在设置版本前已被销毁。")
 
 def install_selected_version():
     """安装组合框中选定的版本。"""
-    selected_items = tree.selection()
-    if not selected_items:
+    selected_row = table.selected_row()
+    if not selected_row:
         messagebox.showwarning("未选择", "请在表格中选择一个包。")
         return
-    item_id = selected_items[0]
-    try:
-        pkg_name, displayed_version = tree.item(item_id, "values")
-    except tk.TclError:
-        messagebox.showerror("错误", "无法获取所选项目的信息 (可能已删除)。")
+    pkg_name = selected_row[0]
+    lookup_error = version_lookup_errors.get(pkg_name)
+    if lookup_error:
+        messagebox.showerror("无法安装", f"没有可安装的 '{pkg_name}' 版本: {lookup_error}")
         return
-    combobox = version_comboboxes.get(item_id)
+    combobox = version_comboboxes.get(pkg_name)
     if not combobox or not combobox.winfo_exists() or combobox.cget('state') == 'disabled':
         messagebox.showwarning("未加载版本", f"请等待 '{pkg_name}' 的版本加载或选择完成。")
         return
     selected_value = combobox.get()
     version_to_install = selected_value.split(" ")[0].strip()
-    if not version_to_install or version_to_install.startswith("错误") or \
-       version_to_install.startswith("查询") or version_to_install == "未找到版本":
+    loaded_versions = [label.split(" ")[0] for label in combobox.tk.splitlist(combobox.cget("values"))]
+    if not version_to_install or version_to_install not in loaded_versions:
         messagebox.showerror("无法安装", f"无法安装选定的条目: '{selected_value}'")
         return
     current_version = next((v for p, v in all_packages if p == pkg_name), None)
@@ -310,25 +230,77 @@ def install_selected_version():
             print(f"警告: 无法解析版本进行比较: {e}。使用默认提示。")
             action = "安装/更改"
             prompt = f"确定要安装/更改到 {pkg_name}=={version_to_install} 吗？"
-    if messagebox.askyesno(f"{action}确认", prompt):
+    result = preflight_check({pkg_name: version_to_install})
+    if result and result.conflicts:
+        from pip_toolbox.preflight import format_conflicts
+        suggested = result.suggestions.get(pkg_name)
+        details = format_conflicts(result)
+        if suggested and suggested != version_to_install:
+            answer = messagebox.askyesnocancel(
+                "依赖冲突", f"{details}\n\n是: 改为安装 {pkg_name}=={suggested}\n否: 仍然安装 {version_to_install}\n取消: 不安装",
+                icon="warning")
+            if answer is None:
+                return
+            if answer:
+                version_to_install = suggested
+                action = "安装"
+        elif not messagebox.askyesno("依赖冲突", f"{details}\n\n仍然要安装 {pkg_name}=={version_to_install} 吗？",
+                                     icon="warning"):
+            return
+        target_package = f"{pkg_name}=={version_to_install}"
+        install_package_threaded(target_package, f"{action} {target_package}")
+    elif messagebox.askyesno(f"{action}确认", prompt):
         target_package = f"{pkg_name}=={version_to_install}"
-        command = [PIP_COMMAND, "install", "--upgrade", "--no-cache-dir", target_package]
-        run_pip_command_threaded(command, f"{action} {target_package}")
+        install_package_threaded(target_package, f"{action} {target_package}")
+
+def preflight_check(targets):
+    """在启动 pip 之前检查 {包名: 版本} 与已安装依赖者的约束是否冲突；预检本身出错时返回 None (不阻止安装)。"""
+    from pip_toolbox.preflight import format_conflicts, preflight
+    try:
+        result = preflight(targets, available_versions=peek_versions)
+    except Exception as e:
+        print(f"警告: 依赖冲突预检失败: {e}")
+        return None
+    if result.conflicts:
+        update_log(f"⚠️ 依赖冲突预检 ({result.seconds * 1000:.1f}毫秒): 发现 {len(result.conflicts)} 个冲突。\n"
+                   f"{format_conflicts(result)}\n")
+    else:
+        update_log(f"✅ 依赖冲突预检通过 ({len(targets)} 个目标，{result.seconds * 1000:.1f}毫秒)。\n")
+    return result
+
+def uninstall_prompt(pkg_name):
+    """卸载确认的提示文本与图标，列出依赖该包的其他已安装包 (直接与间接)。"""
+    from pip_toolbox.depgraph import build_graph
+    try:
+        graph = build_graph()
+    except Exception as e:
+        print(f"警告: 构建依赖图失败: {e}")
+        return f"确定要卸载 {pkg_name} 吗？", "question"
+    direct = graph.dependents(pkg_name)
+    indirect = [name for name in graph.dependents(pkg_name, recursive=True) if name not in direct]
+    if not direct:
+        return f"没有其他已安装的包依赖 {pkg_name}。\n\n确定要卸载 {pkg_name} 吗？", "question"
+    lines = [f"以下 {len(direct)} 个已安装的包依赖 {pkg_name}:", format_name_list(direct)]
+    if indirect:
+        lines += [f"\n另有 {len(indirect)} 个包间接依赖它:", format_name_list(indirect)]
+    lines.append(f"\n卸载后这些包可能无法正常使用。确定要卸载 {pkg_name} 吗？")
+    return "\n".join(lines), "warning"
+
+def format_name_list(names, limit=15):
+    """逗号分隔的名称列表，超过 limit 个时只列出前面的部分。"""
+    shown = ", ".join(names[:limit])
+    return shown + (f" 等 (共 {len(names)} 个)" if len(names) > limit else "")
 
 def uninstall_selected_package():
     """卸载选定的包。"""
-    selected_items = tree.selection()
-    if not selected_items:
+    selected_row = table.selected_row()
+    if not selected_row:
         messagebox.showwarning("未选择", "请在表格中选择要卸载的包。")
         return
-    item_id = selected_items[0]
-    try:
-        pkg_name = tree.item(item_id, "values")[0]
-    except tk.TclError:
-        messagebox.showerror("错误", "无法获取所选项目的信息 (可能已删除)。")
-        return
-    if messagebox.askyesno("卸载确认", f"确定要卸载 {pkg_name} 吗？"):
-        command = [PIP_COMMAND, "uninstall", "-y", pkg_name]
+    pkg_name = selected_row[0]
+    prompt, icon = uninstall_prompt(pkg_name)
+    if messagebox.askyesno("卸载确认", prompt, icon=icon):
+        command = uninstall_command(pkg_name)
         run_pip_command_threaded(command, f"卸载 {pkg_name}")
 
 def update_all_packages():
@@ -336,46 +308,72 @@ def update_all_packages():
     if not outdated_packages_data:
         messagebox.showinfo("无过时包", "当前没有过时包需要更新。")
         return
-    if messagebox.askyesno("全部更新确认", f"确定要将 {len(outdated_packages_data)} 个过时包更新到最新版本吗？"):
-        disable_buttons()
-        update_log(f"⏳ 开始更新 {len(outdated_packages_data)} 个过时包...\n")
-        thread = threading.Thread(target=update_all_packages_threaded, args=(outdated_packages_data,), daemon=True)
-        thread.start()
+    packages = list(outdated_packages_data)
+    result = preflight_check({name: latest for name, _, latest in packages})
+    if result and result.conflicts:
+        from pip_toolbox.preflight import format_conflicts
+        adjusted, skipped = adjust_for_conflicts(packages, result.suggestions)
+        answer = messagebox.askyesnocancel(
+            "依赖冲突",
+            f"{format_conflicts(result)}\n\n是: 有冲突的包改为更新到兼容版本"
+            f"{f' (跳过 {len(skipped)} 个没有更新的兼容版本的包)' if skipped else ''}\n"
+            f"否: 仍然全部更新到最新版本\n取消: 不更新", icon="warning")
+        if answer is None:
+            return
+        if answer:
+            packages = adjusted
+            if skipped:
+                update_log(f"⏭️ 跳过: {', '.join(skipped)}\n")
+        if not packages:
+            messagebox.showinfo("无可更新的包", "调整后没有需要更新的包。")
+            return
+    elif not messagebox.askyesno("全部更新确认", f"确定要将 {len(packages)} 个过时包更新到最新版本吗？"):
+        return
+    disable_buttons()
+    update_log(f"⏳ 开始更新 {len(packages)} 个过时包...\n")
+    thread = threading.Thread(target=update_all_packages_threaded, args=(packages,), daemon=True)
+    thread.start()
+
+def adjust_for_conflicts(packages, suggestions):
+    """把有冲突的包的目标换成推荐的兼容版本；推荐版本不高于已安装版本时跳过该包。返回 (新的列表, 跳过的包名)。"""
+    adjusted, skipped = [], []
+    for name, installed, latest in packages:
+        if name not in suggestions:
+            adjusted.append((name, installed, latest))
+            continue
+        suggested = suggestions[name]
+        try:
+            newer = suggested is not None and parse_version(suggested) > parse_version(installed)
+        except Exception:
+            newer = False
+        if newer:
+            adjusted.append((name, installed, suggested))
+        else:
+            skipped.append(name)
+    return adjusted, skipped
 
 def update_all_packages_threaded(outdated_packages):
-    """在线程中批量更新所有过时包。"""
-    success = True
+    """在线程中批量更新所有过时包 (一个 pip 事务，失败时回退为逐个安装)。"""
+    failed = update_packages_batched(outdated_packages, update_log)
     total = len(outdated_packages)
-    for i, (pkg_name, installed_version, latest_version) in enumerate(outdated_packages):
-        target_package = f"{pkg_name}=={latest_version}"
-        command = [PIP_COMMAND, "install", "--upgrade", "--no-cache-dir", target_package]
-        action_name = f"更新 {pkg_name} 到 {latest_version}"
-        root.after(0, update_log, f"⏳ ({i+1}/{total}) {action_name}...\n   命令: {' '.join(command)}\n")
-        try:
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                      text=True, encoding='utf-8', errors='replace',
-                                      creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-            stdout, stderr = process.communicate(timeout=600)
-            if process.returncode == 0:
-                root.after(0, update_log, f"✅ ({i+1}/{total}) {action_name} 成功。\n--- 输出 ---\n{stdout}\n")
-                if stderr:
-                    root.after(0, update_log, f"--- 警告/信息 ---\n{stderr}\n")
-            else:
-                success = False
-                root.after(0, update_log, f"❌ ({i+1}/{total}) {action_name} 失败 (Code: {process.returncode}).\n--- 输出 ---\n{stdout}\n--- 错误 ---\n{stderr}\n")
-        except subprocess.TimeoutExpired:
-            success = False
-            root.after(0, update_log, f"⌛ ({i+1}/{total}) {action_name} 超时 (超过10分钟)。\n")
-            try:
-                process.kill()
-                stdout, stderr = process.communicate()
-                root.after(0, update_log, f"--- 最后输出 ---\n{stdout}\n--- 最后错误 ---\n{stderr}\n")
-            except Exception as kill_e:
-                root.after(0, update_log, f"--- 尝试终止超时进程时出错: {kill_e} ---\n")
-        except Exception as e:
-            success = False
-            root.after(0, update_log, f"❌ ({i+1}/{total}) 执行 {action_name} 时发生意外错误: {str(e)}\n")
-    root.after(0, command_finished, f"✅ 全部更新完成 ({total} 个包)。\n", success)
+    if failed:
+        message = f"⚠️ 全部更新完成: {total - len(failed)} 个成功，{len(failed)} 个失败 ({', '.join(failed)})。\n"
+    else:
+        message = f"✅ 全部更新完成 ({total} 个包)。\n"
+    ui_events.call(command_finished, message, len(failed) < total)
+
+def install_package_threaded(target_package, action_name):
+    """在单独线程中安装一个包 (先下载到 wheelhouse，再从 wheelhouse 安装)。"""
+    disable_buttons()
+    update_log(f"⏳ {action_name}...\n")
+    thread = threading.Thread(target=install_package_sync, args=(target_package, action_name), daemon=True)
+    thread.start()
+
+def install_package_sync(target_package, action_name):
+    """安装单个包的同步部分，在线程中执行。"""
+    success = install_packages([target_package], action_name, update_log)
+    result_text = f"✅ {action_name} 成功。\n" if success else f"❌ {action_name} 失败。\n"
+    ui_events.call(command_finished, result_text, success)
 
 def run_pip_command_threaded(command, action_name):
     """在单独线程中运行 pip 命令并更新日志。"""
@@ -386,32 +384,8 @@ def run_pip_command_threaded(command, action_name):
 
 def run_pip_command_sync(command, action_name):
     """运行 pip 命令的同步部分，在线程中执行。"""
-    output_log = ""
-    success = False
-    try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                  text=True, encoding='utf-8', errors='replace',
-                                  creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-        stdout, stderr = process.communicate(timeout=600)
-        if process.returncode == 0:
-            output_log = f"✅ {action_name} 成功。\n--- 输出 ---\n{stdout}\n"
-            if stderr: output_log += f"--- 警告/信息 ---\n{stderr}\n"
-            success = True
-        else:
-            output_log = f"❌ {action_name} 失败 (Code: {process.returncode}).\n--- 输出 ---\n{stdout}\n--- 错误 ---\n{stderr}\n"
-    except subprocess.TimeoutExpired:
-        output_log = f"⌛ {action_name} 超时 (超过10分钟)。\n"
-        try:
-            process.kill()
-            stdout, stderr = process.communicate()
-            output_log += f"--- 最后输出 ---\n{stdout}\n--- 最后错误 ---\n{stderr}\n"
-        except Exception as kill_e:
-            output_log += f"--- 尝试终止超时进程时出错: {kill_e} ---\n"
-    except FileNotFoundError:
-        output_log = f"❌ 命令错误: 无法找到 '{command[0]}'. 请确保 pip 在 PATH 中。\n"
-    except Exception as e:
-        output_log = f"❌ 执行 {action_name} 时发生意外错误: {str(e)}\n"
-    root.after(0, command_finished, output_log, success)
+    output_log, success = run_pip_command(command, action_name, update_log)
+    ui_events.call(command_finished, output_log, success)
 
 def command_finished(log_message, needs_refresh):
     """pip 命令完成后更新 GUI。"""
@@ -437,14 +411,14 @@ def refresh_package_list_threaded():
     """在后台线程中获取更新的包列表。"""
     global all_packages
     try:
-        pkg_resources._initialize_master_working_set()
         all_packages = get_installed_packages()
-        log_msg = "✅ 包列表刷新完成。\n"
+        scanner = get_scanner()
+        log_msg = f"✅ 包列表刷新完成 ({scanner.last_duration * 1000:.0f}毫秒，重新读取 {scanner.last_reads} 个元数据)。\n"
         success = True
     except Exception as e:
         log_msg = f"❌ 刷新包列表时出错: {e}\n"
         success = False
-    root.after(0, update_gui_after_refresh, log_msg, success)
+    ui_events.call(update_gui_after_refresh, log_msg, success)
 
 def update_gui_after_refresh(log_msg, success):
     """刷新后更新表格并启用按钮。"""
@@ -467,7 +441,8 @@ def update_gui_after_refresh(log_msg, success):
 
 def disable_buttons():
     """在操作期间禁用按钮。"""
-    for btn in [install_button, uninstall_button, change_source_button, check_updates_button, toggle_view_button, update_all_button]:
+    for btn in [install_button, uninstall_button, change_source_button, check_updates_button, toggle_view_button, update_all_button,
+                environment_combobox, rollback_button]:
         try:
             if btn and btn.winfo_exists():
                 btn.config(state="disabled")
@@ -479,6 +454,10 @@ def enable_buttons():
     try:
         if install_button and install_button.winfo_exists():
             install_button.config(state="normal")
+        if environment_combobox and environment_combobox.winfo_exists():
+            environment_combobox.config(state="readonly")
+        if rollback_button and rollback_button.winfo_exists():
+            rollback_button.config(state="normal")
         if uninstall_button and uninstall_button.winfo_exists():
             uninstall_button.config(state="normal")
         if change_source_button and change_source_button.winfo_exists():
@@ -493,19 +472,46 @@ def enable_buttons():
         pass
 
 def update_log(message):
-    """将消息追加到日志显示区域。"""
-    if not log_display_area or not log_display_area.winfo_exists():
+    """将消息加入日志缓冲 (可在任意线程调用)，由 flush_log 批量显示。"""
+    if log_buffer is None:
+        print(message)
         return
-    try:
-        log_display_area.config(state=tk.NORMAL)
-        log_display_area.insert(tk.END, message + "\n")
-        log_display_area.see(tk.END)
-        log_display_area.config(state=tk.DISABLED)
-    except tk.TclError as e:
-        print(f"更新日志出错: {e}")
+    log_buffer.write(message)
+
+def pump_ui_events():
+    """界面线程的固定频率循环：处理工作线程投递的事件，并按 LOG_FLUSH_MS 的间隔刷新日志。"""
+    global last_log_flush
+    ui_events.dispatch()
+    now = time.monotonic()
+    if (now - last_log_flush) * 1000 >= LOG_FLUSH_MS:
+        last_log_flush = now
+        flush_log()
+    root.after(UI_PUMP_MS, pump_ui_events)
+
+def flush_log():
+    """把积压的日志一次性插入日志区域，并只保留最后 LOG_MAX_LINES 行。"""
+    messages, dropped = log_buffer.drain()
+    if messages and log_display_area and log_display_area.winfo_exists():
+        text = "".join(message + "\n" for message in messages)
+        if dropped:
+            text = f"… 输出过快，省略了 {dropped} 条日志 (完整日志见 {log_buffer.path}) …\n" + text
+        try:
+            at_bottom = log_display_area.yview()[1] >= 1.0  # 用户向上翻看时不自动滚动
+            log_display_area.config(state=tk.NORMAL)
+            log_display_area.insert(tk.END, text)
+            excess = int(log_display_area.index("end-1c").split(".")[0]) - LOG_MAX_LINES
+            if excess > 0:
+                log_display_area.delete("1.0", f"{excess + 1}.0")
+            if at_bottom:
+                log_display_area.see(tk.END)
+            log_display_area.config(state=tk.DISABLED)
+        except tk.TclError as e:
+            print(f"更新日志出错: {e}")
 
 def clear_log():
     """清除日志显示区域。"""
+    if log_buffer is not None:
+        log_buffer.clear()
     if not log_display_area or not log_display_area.winfo_exists():
         return
     try:
@@ -515,55 +521,46 @@ def clear_log():
     except tk.TclError:
         pass
 
-def on_tree_select(event):
-    """处理 Treeview 中的选择变化，放置/更新组合框。"""
-    selected_items = tree.selection()
-    if not selected_items:
+def on_tree_select(event=None):
+    """处理表格中的选择变化，放置/更新组合框。"""
+    selected_row = table.selected_row()
+    if not selected_row:
         for widget in version_comboboxes.values():
             if widget and widget.winfo_ismapped():
                 widget.place_forget()
         return
-    item_id = selected_items[0]
-    for row_id, widget in list(version_comboboxes.items()):
-        if widget and row_id != item_id:
+    pkg_name = selected_row[0]
+    for name, widget in list(version_comboboxes.items()):
+        if widget and name != pkg_name:
             try:
                 if widget.winfo_exists():
                     widget.place_forget()
             except tk.TclError:
                 pass
-    existing_combobox = version_comboboxes.get(item_id)
-    if existing_combobox and not existing_combobox.winfo_exists():
-        existing_combobox = None
-        version_comboboxes[item_id] = None
-    try:
-        if not tree.exists(item_id):
-            return
-        pkg_name, _ = tree.item(item_id, "values")
-    except tk.TclError:
-        return
-    if not existing_combobox:
+    combobox = version_comboboxes.get(pkg_name)
+    if not combobox or not combobox.winfo_exists():
         combobox = ttk.Combobox(tree, state="disabled", exportselection=False)
-        version_comboboxes[item_id] = combobox
-    else:
-        combobox = existing_combobox
+        version_comboboxes[pkg_name] = combobox
     combobox.set("正在查询版本...")
     combobox.configure(state="disabled")
-    root.after(10, place_combobox, item_id, combobox, pkg_name)
+    root.after(10, place_combobox, combobox, pkg_name)
+    schedule_speculative_prefetch()
 
-def place_combobox(item_id, combobox, pkg_name):
+def place_combobox(combobox, pkg_name):
     """放置组合框并开始获取版本。"""
     try:
         if not combobox.winfo_exists():
             return
-        if not tree.exists(item_id):
+        selected_row = table.selected_row()
+        if not selected_row or selected_row[0] != pkg_name:
+            combobox.place_forget()
             return
-        bbox = tree.bbox(item_id, column=1)
-        if bbox:
-            x, y, width, height = bbox
-            combobox.place(x=x, y=y, width=width, height=height)
-            threading.Thread(target=fetch_versions, args=(pkg_name, combobox), daemon=True).start()
+        kinds = VERSION_KIND_FILTERS.get(version_kind_var.get(), DEFAULT_VERSION_KINDS)
+        if has_cached_versions(pkg_name):
+            show_versions(versions_event(pkg_name, combobox, kinds))  # 已预取或查询过：直接填入
         else:
-            combobox.place_forget()
+            threading.Thread(target=fetch_versions, args=(pkg_name, combobox, kinds), daemon=True).start()
+        _do_update_combobox_position()
     except tk.TclError as e:
         print(f"为 {pkg_name} 放置组合框出错: {e}")
         try:
@@ -572,28 +569,32 @@ def place_combobox(item_id, combobox, pkg_name):
         except tk.TclError:
             pass
 
+def on_table_view_change():
+    """可见窗口滚动或尺寸变化后：更新组合框位置并安排推测预取。"""
+    update_combobox_position()
+    schedule_speculative_prefetch()
+
 def update_combobox_position(event=None):
-    """当视图变化时更新活动组合框的位置。"""
-    root.after_idle(_do_update_combobox_position)
+    """当视图变化时更新活动组合框的位置 (连续的变化只安排一次更新)。"""
+    global combobox_position_pending
+    if not combobox_position_pending:
+        combobox_position_pending = True
+        root.after_idle(_do_update_combobox_position)
 
 def _do_update_combobox_position():
-    """更新组合框位置的实际工作。"""
-    selected_items = tree.selection()
-    if not selected_items:
-        for row_id, widget in list(version_comboboxes.items()):
+    """更新组合框位置的实际工作：选中行滚出窗口时隐藏，滚回来时重新显示。"""
+    global combobox_position_pending
+    combobox_position_pending = False
+    selected_row = table.selected_row()
+    if not selected_row:
+        for widget in list(version_comboboxes.values()):
             if widget and widget.winfo_ismapped():
                 widget.place_forget()
         return
-    item_id = selected_items[0]
-    combobox = version_comboboxes.get(item_id)
+    combobox = version_comboboxes.get(selected_row[0])
     try:
         if combobox and combobox.winfo_exists():
-            if not tree.exists(item_id):
-                combobox.place_forget()
-                if version_comboboxes.get(item_id) == combobox:
-                    version_comboboxes[item_id] = None
-                return
-            bbox = tree.bbox(item_id, column=1)
+            bbox = table.selected_bbox("version")
             if bbox:
                 x, y, width, height = bbox
                 current_info = combobox.place_info()
@@ -621,8 +622,8 @@ def change_source():
             update_log("正在尝试移除自定义源...")
             success = False
             try:
-                cmd_global = [PIP_COMMAND, "config", "unset", "global.index-url"]
-                cmd_user = [PIP_COMMAND, "config", "unset", "user.index-url"]
+                cmd_global = pip_command("config", "unset", "global.index-url")
+                cmd_user = pip_command("config", "unset", "user.index-url")
                 subprocess.run(cmd_global, capture_output=True, check=False, creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
                 subprocess.run(cmd_user, capture_output=True, check=False, creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
                 success = True
@@ -634,6 +635,7 @@ def change_source():
                 success = False
             if success:
                 outdated_packages_data = None
+                reset_index_url()
                 try:
                     if toggle_view_button and toggle_view_button.winfo_exists():
                         toggle_view_button.config(state="disabled")
@@ -646,7 +648,13 @@ def change_source():
     if not (new_source.startswith("http://") or new_source.startswith("https://")):
         messagebox.showerror("格式错误", "源地址必须以 http:// 或 https:// 开头。")
         return
+    apply_source(new_source)
+
+def apply_source(new_source):
+    """用 pip config set 设置新的索引 URL，并清除依赖旧源的检查结果。"""
+    global outdated_packages_data
     outdated_packages_data = None
+    reset_index_url()
     try:
         if toggle_view_button and toggle_view_button.winfo_exists():
             toggle_view_button.config(state="disabled")
@@ -655,11 +663,71 @@ def change_source():
     except (tk.TclError, NameError):
         pass
     status_label.config(text="源已更改，请重新检查更新。")
-    command = [PIP_COMMAND, "config", "set", "global.index-url", new_source]
+    command = pip_command("config", "set", "global.index-url", new_source)
     action_name = f"设置新源为 {new_source}"
     run_pip_command_threaded(command, action_name)
     messagebox.showinfo("正在换源", f"已开始尝试将 pip 源设置为: {new_source}\n请查看下方日志了解结果。")
 
+def probe_sources():
+    """并行测速候选索引 (首字节时间、吞吐量、是否同步了最新版本)，排名后可直接应用最快的源。"""
+    from pip_toolbox.mirrors import describe, is_usable
+    window = tk.Toplevel(root)
+    window.title("测速选源")
+    window.geometry("760x300")
+    label = ttk.Label(window, text="正在并行测速候选索引...", anchor="w", padding=(10, 5))
+    label.pack(fill="x")
+    columns = ("rank", "url", "ttfb", "throughput", "fresh")
+    result_tree = ttk.Treeview(window, columns=columns, show="headings", selectmode="browse", height=8)
+    for column, text, width in (("rank", "#", 30), ("url", "索引", 330), ("ttfb", "首字节", 110),
+                                ("throughput", "吞吐量", 90), ("fresh", "新鲜度", 80)):
+        result_tree.heading(column, text=text, anchor="w")
+        result_tree.column(column, width=width, anchor="w", stretch=column == "url")
+    result_tree.pack(fill="both", expand=True, padx=10)
+    apply_button = ttk.Button(window, text="应用选定的源", state="disabled")
+    apply_button.pack(side="right", padx=10, pady=10)
+
+    def show_results(ranked):
+        if not window.winfo_exists():
+            return
+        for position, probe in enumerate(ranked, 1):
+            if not is_usable(probe):
+                values = (position, probe.url, "失败", "", probe.error or "")
+            else:
+                values = (position, probe.url, f"{probe.ttfb_seconds * 1000:.0f}毫秒",
+                          f"{probe.throughput / 1024:.0f}KB/s" if probe.throughput else "",
+                          f"{probe.fresh}/{probe.checked}" + (" (部分失败)" if probe.error else ""))
+            result_tree.insert("", "end", iid=probe.url, values=values)
+        usable = [probe for probe in ranked if is_usable(probe)]
+        if usable:
+            result_tree.selection_set(usable[0].url)
+            label.config(text=f"推荐: {usable[0].url} (先比较是否同步了最新版本，再比较预计加载时间)")
+            apply_button.config(state="normal")
+        else:
+            label.config(text="所有候选索引都无法访问。")
+
+    def show_failure(message):
+        if window.winfo_exists():
+            label.config(text=f"测速失败: {message}")
+
+    def apply_selected():
+        selection = result_tree.selection()
+        if selection:
+            window.destroy()
+            apply_source(selection[0])
+
+    def worker():
+        from pip_toolbox.mirrors import probe_mirrors
+        try:
+            ranked = probe_mirrors(on_result=lambda probe: update_log(f"📶 {describe(probe)}\n"))
+        except Exception as e:
+            update_log(f"❌ 测速选源出错: {e}\n")
+            ui_events.call(show_failure, str(e))
+            return
+        ui_events.call(show_results, ranked)
+
+    apply_button.config(command=apply_selected)
+    threading.Thread(target=worker, daemon=True).start()
+
 def toggle_log_display():
     """显示或隐藏日志显示区域。"""
     if log_visible_var.get():
@@ -677,6 +745,201 @@ def toggle_log_display():
         except (tk.TclError, NameError):
             pass
 
+# --- 快照与回滚 ---
+def show_snapshots():
+    """列出当前环境的快照，选择其中一个从 wheelhouse 离线回滚。"""
+    from pip_toolbox import config
+    from pip_toolbox.snapshots import describe, diff, list_snapshots, missing_wheels, restore_targets
+    snapshots = list_snapshots(config.target_python)
+    if not snapshots:
+        messagebox.showinfo("没有快照", "当前环境还没有快照。安装或全部更新之前会自动记录快照。")
+        return
+    window = tk.Toplevel(root)
+    window.title("快照与回滚")
+    window.geometry("700x360")
+    listbox = tk.Listbox(window, activestyle="none")
+    listbox.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+    details = ttk.Label(window, text="选择一个快照查看与当前环境的差异。", anchor="w", justify="left", wraplength=660)
+    details.pack(fill="x", padx=10)
+    for snapshot in snapshots:
+        listbox.insert("end", describe(snapshot))
+
+    def selected_snapshot():
+        selection = listbox.curselection()
+        return snapshots[selection[0]] if selection else None
+
+    def on_select(event=None):
+        snapshot = selected_snapshot()
+        if snapshot is None:
+            return
+        snapshot_diff = diff(snapshot)
+        missing = missing_wheels(restore_targets(snapshot_diff))
+        lines = [f"回滚将恢复 {len(snapshot_diff.changed)} 个包的版本、重新安装 {len(snapshot_diff.removed)} 个、"
+                 f"卸载 {len(snapshot_diff.added)} 个。"]
+        if snapshot_diff.modified:
+            lines.append(f"另有 {len(snapshot_diff.modified)} 个包版本未变但安装内容不同，将重新安装: "
+                         f"{format_name_list([name for name, _ in snapshot_diff.modified], 5)}")
+        lines += [f"{name}: {new} → {old}" for name, old, new in snapshot_diff.changed[:5]]
+        if missing:
+            lines.append(f"⚠️ wheelhouse 中缺少 {len(missing)} 个发行文件，无法离线回滚: {format_name_list(missing, 5)}")
+        details.config(text="\n".join(lines))
+
+    def do_rollback():
+        snapshot = selected_snapshot()
+        if snapshot is None:
+            messagebox.showwarning("未选择", "请选择要回滚到的快照。", parent=window)
+            return
+        if not messagebox.askyesno("回滚确认", f"确定要把当前环境回滚到以下快照吗？\n\n{describe(snapshot)}", parent=window):
+            return
+        window.destroy()
+        disable_buttons()
+        update_log(f"⏳ 回滚到快照 {snapshot['id']}...\n")
+        thread = threading.Thread(target=rollback_threaded, args=(snapshot,), daemon=True)
+        thread.start()
+
+    listbox.bind("<<ListboxSelect>>", on_select)
+    ttk.Button(window, text="回滚到选定快照", command=do_rollback).pack(side="right", padx=10, pady=10)
+
+def rollback_threaded(snapshot):
+    from pip_toolbox.snapshots import rollback
+    try:
+        success = rollback(snapshot, update_log)
+    except Exception as e:
+        ui_events.call(command_finished, f"❌ 回滚出错: {e}\n", True)
+        return
+    message = "✅ 回滚完成。\n" if success else "❌ 回滚未完成 (详见上方日志)。\n"
+    ui_events.call(command_finished, message, True)
+
+# --- 多环境 ---
+def window_title():
+    target = os.path.basename(PIP_COMMAND) if active_environment is None or active_environment.python is None \
+        else active_environment.python
+    return f"Python Pip 包管理器 (Using: {target})"
+
+def on_environment_selected(event=None):
+    """切换管理的目标环境并重新加载包列表。"""
+    env = environment_registry.find(environment_var.get())
+    if env is None or env is active_environment:
+        return
+    disable_buttons()
+    update_log(f"🔀 正在切换到环境 {env.name}...\n")
+    thread = threading.Thread(target=switch_environment_threaded, args=(env,), daemon=True)
+    thread.start()
+
+def switch_environment_threaded(env):
+    """在线程中运行一次目标解释器以取得其 sys.path (可能较慢)。"""
+    try:
+        env.probe()
+    except InterpreterError as e:
+        ui_events.call(environment_switch_failed, env, str(e))
+        return
+    ui_events.call(environment_switched, env)
+
+def environment_switched(env):
+    global active_environment, outdated_packages_data
+    activate(env)
+    active_environment = env
+    outdated_packages_data = None
+    root.title(window_title())
+    update_log(f"✅ 已切换到环境 {env.name} (Python {env.version}，{env.prefix})。\n")
+    status_label.config(text=f"正在加载环境 {env.name} 的包列表...")
+    thread = threading.Thread(target=refresh_package_list_threaded, daemon=True)
+    thread.start()
+
+def environment_switch_failed(env, error):
+    update_log(f"❌ 无法切换到环境 {env.name}: {error}\n")
+    environment_var.set(active_environment.name)
+    enable_buttons()
+
+def add_environment():
+    """选择一个解释器 (如虚拟环境中的 python) 登记为目标环境。"""
+    from tkinter import filedialog
+    python = filedialog.askopenfilename(title="选择 Python 解释器", parent=root)
+    if not python:
+        return
+    update_log(f"⏳ 正在检查解释器 {python}...\n")
+    thread = threading.Thread(target=add_environment_threaded, args=(python,), daemon=True)
+    thread.start()
+
+def add_environment_threaded(python):
+    try:
+        env = environment_registry.add(python)
+    except (InterpreterError, OSError) as e:
+        ui_events.call(update_log, f"❌ 无法登记环境: {e}\n")
+        return
+    ui_events.call(environment_added, env)
+
+def environment_added(env):
+    environment_combobox.config(values=environment_registry.names())
+    update_log(f"✅ 已登记环境 {env.name} (Python {env.version})。\n")
+
+def show_environment_matrix():
+    """新窗口：并行扫描所有登记的环境，显示每个包在各环境中的版本 (⬆ 表示过时)。"""
+    environments = list(environment_registry.environments)
+    window = tk.Toplevel(root)
+    window.title(f"环境矩阵 ({len(environments)} 个环境)")
+    window.geometry("900x500")
+    label = ttk.Label(window, text="正在扫描环境...", anchor="w", padding=(10, 5))
+    label.pack(fill="x")
+    only_outdated_var = tk.BooleanVar(value=True)
+    frame = ttk.Frame(window, padding="10 0 10 10")
+    columns = ("name", "latest") + tuple(f"env{i}" for i in range(len(environments)))
+    matrix_table = VirtualTreeview(frame, columns)
+    matrix_table.tree.heading("name", text="包名称", anchor="w")
+    matrix_table.tree.heading("latest", text="最新版本", anchor="w")
+    matrix_table.tree.column("name", width=200, anchor="w")
+    matrix_table.tree.column("latest", width=100, anchor="w")
+    for i, env in enumerate(environments):
+        matrix_table.tree.heading(f"env{i}", text=env.name, anchor="w")
+        matrix_table.tree.column(f"env{i}", width=110, anchor="w")
+    state = {"rows": []}
+
+    def show_rows():
+        rows = state["rows"]
+        if only_outdated_var.get():
+            rows = [row for row in rows if any(cell.startswith("⬆") for cell in row[2:])]
+        matrix_table.set_rows(rows)
+
+    ttk.Checkbutton(window, text="仅显示过时包", variable=only_outdated_var, command=show_rows).pack(anchor="w", padx=10)
+    frame.pack(fill="both", expand=True)
+    matrix_table.scrollbar.pack(side="right", fill="y")
+    matrix_table.tree.pack(side="left", fill="both", expand=True)
+
+    def finished(rows, message):
+        if not window.winfo_exists():
+            return
+        state["rows"] = rows
+        show_rows()
+        label.config(text=message)
+
+    def scanned(message):
+        if window.winfo_exists():
+            label.config(text=message)
+
+    def worker():
+        start = time.perf_counter()
+        inventories = scan_environments(environments)
+        failed = [name for name, packages in inventories.items() if isinstance(packages, Exception)]
+        scan_message = f"已扫描 {len(environments) - len(failed)} 个环境 ({time.perf_counter() - start:.2f}秒)"
+        if failed:
+            scan_message += f"，无法扫描: {', '.join(failed)}"
+        ui_events.call(scanned, scan_message + "，正在检查更新...")
+        matrix = outdated_matrix(inventories)
+        rows = []
+        outdated = 0
+        for row in matrix:
+            cells = []
+            for env in environments:
+                installed = row.cells.get(env.name)
+                newer = is_outdated(installed, row.latest)
+                cells.append("" if installed is None else f"⬆ {installed}" if newer else installed)
+            outdated += any(cell.startswith("⬆") for cell in cells)
+            rows.append((row.name, row.latest or ("未知" if row.error else ""), *cells))
+        ui_events.call(finished, rows, f"{scan_message}；{len(matrix)} 个包 (每个包只查询一次)，"
+                                       f"{outdated} 个至少在一个环境中过时，总耗时 {time.perf_counter() - start:.1f}秒。")
+
+    threading.Thread(target=worker, daemon=True).start()
+
 # --- 过时包逻辑 ---
 def check_for_updates():
     """在当前视图中启动检查过时包的过程（尊重任何活跃过滤）。"""
@@ -684,76 +947,185 @@ def check_for_updates():
     if checking_updates_thread and checking_updates_thread.is_alive():
         messagebox.showinfo("请稍候", "已经在检查更新了。")
         return
-    packages_to_check = []
-    displayed_item_ids = tree.get_children()
-    if not displayed_item_ids:
-        messagebox.showinfo("无包显示", "表格中当前没有显示任何包可供检查。")
-        return
-    for item_id in displayed_item_ids:
-        try:
-            pkg_name, pkg_version = tree.item(item_id, "values")
-            packages_to_check.append((pkg_name, pkg_version))
-        except tk.TclError:
-            print(f"警告: 无法获取项 {item_id} 的值，跳过。")
-            continue
+    packages_to_check = list(table.rows)
     if not packages_to_check:
-        messagebox.showinfo("无包", "无法获取表格中显示的包信息。")
+        messagebox.showinfo("无包显示", "表格中当前没有显示任何包可供检查。")
         return
     is_filtered_check = len(packages_to_check) < len(all_packages)
     check_scope_message = f"当前视图中的 {len(packages_to_check)} 个包" if is_filtered_check else f"所有 {len(all_packages)} 个已安装包"
     status_suffix = " (筛选后)" if is_filtered_check else ""
+    kinds = VERSION_KIND_FILTERS.get(version_kind_var.get(), DEFAULT_VERSION_KINDS)
+    checkpoint, saved = None, {}
+    if not is_filtered_check:  # 只有检查全部包时使用检查点，筛选后的检查不会覆盖未完成的全部检查
+        checkpoint, saved = load_check_checkpoint(packages_to_check, kinds)
+        if saved is None:
+            return
     disable_buttons()
+    cancel_check_button.config(state="normal")
+    pause_check_button.config(state="normal", text="暂停检查")
     status_label.config(text=f"正在准备检查更新{status_suffix}...")
-    update_log(f"⏳ 开始检查 {check_scope_message} 的更新...")
+    update_log(f"⏳ 开始检查 {check_scope_message} 的更新 (并发 {CHECK_WORKERS})...")
     session_cache = {}
     checking_updates_thread = threading.Thread(target=check_for_updates_threaded,
-                                             args=(packages_to_check, session_cache, is_filtered_check),
+                                             args=(packages_to_check, session_cache, is_filtered_check, kinds,
+                                                   checkpoint, saved),
                                              daemon=True)
     checking_updates_thread.start()
 
-def check_for_updates_threaded(packages_to_check, session_cache, is_filtered_check):
-    """工作线程函数，从提供的列表中查找过时包。"""
+def load_check_checkpoint(packages_to_check, kinds):
+    """查找同一环境、索引与版本类型上未完成的检查，询问是否继续。
+
+    返回 (检查点, 可沿用的结果)；用户选择重新检查时结果为空字典，选择取消时为 None。
+    """
+    from pip_toolbox import config
+    from pip_toolbox.checkpoints import CheckCheckpoint
+    from pip_toolbox.lookup import get_index_url
+    checkpoint = CheckCheckpoint(config.target_python, get_index_url(), kinds)
+    saved = checkpoint.load()
+    reusable = len(checkpoint.split(packages_to_check, saved)[0]) if saved else 0
+    if not reusable:
+        return checkpoint, {}
+    started = time.strftime("%Y-%m-%d %H:%M", time.localtime(checkpoint.started))
+    answer = messagebox.askyesnocancel(
+        "继续上次的检查", f"{started} 开始的检查更新没有完成，其中 {reusable}/{len(packages_to_check)} 个包的结果仍然有效。\n\n"
+                   f"是: 从中断处继续\n否: 重新检查全部\n取消: 不检查")
+    if answer is None:
+        return checkpoint, None
+    return checkpoint, saved if answer else {}
+
+def check_for_updates_threaded(packages_to_check, session_cache, is_filtered_check, kinds=DEFAULT_VERSION_KINDS,
+                               checkpoint=None, saved=None):
+    """工作线程函数，从提供的列表中并发查找过时包；给出检查点时逐个记录结果，并沿用 saved 中的结果。"""
+    global active_check_scheduler
     outdated_list = []
     total_packages = len(packages_to_check)
-    start_time = time.time()
+    reused = []
+    if checkpoint is not None:
+        reused, packages_to_check = checkpoint.split(packages_to_check, saved or {})
+        try:
+            checkpoint.open(resume=bool(reused))
+        except OSError as e:
+            update_log(f"⚠️ 无法写入检查点，本次检查中断后无法继续: {e}")
+            checkpoint = None
+        outdated_list += [(r.name, r.installed, r.latest) for r in reused if r.outdated]
+        if reused:
+            update_log(f"↩️ 沿用检查点中 {len(reused)} 个包的结果，继续检查其余 {len(packages_to_check)} 个包...")
     status_suffix = " (筛选后)" if is_filtered_check else ""
-    print(f"[线程] 检查 {total_packages} 个包的更新{status_suffix}...")
-    for i, (pkg_name, installed_version_str) in enumerate(packages_to_check):
-        progress = int(((i + 1) / total_packages) * 100)
-        if i % 5 == 0 or i == total_packages - 1:
-            root.after(0, update_progress, progress, pkg_name, total_packages, i + 1, status_suffix)
-        latest_version_str = get_latest_version(pkg_name, session_cache)
-        if latest_version_str:
-            try:
-                installed_ver = parse_version(installed_version_str)
-                latest_ver = parse_version(latest_version_str)
-                if latest_ver > installed_ver:
-                    outdated_list.append((pkg_name, installed_version_str, latest_version_str))
-            except Exception as e:
-                print(f"[线程] 警告: 无法为 {pkg_name} 比较版本 ('{installed_version_str}' vs '{latest_version_str}'): {e}")
-                root.after(0, update_log, f"⚠️ 无法比较版本: {pkg_name} ({installed_version_str} / {latest_version_str})")
-    end_time = time.time()
-    duration = end_time - start_time
+    scheduler = create_check_scheduler(session_cache, kinds)
+    active_check_scheduler = scheduler
+    hedged = len(get_lookup_index_urls()) > 1
+    if hedged:
+        from pip_toolbox.hedging import index_stats
+        index_stats.reset()
+    print(f"[线程] 检查 {total_packages} 个包的更新{status_suffix} (并发 {scheduler.max_workers})...")
+    done_count = len(reused)
+    unknown_list = []  # 查询失败或版本无法比较的包：结果未知，不能当作已是最新
+    # 索引上没有的包 (如本地安装的包)：结论明确，不算查询失败
+    not_found_list = [r.name for r in reused if r.not_found]
+    with foreground_lookups():  # 检查更新期间不开始新的推测预取
+        for result in iter_update_checks(scheduler, packages_to_check):
+            done_count += 1
+            ui_events.post_latest("check", Progress("check", done_count, total_packages, result.name, status_suffix))
+            if result.not_found:
+                not_found_list.append(result.name)
+            elif result.error:
+                unknown_list.append(result.name)
+                if result.latest is not None:
+                    update_log(f"⚠️ {result.error}")
+                else:
+                    print(f"[线程] {result.error}")
+            elif result.outdated:
+                outdated_list.append((result.name, result.installed, result.latest))
+            if checkpoint is not None:
+                checkpoint.record(result)
+    active_check_scheduler = None
+    duration = scheduler.elapsed
+    cancelled = scheduler.cancelled
+    if checkpoint is not None:
+        if cancelled:
+            checkpoint.close()
+            update_log(f"💾 已保存 {done_count} 个包的检查进度，下次检查时可以从中断处继续。")
+        else:
+            checkpoint.finish()
     print(f"[线程] 检查在 {duration:.2f}秒内完成。找到 {len(outdated_list)} 个过时包{status_suffix}。")
-    root.after(0, updates_check_finished, outdated_list, duration, is_filtered_check)
+    if not_found_list:
+        update_log(f"🔎 {len(not_found_list)} 个包在索引上不存在 (如本地安装的包): "
+                   f"{format_name_list(sorted(not_found_list))}")
+    if unknown_list:
+        update_log(f"❔ {len(unknown_list)} 个包结果未知 (查询失败，不代表已是最新): {format_name_list(sorted(unknown_list))}")
+    update_log(f"⏱️ {scheduler.summary()}\n   {version_cache.summary()}\n   {ui_events.summary()}")
+    if hedged:
+        update_log(f"   {index_stats.summary()}")
+    if unknown_list and USE_NATIVE_INDEX:
+        from pip_toolbox.resilience import health_summary
+        health = health_summary()
+        if health:
+            update_log(f"   {health}")
+    if tracer.enabled:
+        update_log(tracer.summary())
+        if tracer.path:
+            try:
+                update_log(f"追踪已导出到 {tracer.export_chrome_trace()}")
+            except OSError as e:
+                update_log(f"⚠️ 导出追踪失败: {e}")
+    ui_events.call(updates_check_finished, outdated_list, duration, is_filtered_check, cancelled, done_count,
+                   len(unknown_list))
+
+def cancel_check_for_updates():
+    """取消正在运行的更新检查，已完成的结果会被保留。"""
+    scheduler = active_check_scheduler
+    if scheduler and not scheduler.cancelled:
+        scheduler.cancel()
+        cancel_check_button.config(state="disabled")
+        pause_check_button.config(state="disabled")
+        status_label.config(text="正在取消检查更新...")
+        update_log("⏹️ 已请求取消检查，等待进行中的查询结束...")
+
+def toggle_pause_check():
+    """暂停或继续正在运行的更新检查；暂停时进行中的查询照常完成，已有结果保留。"""
+    scheduler = active_check_scheduler
+    if not scheduler or scheduler.cancelled:
+        return
+    if scheduler.paused:
+        scheduler.resume()
+        pause_check_button.config(text="暂停检查")
+        update_log("▶️ 继续检查更新。")
+    else:
+        scheduler.pause()
+        pause_check_button.config(text="继续检查")
+        status_label.config(text="检查更新已暂停 (进行中的查询完成后停止)")
+        update_log("⏸️ 已暂停检查更新，点击「继续检查」恢复。")
 
-def update_progress(progress, current_pkg, total, count, status_suffix):
-    """用进度更新状态标签（在主线程中运行）。"""
+def update_progress(event):
+    """用最新的进度更新状态标签（在主线程中运行，同一刷新周期内的旧进度已被合并掉）。"""
+    progress = int(event.done / event.total * 100) if event.total else 100
     try:
         if status_label and status_label.winfo_exists():
-            status_label.config(text=f"正在检查更新{status_suffix} ({progress}%): {count}/{total} ({current_pkg})...")
+            status_label.config(text=f"正在检查更新{event.suffix} ({progress}%): "
+                                     f"{event.done}/{event.total} ({event.current})...")
     except tk.TclError:
         pass
 
-def updates_check_finished(outdated_list, duration, is_filtered_check):
+def updates_check_finished(outdated_list, duration, is_filtered_check, cancelled=False, checked_count=None,
+                           unknown_count=0):
     """当更新检查线程完成时调用（在主线程中运行）。"""
     global outdated_packages_data, current_view_mode
     outdated_packages_data = sorted(outdated_list)
     count = len(outdated_packages_data)
-    checked_count_display = len(tree.get_children()) if is_filtered_check else len(all_packages)
+    checked_count_display = len(table.rows) if is_filtered_check else len(all_packages)
     status_suffix = " (筛选后)" if is_filtered_check else ""
     scope_desc = f"检查了 {checked_count_display} 个显示的包" if is_filtered_check else f"检查了所有 {len(all_packages)} 个包"
-    status_message = f"{scope_desc}，完成 ({duration:.1f}秒): 找到 {count} 个过时包{status_suffix}。"
+    if cancelled:
+        scope_desc = f"检查已取消，已检查 {checked_count} 个包"
+    try:
+        if cancel_check_button and cancel_check_button.winfo_exists():
+            cancel_check_button.config(state="disabled")
+        if pause_check_button and pause_check_button.winfo_exists():
+            pause_check_button.config(state="disabled", text="暂停检查")
+    except tk.TclError:
+        pass
+    unknown_desc = f"，{unknown_count} 个包结果未知 (查询失败)" if unknown_count else ""
+    status_message = f"{scope_desc}，完成 ({duration:.1f}秒): 找到 {count} 个过时包{unknown_desc}{status_suffix}。"
     try:
         if status_label and status_label.winfo_exists():
             status_label.config(text=status_message)
@@ -768,6 +1140,11 @@ def updates_check_finished(outdated_list, duration, is_filtered_check):
                     populate_table(view_mode="outdated")
             elif current_view_mode == "outdated":
                 populate_table(view_mode="outdated")
+        elif unknown_count:
+            messagebox.showwarning("检查完成", f"在能够查询的包中未找到过时版本{status_suffix}，但有 {unknown_count} 个包"
+                                              f"查询失败，无法确定是否为最新 (详见日志)。")
+            if current_view_mode == "outdated":
+                toggle_outdated_view()
         else:
             messagebox.showinfo("检查完成", f"在检查的包中未找到过时版本{status_suffix}。")
             if current_view_mode == "outdated":
@@ -803,102 +1180,134 @@ def toggle_outdated_view():
         print("切换视图出错 (控件可能已被销毁)。")
 
 # --- 主应用程序设置 ---
-root = tk.Tk()
-root.title(f"Python Pip 包管理器 (Using: {os.path.basename(PIP_COMMAND)})")
+def build_gui():
+    """创建主窗口和全部控件 (只在 main() 中调用)。"""
+    global root, search_var, fuzzy_search_var, version_kind_var, log_visible_var
+    global table, tree, tree_scrollbar, package_count_label, version_kind_combobox
+    global install_button, uninstall_button, check_updates_button, toggle_view_button, rollback_button
+    global cancel_check_button, pause_check_button, update_all_button, change_source_button
+    global status_bar, status_label, log_frame, log_display_area, clear_log_button, log_buffer
+    global environment_registry, active_environment, environment_var, environment_combobox, speculative_prefetcher
+    root = tk.Tk()
+    environment_registry = EnvironmentRegistry()
+    active_environment = environment_registry.environments[0]
+    root.title(window_title())
 
-sw = root.winfo_screenwidth()
-sh = root.winfo_screenheight()
+    sw = root.winfo_screenwidth()
+    sh = root.winfo_screenheight()
 
-w = int(sw * 0.31)
-h = int(sh * 0.7)
+    w = int(sw * 0.31)
+    h = int(sh * 0.7)
 
-root.geometry(f"{w}x{h}+200+100")
+    root.geometry(f"{w}x{h}+200+100")
 
-#root.geometry("800x750")
-#root.minsize(500, 800)
+    #root.geometry("800x750")
+    #root.minsize(500, 800)
 
-# --- 样式配置 (可选) ---
-style = ttk.Style()
-try:
-    if os.name == 'nt':
-        style.theme_use('vista')
-    elif sys.platform == 'darwin':
-        style.theme_use('aqua')
-    else:
-        style.theme_use('clam')
-except tk.TclError:
-    print("注意: 选择的 ttk 主题不可用，使用默认。")
-style.configure('Toolbutton', font=('Segoe UI', 9) if os.name == 'nt' else ('Sans', 9))
-
-# --- 顶部框架 (搜索和计数) ---
-top_frame = ttk.Frame(root, padding="10 5 10 5")
-top_frame.pack(fill="x")
-ttk.Label(top_frame, text="搜索包:").pack(side="left")
-search_var = tk.StringVar()
-search_entry = ttk.Entry(top_frame, textvariable=search_var, width=30)
-search_entry.pack(side="left", fill="x", expand=True, padx=5)
-search_entry.bind("<KeyRelease>", search_packages)
-package_count_label = ttk.Label(top_frame, text="包数量: 0", width=20, anchor='e')
-package_count_label.pack(side="right", padx=(5, 0))
-
-# --- 中间框架 (Treeview 和滚动条) ---
-tree_frame = ttk.Frame(root, padding="10 5 10 5")
-tree_frame.pack(fill="both", expand=True)
-columns = ("name", "version")
-tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="browse")
-tree.heading("name", text="包名称", anchor="w")
-tree.heading("version", text="版本信息", anchor="w")
-tree.column("name", width=350, stretch=tk.YES, anchor="w")
-tree.column("version", width=200, stretch=tk.YES, anchor="w")
-tree_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-tree.configure(yscrollcommand=tree_scrollbar.set)
-tree_scrollbar.pack(side="right", fill="y")
-tree.pack(side="left", fill="both", expand=True)
-
-# --- 按钮框架 ---
-button_frame = ttk.Frame(root, padding="10 5 10 10")
-button_frame.pack(fill="x")
-install_button = ttk.Button(button_frame, text="安装/更新选定版本", command=install_selected_version)
-install_button.pack(side="left", padx=(0, 5))
-uninstall_button = ttk.Button(button_frame, text="卸载选定包", command=uninstall_selected_package)
-uninstall_button.pack(side="left", padx=5)
-ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side="left", fill='y', padx=10, pady=2)
-check_updates_button = ttk.Button(button_frame, text="检查更新", command=check_for_updates)
-check_updates_button.pack(side="left", padx=5)
-toggle_view_button = ttk.Button(button_frame, text="仅显示过时包", command=toggle_outdated_view, state="disabled")
-toggle_view_button.pack(side="left", padx=5)
-ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side="left", fill='y', padx=10, pady=2)
-update_all_button = ttk.Button(button_frame, text="全部更新", command=update_all_packages, state="disabled")
-update_all_button.pack(side="left", padx=5)
-change_source_button = ttk.Button(button_frame, text="更改 Pip 源", command=change_source)
-change_source_button.pack(side="right", padx=(5, 0))
-
-# --- 状态栏 ---
-status_bar = ttk.Frame(root, relief=tk.SUNKEN, borderwidth=1, padding=0)
-status_bar.pack(side="bottom", fill="x")
-status_label = ttk.Label(status_bar, text="就绪.", anchor='w', padding=(5, 2, 5, 2))
-status_label.pack(side="left", fill="x", expand=True)
-log_visible_var = tk.BooleanVar(value=True)  # 默认显示日志
-log_toggle_checkbutton = ttk.Checkbutton(status_bar, text="日志", variable=log_visible_var, command=toggle_log_display, style='Toolbutton')
-log_toggle_checkbutton.pack(side="right", padx=(0, 2), pady=1)
-clear_log_button = ttk.Button(status_bar, text="清空", command=clear_log, width=5, style='Toolbutton')
-
-# --- 日志区域 (初始显示) ---
-log_frame = ttk.Frame(root, height=150, relief=tk.GROOVE, borderwidth=1)
-log_display_area = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=8, state=tk.DISABLED, relief=tk.FLAT, bd=0, font=("Consolas", 9) if os.name=='nt' else ("Monospace", 9))
-log_display_area.pack(side="top", fill="both", expand=True, padx=1, pady=1)
-toggle_log_display()  # 启动时显示日志
-
-# --- 事件绑定 ---
-tree.bind("<<TreeviewSelect>>", on_tree_select)
-tree.bind("<Configure>", update_combobox_position)
-root.bind("<Configure>", update_combobox_position)
-tree_scrollbar.bind("<B1-Motion>", lambda e: root.after(50, update_combobox_position))
-root.bind_all("<MouseWheel>", lambda e: root.after(50, update_combobox_position))
-tree.bind("<Up>", lambda e: root.after(50, update_combobox_position))
-tree.bind("<Down>", lambda e: root.after(50, update_combobox_position))
-tree.bind("<Prior>", lambda e: root.after(50, update_combobox_position))
-tree.bind("<Next>", lambda e: root.after(50, update_combobox_position))
+    # --- 样式配置 (可选) ---
+    style = ttk.Style()
+    try:
+        if os.name == 'nt':
+            style.theme_use('vista')
+        elif sys.platform == 'darwin':
+            style.theme_use('aqua')
+        else:
+            style.theme_use('clam')
+    except tk.TclError:
+        print("注意: 选择的 ttk 主题不可用，使用默认。")
+    style.configure('Toolbutton', font=('Segoe UI', 9) if os.name == 'nt' else ('Sans', 9))
+
+    # --- 环境框架 ---
+    env_frame = ttk.Frame(root, padding="10 5 10 0")
+    env_frame.pack(fill="x")
+    ttk.Label(env_frame, text="环境:").pack(side="left")
+    environment_var = tk.StringVar(value=active_environment.name)
+    environment_combobox = ttk.Combobox(env_frame, textvariable=environment_var, values=environment_registry.names(),
+                                        state="readonly", width=40)
+    environment_combobox.pack(side="left", fill="x", expand=True, padx=5)
+    environment_combobox.bind("<<ComboboxSelected>>", on_environment_selected)
+    ttk.Button(env_frame, text="环境矩阵", command=show_environment_matrix).pack(side="right", padx=(5, 0))
+    ttk.Button(env_frame, text="添加环境...", command=add_environment).pack(side="right", padx=(5, 0))
+
+    # --- 顶部框架 (搜索和计数) ---
+    top_frame = ttk.Frame(root, padding="10 5 10 5")
+    top_frame.pack(fill="x")
+    ttk.Label(top_frame, text="搜索包:").pack(side="left")
+    search_var = tk.StringVar()
+    search_entry = ttk.Entry(top_frame, textvariable=search_var, width=30)
+    search_entry.pack(side="left", fill="x", expand=True, padx=5)
+    search_entry.bind("<KeyRelease>", search_packages)
+    fuzzy_search_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(top_frame, text="模糊", variable=fuzzy_search_var, command=apply_search).pack(side="left")
+    package_count_label = ttk.Label(top_frame, text="包数量: 0", width=20, anchor='e')
+    package_count_label.pack(side="right", padx=(5, 0))
+    version_kind_var = tk.StringVar(value=next(iter(VERSION_KIND_FILTERS)))
+    version_kind_combobox = ttk.Combobox(top_frame, textvariable=version_kind_var, values=list(VERSION_KIND_FILTERS),
+                                         state="readonly", width=16)
+    version_kind_combobox.pack(side="right", padx=(5, 0))
+    ttk.Label(top_frame, text="版本类型:").pack(side="right")
+
+    # --- 中间框架 (Treeview 和滚动条) ---
+    tree_frame = ttk.Frame(root, padding="10 5 10 5")
+    tree_frame.pack(fill="both", expand=True)
+    columns = ("name", "version")
+    table = VirtualTreeview(tree_frame, columns, on_select=on_tree_select, on_view_change=on_table_view_change)
+    tree, tree_scrollbar = table.tree, table.scrollbar
+    if USE_SPECULATIVE_PREFETCH and USE_NATIVE_INDEX:  # 回退到 pip 子进程时每次查询代价太高，不做推测预取
+        speculative_prefetcher = SpeculativePrefetcher(cached_versions, has_cached_versions)
+    tree.heading("name", text="包名称", anchor="w")
+    tree.heading("version", text="版本信息", anchor="w")
+    tree.column("name", width=350, stretch=tk.YES, anchor="w")
+    tree.column("version", width=200, stretch=tk.YES, anchor="w")
+    tree_scrollbar.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+
+    # --- 按钮框架 ---
+    button_frame = ttk.Frame(root, padding="10 5 10 10")
+    button_frame.pack(fill="x")
+    install_button = ttk.Button(button_frame, text="安装/更新选定版本", command=install_selected_version)
+    install_button.pack(side="left", padx=(0, 5))
+    uninstall_button = ttk.Button(button_frame, text="卸载选定包", command=uninstall_selected_package)
+    uninstall_button.pack(side="left", padx=5)
+    ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side="left", fill='y', padx=10, pady=2)
+    check_updates_button = ttk.Button(button_frame, text="检查更新", command=check_for_updates)
+    check_updates_button.pack(side="left", padx=5)
+    toggle_view_button = ttk.Button(button_frame, text="仅显示过时包", command=toggle_outdated_view, state="disabled")
+    toggle_view_button.pack(side="left", padx=5)
+    cancel_check_button = ttk.Button(button_frame, text="取消检查", command=cancel_check_for_updates, state="disabled")
+    cancel_check_button.pack(side="left", padx=5)
+    pause_check_button = ttk.Button(button_frame, text="暂停检查", command=toggle_pause_check, state="disabled")
+    pause_check_button.pack(side="left", padx=5)
+    ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side="left", fill='y', padx=10, pady=2)
+    update_all_button = ttk.Button(button_frame, text="全部更新", command=update_all_packages, state="disabled")
+    update_all_button.pack(side="left", padx=5)
+    change_source_button = ttk.Button(button_frame, text="更改 Pip 源", command=change_source)
+    change_source_button.pack(side="right", padx=(5, 0))
+    ttk.Button(button_frame, text="测速选源", command=probe_sources).pack(side="right", padx=5)
+    rollback_button = ttk.Button(button_frame, text="快照/回滚", command=show_snapshots)
+    rollback_button.pack(side="right", padx=5)
+
+    # --- 状态栏 ---
+    status_bar = ttk.Frame(root, relief=tk.SUNKEN, borderwidth=1, padding=0)
+    status_bar.pack(side="bottom", fill="x")
+    status_label = ttk.Label(status_bar, text="就绪.", anchor='w', padding=(5, 2, 5, 2))
+    status_label.pack(side="left", fill="x", expand=True)
+    log_visible_var = tk.BooleanVar(value=True)  # 默认显示日志
+    log_toggle_checkbutton = ttk.Checkbutton(status_bar, text="日志", variable=log_visible_var, command=toggle_log_display, style='Toolbutton')
+    log_toggle_checkbutton.pack(side="right", padx=(0, 2), pady=1)
+    clear_log_button = ttk.Button(status_bar, text="清空", command=clear_log, width=5, style='Toolbutton')
+
+    # --- 日志区域 (初始显示) ---
+    log_frame = ttk.Frame(root, height=150, relief=tk.GROOVE, borderwidth=1)
+    log_display_area = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=8, state=tk.DISABLED, relief=tk.FLAT, bd=0, font=("Consolas", 9) if os.name=='nt' else ("Monospace", 9))
+    log_display_area.pack(side="top", fill="both", expand=True, padx=1, pady=1)
+    toggle_log_display()  # 启动时显示日志
+    log_buffer = LogBuffer(log_file_path())
+
+    # --- 事件绑定 ---
+    # 表格的选择与滚动回调已在 VirtualTreeview 中设置 (on_select / on_view_change)
+    version_kind_combobox.bind("<<ComboboxSelected>>", on_tree_select)  # 按新的类型筛选重新显示版本 (命中缓存)
+    root.bind("<Configure>", update_combobox_position)
 
 # --- 初始数据加载 ---
 def initial_load():
@@ -910,6 +1319,10 @@ def initial_load():
 
 # --- 主执行 ---
 def main():
+    build_gui()
+    ui_events.subscribe(Progress, update_progress)
+    ui_events.subscribe(VersionsLoaded, show_versions)
+    root.after(UI_PUMP_MS, pump_ui_events)
     root.after(100, initial_load)
     root.mainloop()
 
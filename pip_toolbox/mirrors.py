@@ -0,0 +1,130 @@
+"""候选索引 (镜像) 的并行测速与排名。
+
+对每个候选索引用独立的连接请求若干个示例项目页面，记录：
+- 首字节时间 (TTFB)：第一次请求含建立连接 (DNS/TCP/TLS)，之后的请求复用 keep-alive 连接；
+- 吞吐量：示例页面正文 (解压前) 字节数 / 传输时间；
+- 新鲜度：示例项目的最新版本是否与所有候选中见到的最新版本一致 (镜像同步滞后时会落后)。
+排名时不可用的候选 (没有查到任何版本) 排在最后，部分请求出错的排在全部成功的之后，
+再比较新鲜度与预计的页面加载时间 (TTFB + 典型页面大小 / 吞吐量)。
+"""
+import statistics
+from collections import namedtuple
+
+from packaging.version import InvalidVersion, Version
+
+from pip_toolbox.config import MIRROR_CANDIDATES
+from pip_toolbox.index_client import IndexLookupError, SimpleIndexClient, parse_project_page, sort_versions
+from pip_toolbox.scheduler import LookupScheduler
+from pip_toolbox.tracing import span
+
+# --- 配置 ---
+PROBE_PACKAGES = ("pip", "setuptools", "urllib3")  # 发布频繁的项目，适合判断镜像是否及时同步；第一个同时用于测吞吐量
+PROBE_TIMEOUT = 10
+TYPICAL_PAGE_BYTES = 64 * 1024  # 估算页面加载时间时使用的典型项目页面大小
+
+# latest: {项目: 该镜像上的最新版本}；fresh / checked: 新鲜的项目数 / 成功查询的项目数 (由 rank_probes 填写)
+MirrorProbe = namedtuple("MirrorProbe", "url connect_seconds ttfb_seconds throughput bytes latest error fresh checked")
+
+
+def _probe_one(url, packages, timeout):
+    """依次请求 packages 的项目页面，返回 MirrorProbe (fresh/checked 尚未计算)。"""
+    client = SimpleIndexClient(url, timeout=timeout)
+    first_bytes, latest = [], {}
+    transferred = transfer_seconds = 0.0
+    error = None
+    try:
+        with span("mirror.probe", url=url):
+            for pkg_name in packages:
+                timings = {}
+                try:
+                    status, headers, body, _ = client.request(client.project_url(pkg_name), timings=timings)
+                except IndexLookupError as e:
+                    error = str(e)
+                    break
+                first_bytes.append(timings["first_byte"])
+                transferred += timings["wire_bytes"]
+                transfer_seconds += max(timings["total"] - timings["first_byte"], 1e-6)
+                if status != 200:
+                    error = error or f"{pkg_name}: HTTP {status}"
+                    continue
+                versions = sort_versions(parse_project_page(body, headers.get("content-type", ""), pkg_name))
+                if versions:
+                    latest[pkg_name] = versions[0]
+    finally:
+        client.close()
+    if not first_bytes:
+        return MirrorProbe(url, None, None, None, 0, latest, error or "没有成功的请求", 0, 0)
+    warm = first_bytes[1:] or first_bytes
+    throughput = transferred / transfer_seconds if transferred else None
+    return MirrorProbe(url, first_bytes[0], statistics.median(warm), throughput, int(transferred), latest,
+                       error, 0, 0)
+
+
+def _newest(versions):
+    best = None
+    for version in versions:
+        try:
+            parsed = Version(version)
+        except InvalidVersion:
+            continue
+        if best is None or parsed > best[0]:
+            best = (parsed, version)
+    return best[1] if best else None
+
+
+def expected_seconds(probe):
+    """预计加载一个典型项目页面的时间 (秒)，无法估算时返回 None。"""
+    if probe.ttfb_seconds is None:
+        return None
+    if not probe.throughput:
+        return probe.ttfb_seconds
+    return probe.ttfb_seconds + TYPICAL_PAGE_BYTES / probe.throughput
+
+
+def is_usable(probe):
+    """候选是否可用：至少查到了一个示例项目的版本 (可能有部分请求出错，见 probe.error)。"""
+    return probe.ttfb_seconds is not None and bool(probe.latest)
+
+
+def rank_probes(probes):
+    """计算新鲜度并排名：不可用的排在最后，部分出错的排在全部成功的之后，
+    其次新鲜的项目多者在前，再次预计页面加载时间短者在前。"""
+    newest = {}
+    for pkg_name in {name for probe in probes for name in probe.latest}:
+        newest[pkg_name] = _newest(probe.latest[pkg_name] for probe in probes if pkg_name in probe.latest)
+    ranked = []
+    for probe in probes:
+        fresh = sum(1 for name, version in probe.latest.items() if version == newest.get(name))
+        ranked.append(probe._replace(fresh=fresh, checked=len(probe.latest)))
+
+    def key(probe):
+        return (not is_usable(probe), probe.error is not None, -probe.fresh, expected_seconds(probe) or 0.0)
+    return sorted(ranked, key=key)
+
+
+def probe_mirrors(candidates=None, packages=PROBE_PACKAGES, timeout=PROBE_TIMEOUT, max_workers=None, on_result=None):
+    """并行测速全部候选索引，返回排好序的 MirrorProbe 列表；on_result(probe) 在每个候选完成时调用。"""
+    candidates = [url.rstrip("/") for url in (candidates or MIRROR_CANDIDATES)]
+    scheduler = LookupScheduler(lambda url: _probe_one(url, packages, timeout),
+                                max_workers=max_workers or len(candidates) or 1)
+    probes = []
+    for url, probe, exception in scheduler.run(candidates):
+        if exception is not None:
+            probe = MirrorProbe(url, None, None, None, 0, {}, str(exception), 0, 0)
+        probes.append(probe)
+        if on_result:
+            on_result(probe)
+    return rank_probes(probes)
+
+
+def describe(probe):
+    """单行说明，用于日志与界面。"""
+    if not is_usable(probe):
+        return f"{probe.url}: 失败 ({probe.error})"
+    parts = [f"首字节 {probe.ttfb_seconds * 1000:.0f}毫秒 (首次连接 {probe.connect_seconds * 1000:.0f}毫秒)"]
+    if probe.throughput:
+        parts.append(f"{probe.throughput / 1024:.0f}KB/s")
+    parts.append(f"新鲜度 {probe.fresh}/{probe.checked}")
+    if probe.error:
+        parts.append(f"部分失败: {probe.error}")
+    return f"{probe.url}: " + "，".join(parts)
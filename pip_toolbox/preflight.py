@@ -0,0 +1,94 @@
+"""安装前的本地冲突预检。
+
+在启动 pip 之前，用内存中的依赖图检查每个计划安装的版本是否满足所有已安装依赖者声明的版本范围
+(Requires-Dist 中的说明符)，把会破坏依赖者的升级/降级提前标出，并从已缓存的版本列表中推荐
+满足全部约束的最高版本。只读取本地元数据 (按 mtime 缓存) 和内存缓存，不发起网络请求，
+因此每次点击安装或全部更新都可以运行。
+"""
+import time
+from collections import namedtuple
+
+from packaging.version import InvalidVersion, Version
+
+from pip_toolbox.depgraph import build_graph
+from pip_toolbox.tracing import span
+from pip_toolbox.versions import normalize_name
+
+# dependent 为依赖者的显示名，specifier 为它对 name 声明的版本范围
+Conflict = namedtuple("Conflict", "name version dependent dependent_version specifier")
+PreflightResult = namedtuple("PreflightResult", "conflicts suggestions seconds")
+
+
+def _parse(version):
+    try:
+        return Version(version)
+    except InvalidVersion:
+        return None
+
+
+def find_conflicts(graph, targets):
+    """targets 为 {包名: 计划安装的版本}，返回 Conflict 列表。
+
+    同样在计划中的依赖者会被替换为新版本，其新的依赖声明此时未知，因此不参与检查。
+    """
+    changing = {normalize_name(name) for name in targets}
+    conflicts = []
+    for name, version in targets.items():
+        parsed = _parse(version)
+        if parsed is None:
+            continue
+        for dependent, specifier in sorted(graph.requirements_on(name).items()):
+            if dependent in changing or not str(specifier):
+                continue
+            if not specifier.contains(parsed, prereleases=True):
+                conflicts.append(Conflict(name, version, graph.names[dependent],
+                                          graph.versions.get(dependent, ""), str(specifier)))
+    return conflicts
+
+
+def compatible_version(graph, name, versions, targets, allow_prereleases=False):
+    """从 versions (从新到旧) 中找出满足所有未在计划中的依赖者约束的最高版本，没有时返回 None。"""
+    changing = {normalize_name(n) for n in targets}
+    specifiers = [spec for dependent, spec in graph.requirements_on(name).items() if dependent not in changing]
+    for version in versions:
+        parsed = _parse(version)
+        if parsed is None or (parsed.is_prerelease and not allow_prereleases):
+            continue
+        if all(spec.contains(parsed, prereleases=True) for spec in specifiers):
+            return version
+    return None
+
+
+def preflight(targets, available_versions=None, graph=None):
+    """检查计划安装的 {包名: 版本}。
+
+    available_versions(name) 返回某个包可用的版本列表 (从新到旧) 或 None，用于推荐兼容版本；
+    suggestions 为 {有冲突的包名: 推荐版本或 None}。
+    """
+    start = time.perf_counter()
+    with span("preflight", targets=len(targets)) as s:
+        graph = graph or build_graph()
+        conflicts = find_conflicts(graph, targets)
+        suggestions = {}
+        for name in dict.fromkeys(c.name for c in conflicts):
+            versions = available_versions(name) if available_versions else None
+            planned = _parse(targets[name])
+            suggestions[name] = compatible_version(graph, name, versions or (), targets,
+                                                   allow_prereleases=bool(planned and planned.is_prerelease))
+        s.set(conflicts=len(conflicts))
+    return PreflightResult(conflicts, suggestions, time.perf_counter() - start)
+
+
+def format_conflicts(result, limit=10):
+    """冲突的说明文字 (每个冲突一行，超过 limit 个时省略其余部分)。"""
+    lines = []
+    for c in result.conflicts[:limit]:
+        lines.append(f"• {c.name}=={c.version} 不满足 {c.dependent} {c.dependent_version} 的要求 ({c.name}{c.specifier})")
+    if len(result.conflicts) > limit:
+        lines.append(f"… 另有 {len(result.conflicts) - limit} 个冲突")
+    for name, version in result.suggestions.items():
+        if version:
+            lines.append(f"→ {name} 满足所有依赖者的最高版本: {version}")
+        else:
+            lines.append(f"→ {name} 没有已知的满足所有依赖者的版本")
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+"""索引请求的自适应超时、带抖动的重试与按索引的断路器。
+
+- 超时：每个索引记录最近的请求耗时，样本足够后超时取 p99 × TIMEOUT_MULTIPLIER (限制在 MIN_TIMEOUT 与
+  DEFAULT_TIMEOUT 之间)，每次重试加倍；正常的索引很快就能发现卡住的请求，而不是每次都等满固定超时。
+- 重试：连接失败、超时、HTTP 429 与 5xx 视为暂时性错误，最多重试 MAX_RETRIES 次，等待时间为指数退避加全抖动。
+- 断路器：连续 FAILURE_THRESHOLD 次暂时性失败后打开，之后的请求立即失败 (CircuitOpenError)；冷却期过后放行
+  一个试探请求 (使用默认超时)，成功则关闭，失败则冷却期加倍。
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from pip_toolbox.index_client import IndexLookupError
+from pip_toolbox.tracing import percentile, span
+
+# --- 配置 ---
+DEFAULT_TIMEOUT = 15  # 样本不足时的超时 (秒)，与 SimpleIndexClient 的默认值相同
+MIN_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 4
+MIN_SAMPLES = 20  # 至少有这么多成功请求后才按耗时分布调整超时
+LATENCY_SAMPLES = 256
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.25  # 秒
+BACKOFF_CAP = 4.0
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 30  # 断路器打开后的冷却期 (秒)，试探失败时加倍
+OPEN_SECONDS_MAX = 300
+
+
+class CircuitOpenError(IndexLookupError):
+    """索引的断路器已打开，请求没有发出。"""
+
+
+def is_transient(error):
+    """是否为值得重试的暂时性错误 (连接失败、超时、HTTP 429 / 5xx)。"""
+    if error.not_found:
+        return False
+    return error.status is None or error.status == 429 or error.status >= 500
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """第 attempt 次重试 (从 0 开始) 之前的等待秒数：指数退避加全抖动，避免大量请求同时重试。"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class IndexHealth:
+    """一个索引的耗时分布与断路器状态 (线程安全)。"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, url, default_timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.default_timeout = default_timeout
+        self.state = self.CLOSED
+        self.failures = 0  # 连续暂时性失败次数
+        self.open_seconds = OPEN_SECONDS
+        self.opened_at = 0.0
+        self.trips = 0  # 断路器打开的次数
+        self.trip_failures = 0  # 最近一次打开断路器时的连续失败次数
+        self.rejected = 0  # 因断路器打开而直接失败的请求数
+        self.retries = 0
+        self._trial = False
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def adaptive_timeout(self):
+        """按最近成功请求的 p99 耗时计算的超时 (秒)。"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_SAMPLES:
+            return self.default_timeout
+        return min(self.default_timeout, max(MIN_TIMEOUT, percentile(samples, 99) * TIMEOUT_MULTIPLIER))
+
+    def request_timeout(self, attempt):
+        """第 attempt 次尝试使用的超时；试探请求使用默认超时，以免慢但可用的索引一直无法恢复。"""
+        if self.state == self.HALF_OPEN:
+            return self.default_timeout
+        return min(self.default_timeout, self.adaptive_timeout() * 2 ** attempt)
+
+    def allow(self):
+        """是否可以发出请求；打开状态下冷却期过后只放行一个试探请求。"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, seconds):
+        """索引给出了响应 (包括 404 等明确的答复)。"""
+        with self._lock:
+            self._latencies.append(seconds)
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self.open_seconds = OPEN_SECONDS
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.open_seconds = min(self.open_seconds * 2, OPEN_SECONDS_MAX)
+                self._open_locked()
+            elif self.state == self.CLOSED and self.failures >= FAILURE_THRESHOLD:
+                self._open_locked()
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def _open_locked(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self.trip_failures = self.failures
+
+    def describe(self):
+        state = {self.CLOSED: "正常", self.OPEN: "断路器打开", self.HALF_OPEN: "试探中"}[self.state]
+        return (f"{self.url}: {state}，超时 {self.adaptive_timeout():.1f}秒，重试 {self.retries} 次，"
+                f"断路 {self.trips} 次，快速失败 {self.rejected} 次")
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_health(url):
+    """返回索引 URL 的共享 IndexHealth。"""
+    key = url.rstrip("/")
+    with _health_lock:
+        health = _health.get(key)
+        if health is None:
+            health = _health[key] = IndexHealth(key)
+        return health
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+def health_summary(only_troubled=True):
+    """各索引状态的多行说明；only_troubled 时只包含出现过重试或断路的索引，没有时返回空字符串。"""
+    with _health_lock:
+        healths = list(_health.values())
+    lines = [h.describe() for h in healths
+             if not only_troubled or h.retries or h.trips or h.state != IndexHealth.CLOSED]
+    return ("索引健康:\n   " + "\n   ".join(lines)) if lines else ""
+
+
+def call_with_resilience(url, request):
+    """调用 request(timeout) 向 url 发出一次请求，按上述策略处理超时、重试与断路器。
+
+    request 失败时应抛出 IndexLookupError；最终失败时抛出最后一个错误，断路器打开时抛出 CircuitOpenError。
+    其他异常记为一次失败后原样抛出，不重试。
+    """
+    health = get_health(url)
+    for attempt in range(MAX_RETRIES + 1):
+        if not health.allow():
+            raise CircuitOpenError(f"索引 {health.url} 暂时不可用 (连续失败 {health.trip_failures} 次，已停止请求)")
+        timeout = health.request_timeout(attempt)
+        start = time.perf_counter()
+        try:
+            result = request(timeout)
+        except IndexLookupError as e:
+            if not is_transient(e):
+                health.record_success(time.perf_counter() - start)
+                raise
+            health.record_failure()
+            if attempt == MAX_RETRIES:
+                raise
+            health.record_retry()
+            delay = backoff_delay(attempt)
+            with span("index.retry", url=health.url, attempt=attempt + 1, timeout=round(timeout, 2)):
+                time.sleep(delay)
+            continue
+        except BaseException:
+            # 意外的异常也要记为失败，否则试探请求的名额 (_trial) 永远不会释放
+            health.record_failure()
+            raise
+        health.record_success(time.perf_counter() - start)
+        return result
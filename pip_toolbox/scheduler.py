@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pip_toolbox.config import get_worker_count
+
+
+class LookupScheduler:
+    """有界并发的查询调度器，结果按完成顺序返回，可中途暂停、继续或取消。"""
+
+    def __init__(self, lookup, max_workers=None):
+        self.lookup = lookup
+        self.max_workers = max_workers or get_worker_count()
+        self.cancel_event = threading.Event()
+        self.resume_event = threading.Event()  # 未设置时表示已暂停
+        self.resume_event.set()
+        self.elapsed = 0.0  # 不含暂停后等待继续的时间
+        self.paused_time = 0.0
+        self.busy_time = 0.0  # 所有查询耗时之和，约等于串行执行所需时间
+        self.completed = 0
+
+    def cancel(self):
+        """请求取消：不再提交新的查询，尚未开始的查询被丢弃。"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def pause(self):
+        """暂停：尚未开始的查询被撤回 (继续后重新提交)，已经开始的查询照常完成并产出结果。"""
+        self.resume_event.clear()
+
+    def resume(self):
+        self.resume_event.set()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    def _timed_lookup(self, item):
+        start = time.perf_counter()
+        try:
+            return self.lookup(item), None, time.perf_counter() - start
+        except Exception as e:
+            return None, e, time.perf_counter() - start
+
+    def run(self, items):
+        """逐个产出 (item, result, error)，顺序为完成顺序。"""
+        items = list(items)
+        start_time = time.perf_counter()
+        pending = {}
+        next_index = 0
+        withdrawn = []  # 暂停时撤回的查询，继续后优先提交
+        # 只保持有限数量的任务在途，这样取消时无需等待整个队列
+        max_in_flight = self.max_workers * 2
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lookup")
+        try:
+            while pending or ((withdrawn or next_index < len(items)) and not self.cancelled):
+                while not self.cancelled and not self.paused and (withdrawn or next_index < len(items)) and \
+                        len(pending) < max_in_flight:
+                    if withdrawn:
+                        item = withdrawn.pop(0)
+                    else:
+                        item = items[next_index]
+                        next_index += 1
+                    pending[executor.submit(self._timed_lookup, item)] = item
+                if not pending:
+                    if self.paused and not self.cancelled:
+                        # 定时醒来以便响应取消
+                        wait_start = time.perf_counter()
+                        self.resume_event.wait(0.2)
+                        self.paused_time += time.perf_counter() - wait_start
+                        continue
+                    break
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    result, error, duration = future.result()
+                    self.busy_time += duration
+                    self.completed += 1
+                    yield item, result, error
+                if self.cancelled or self.paused:
+                    for future in list(pending):
+                        if future.cancel():
+                            item = pending.pop(future)
+                            if not self.cancelled:
+                                withdrawn.append(item)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.elapsed = time.perf_counter() - start_time - self.paused_time
+
+    def summary(self):
+        """返回用于日志的耗时摘要（含与串行路径的对比）。"""
+        speedup = self.busy_time / self.elapsed if self.elapsed > 0 else 1.0
+        return (f"并发 {self.max_workers}，完成 {self.completed} 项，总耗时 {self.elapsed:.2f}秒，"
+                f"串行估计 {self.busy_time:.2f}秒，加速约 {speedup:.1f}x")
@@ -0,0 +1,85 @@
+"""包名搜索索引。
+
+名称按 PEP 503 规则规范化 ('-', '_', '.' 视为相同，忽略大小写)，查询按子串匹配：
+- 三个字符及以上的查询先用三元组 (trigram) 倒排索引求候选集，再逐个确认 (倒排表按需构建并缓存)；
+- 查询是上一次查询的延伸时 (继续输入)，只在上一次的结果中查找；
+- 可选的模糊匹配按子序列匹配 (如 'rqsts' 匹配 'requests')，排在子串匹配之后。
+"""
+import re
+
+from pip_toolbox.versions import normalize_name
+
+_NGRAM = 3
+
+
+def normalize_query(query):
+    """与名称使用相同的规范化，空白查询返回空字符串。"""
+    query = query.strip()
+    return normalize_name(query) if query else ""
+
+
+class SearchIndex:
+    """一组行 (第一列为包名) 上的搜索索引，结果为按原顺序排列的行下标。"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.names = [normalize_name(row[0]) for row in rows]
+        self._postings = {}  # 三元组 -> 行下标列表
+        self._last = None  # (查询, 模糊, 结果)，用于继续输入时缩小查找范围
+
+    def _posting(self, gram):
+        """包含三元组 gram 的行下标 (升序)；按需计算并缓存，避免一次性为所有名称建索引。"""
+        posting = self._postings.get(gram)
+        if posting is None:
+            posting = [i for i, name in enumerate(self.names) if gram in name]
+            self._postings[gram] = posting
+        return posting
+
+    def _candidates(self, query):
+        """可能包含 query 的行下标 (升序)。"""
+        if self._last and query.startswith(self._last[0]):
+            return self._last[2]  # 继续输入：结果只会是上一次结果的子集
+        if len(query) < _NGRAM:
+            return range(len(self.names))
+        # 首尾两个三元组足以把候选集缩小到很少，其余由子串确认
+        first = self._posting(query[:_NGRAM])
+        if len(query) == _NGRAM or not first:
+            return first
+        last = set(self._posting(query[-_NGRAM:]))
+        return [i for i in first if i in last]
+
+    def search(self, query, fuzzy=False):
+        """返回匹配行的下标列表；空查询返回全部行。"""
+        query = normalize_query(query)
+        if not query:
+            self._last = None
+            return list(range(len(self.rows)))
+        names = self.names
+        matches = [i for i in self._candidates(query) if query in names[i]]
+        if fuzzy and len(query) > 1:  # 单个字符的子序列匹配就是子串匹配
+            matches += self._fuzzy_matches(query, set(matches))
+        self._last = (query, fuzzy, matches)
+        return matches
+
+    def _fuzzy_matches(self, query, exclude):
+        """子序列匹配 (不含已精确匹配的行)，按匹配跨度从短到长排列。"""
+        pattern = re.compile(".*?".join(map(re.escape, query)))
+        scored = []
+        previous = self._last
+        if previous and previous[1] and query.startswith(previous[0]):
+            candidates = previous[2]
+        else:
+            candidates = range(len(self.names))
+        for index in candidates:
+            if index in exclude:
+                continue
+            m = pattern.search(self.names[index])
+            if m:
+                scored.append((m.end() - m.start(), index))
+        scored.sort()
+        return [index for _, index in scored]
+
+    def filter(self, query, fuzzy=False):
+        """返回匹配的行本身。"""
+        rows = self.rows
+        return [rows[i] for i in self.search(query, fuzzy)]
@@ -0,0 +1,216 @@
+"""已安装包的快照与离线回滚。
+
+每次安装或全部更新之前自动记录当前环境的包集合 (名称、版本、RECORD 文件的 SHA-256)，保存在用户缓存目录的
+snapshots/ 下。安装前后被改变的包的旧版本发行文件保留在 wheelhouse 中，因此回滚只需一次
+`pip install --no-index --no-deps` 事务 (之后新增的包再用一次 pip uninstall 移除)，不访问网络。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from pip_toolbox import config
+from pip_toolbox.disk_cache import user_cache_dir
+from pip_toolbox.inventory import scan_installed
+from pip_toolbox.tracing import span
+from pip_toolbox.versions import normalize_name
+
+MAX_SNAPSHOTS = 20  # 每个环境保留的快照数量
+
+# changed: [(包名, 快照中的版本, 当前版本)]；added / removed: [(包名, 版本)]，相对快照而言；
+# modified: [(包名, 版本)]，版本未变但安装文件清单不同 (例如同一版本被重新安装为另一个构建)
+SnapshotDiff = namedtuple("SnapshotDiff", "changed added removed modified")
+
+_hash_cache = {}  # RECORD 路径 -> ((mtime_ns, size), 摘要)
+_hash_lock = threading.Lock()
+
+
+def snapshots_dir():
+    return os.environ.get("PIP_TOOLBOX_SNAPSHOT_DIR") or os.path.join(user_cache_dir(), "snapshots")
+
+
+def record_file(entry_path):
+    """发行包的安装文件清单：.dist-info/RECORD 或 .egg-info/installed-files.txt。"""
+    if entry_path.endswith(".dist-info"):
+        return os.path.join(entry_path, "RECORD")
+    return os.path.join(entry_path, "installed-files.txt")
+
+
+def record_hash(entry_path):
+    """安装文件清单的 SHA-256 (按文件 mtime 与大小缓存)，没有清单时返回 None。"""
+    path = record_file(entry_path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    with _hash_lock:
+        cached = _hash_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+    with _hash_lock:
+        _hash_cache[path] = (key, digest)
+    return digest
+
+
+def capture(label, dists=None):
+    """记录当前环境 (或给定的 InstalledDist 列表) 的包集合，返回快照字典。"""
+    with span("snapshot.capture") as s:
+        dists = scan_installed() if dists is None else dists
+        packages = [{"name": dist.name, "version": dist.version, "record": record_hash(dist.path)} for dist in dists]
+        s.set(packages=len(packages))
+    now = time.time()
+    return {"id": time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1e6) % 1000000:06d}",
+            "created": now, "label": label, "python": config.target_python, "packages": packages}
+
+
+def save(snapshot):
+    """写入快照文件 (先写临时文件再替换)，并删除同一环境中超出 MAX_SNAPSHOTS 的旧快照。返回文件路径。"""
+    directory = snapshots_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{snapshot['id']}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    for old in list_snapshots(snapshot["python"])[MAX_SNAPSHOTS:]:
+        try:
+            os.remove(old["path"])
+        except OSError:
+            pass
+    return path
+
+
+def take_snapshot(label):
+    """capture + save；返回快照 (其 'path' 为文件路径)。"""
+    snapshot = capture(label)
+    snapshot["path"] = save(snapshot)
+    return snapshot
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    snapshot["path"] = path
+    return snapshot
+
+
+def list_snapshots(python=None):
+    """某个环境 (python 为 None 表示默认环境) 的快照，从新到旧排列。"""
+    directory = snapshots_dir()
+    try:
+        names = sorted((n for n in os.listdir(directory) if n.endswith(".json")), reverse=True)
+    except OSError:
+        return []
+    snapshots = []
+    for name in names:
+        try:
+            snapshot = load(os.path.join(directory, name))
+        except (OSError, ValueError):
+            continue
+        if snapshot.get("python") == python:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def diff(snapshot, dists=None):
+    """比较快照与当前环境；版本相同的包再比较安装文件清单的摘要 (快照或当前环境中没有清单时不比较)。"""
+    dists = scan_installed() if dists is None else dists
+    current = {normalize_name(dist.name): dist for dist in dists}
+    saved = {normalize_name(p["name"]): p for p in snapshot["packages"]}
+    changed, modified = [], []
+    for k in sorted(saved.keys() & current.keys()):
+        package, dist = saved[k], current[k]
+        if package["version"] != dist.version:
+            changed.append((package["name"], package["version"], dist.version))
+        elif package.get("record"):
+            digest = record_hash(dist.path)
+            if digest and digest != package["record"]:
+                modified.append((package["name"], package["version"]))
+    added = [(current[k].name, current[k].version) for k in sorted(current.keys() - saved.keys())]
+    removed = [(saved[k]["name"], saved[k]["version"]) for k in sorted(saved.keys() - current.keys())]
+    return SnapshotDiff(changed, added, removed, modified)
+
+
+def restore_targets(snapshot_diff):
+    """回滚需要安装的目标 ('name==version')。"""
+    return [f"{name}=={old}" for name, old, _ in snapshot_diff.changed] + \
+           [f"{name}=={version}" for name, version in snapshot_diff.removed] + \
+           [f"{name}=={version}" for name, version in snapshot_diff.modified]
+
+
+def replaced_targets(snapshot, targets):
+    """安装 targets ('name==version') 会替换掉的已安装版本 ('name==快照中的版本')。"""
+    installed = {normalize_name(p["name"]): p for p in snapshot["packages"]}
+    replaced = []
+    for target in targets:
+        package = installed.get(normalize_name(target.partition("==")[0]))
+        if package is not None and target.partition("==")[2] != package["version"]:
+            replaced.append(f"{package['name']}=={package['version']}")
+    return replaced
+
+
+def missing_wheels(targets):
+    """wheelhouse 中缺少发行文件的目标。"""
+    from pip_toolbox.wheelhouse import find_in_wheelhouse, wheelhouse_dir
+    try:
+        files = os.listdir(wheelhouse_dir())
+    except OSError:
+        files = []
+    return [target for target in targets if not find_in_wheelhouse(target, files)]
+
+
+def keep_old_wheels(snapshot, on_log=print):
+    """把快照之后被改变或移除的包的旧版本下载到 wheelhouse (已有的跳过)，以便之后离线回滚。"""
+    from pip_toolbox.wheelhouse import prefetch
+    targets = missing_wheels(restore_targets(diff(snapshot)))
+    if not targets:
+        return None
+    on_log(f"💾 为回滚保留 {len(targets)} 个旧版本的发行文件...")
+    result = prefetch(targets, on_log)
+    on_log(result.summary())
+    return result
+
+
+def rollback(snapshot, on_log=print):
+    """离线恢复到快照：一次 --no-index --no-deps 安装恢复版本，再卸载之后新增的包。返回是否成功。"""
+    from pip_toolbox.installer import run_pip_command
+    from pip_toolbox.wheelhouse import restore_command
+    snapshot_diff = diff(snapshot)
+    targets = restore_targets(snapshot_diff)
+    added = [name for name, _ in snapshot_diff.added]
+    if not targets and not added:
+        on_log("✅ 当前环境与快照一致，无需回滚。\n")
+        return True
+    missing = missing_wheels(targets)
+    if missing:
+        on_log(f"❌ wheelhouse 中缺少 {len(missing)} 个发行文件，无法离线回滚: {', '.join(missing)}\n")
+        return False
+    take_snapshot(f"回滚到 {snapshot['id']} 之前")
+    if targets:
+        command = restore_command(*targets)
+        on_log(f"⏳ 回滚 {len(targets)} 个包 (离线)...\n   命令: {' '.join(command)}\n")
+        output_log, success = run_pip_command(command, "回滚", on_log)
+        on_log(output_log)
+        if not success:
+            return False
+    if added:
+        command = config.pip_command("uninstall", "-y", *added)
+        on_log(f"⏳ 卸载快照之后新增的 {len(added)} 个包...\n   命令: {' '.join(command)}\n")
+        output_log, success = run_pip_command(command, "卸载新增的包", on_log)
+        on_log(output_log)
+        return success
+    return True
+
+
+def describe(snapshot):
+    """快照的单行说明：时间、标签与包数量。"""
+    created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["created"]))
+    return f"{created}  {snapshot['label']}  ({len(snapshot['packages'])} 个包)"
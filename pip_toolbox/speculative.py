@@ -0,0 +1,91 @@
+"""推测性的版本预取：在用户点击之前为可见行与选中行附近的包预热版本缓存。
+
+预取队列总是被最新一次请求整体替换 (滚动离开的行不再查询)，最多 SPECULATIVE_WORKERS 个查询同时进行；
+有用户发起的查询 (点击行、检查更新) 时不开始新的预取。预取与点击使用同一个版本缓存，
+用户点击一个正在预取的包时会直接等待这次查询 (single-flight)，不会重复请求。
+"""
+import contextlib
+import threading
+
+from pip_toolbox.config import SPECULATIVE_WORKERS
+from pip_toolbox.tracing import span
+
+
+class SpeculativePrefetcher:
+    """低优先级的后台预取器；load(name) 执行查询 (写入缓存)，is_cached(name) 判断是否已有缓存结果。"""
+
+    def __init__(self, load, is_cached, max_workers=SPECULATIVE_WORKERS):
+        self._load = load
+        self._is_cached = is_cached
+        self.max_workers = max(1, max_workers)
+        self._queue = []  # 待预取的名称，按优先级排列
+        self._foreground = 0  # 进行中的用户查询数
+        self._workers = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.fetched = 0
+        self.skipped = 0  # 轮到时已有缓存结果
+        self.dropped = 0  # 被新请求替换掉而没有查询的名称
+
+    def request(self, names):
+        """用 names (按优先级排列) 替换待预取队列。"""
+        queue, seen = [], set()
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                queue.append(name)
+        with self._cond:
+            self.dropped += sum(1 for name in self._queue if name not in seen)
+            self._queue = queue
+            while self._workers < min(self.max_workers, len(queue)):
+                self._workers += 1
+                threading.Thread(target=self._worker, name="speculative-prefetch", daemon=True).start()
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def foreground(self):
+        """用户发起的查询期间使用：预取线程不开始新的查询。"""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._queue = []
+            self._cond.notify_all()
+
+    def _next(self):
+        with self._cond:
+            while not self._closed and (not self._queue or self._foreground):
+                self._cond.wait()
+            if self._closed:
+                self._workers -= 1
+                return None
+            return self._queue.pop(0)
+
+    def _worker(self):
+        while True:
+            name = self._next()
+            if name is None:
+                return
+            if self._is_cached(name):
+                with self._cond:
+                    self.skipped += 1
+                continue
+            try:
+                with span("speculative.prefetch", pkg=name):
+                    self._load(name)
+            except Exception as e:
+                print(f"预取 {name} 的版本出错: {e}")
+            with self._cond:
+                self.fetched += 1
+
+    def summary(self):
+        with self._cond:
+            return f"推测预取: 查询 {self.fetched}，已缓存跳过 {self.skipped}，滚动离开丢弃 {self.dropped}"
@@ -0,0 +1,295 @@
+"""虚拟化的包表格。
+
+完整数据保存在内存列表中，Treeview 只为可见窗口加少量缓冲行创建条目；滚动时复用这些条目、
+改写其内容，因此渲染耗时和控件内存只与窗口高度有关，与包的数量无关。
+"""
+import time
+from tkinter import ttk
+
+from pip_toolbox.tracing import span
+
+# --- 配置 ---
+BUFFER_ROWS = 2  # 可见行之外额外创建的行数 (覆盖底部半行与窗口高度变化)
+WHEEL_ROWS = 3  # 鼠标滚轮每格滚动的行数
+DEFAULT_ROW_HEIGHT = 20  # 尚未测得行高时使用的估计值
+DEFAULT_HEADER_HEIGHT = 25
+
+
+class TableWindow:
+    """表格的数据与滚动状态 (不依赖 Tk)：完整行列表、第一个可见行、可见行数与选中行。"""
+
+    def __init__(self, buffer=BUFFER_ROWS):
+        self.rows = []
+        self.offset = 0  # 第一个可见行在 rows 中的下标
+        self.visible = 1  # 窗口能完整显示的行数
+        self.buffer = buffer
+        self.selected = None  # 选中行在 rows 中的下标
+
+    def set_rows(self, rows, keep_selection=False):
+        """替换全部数据并回到顶部；keep_selection 为 True 时，若选中行仍在新数据中则保持选中。"""
+        previous = self.selected_row() if keep_selection else None
+        self.rows = rows if isinstance(rows, list) else list(rows)
+        self.offset = 0
+        self.selected = None
+        if previous is not None:
+            try:
+                self.selected = self.rows.index(previous)
+            except ValueError:
+                pass
+            else:
+                self.ensure_visible(self.selected)
+
+    def window(self):
+        """需要在 Treeview 中显示的行下标范围。"""
+        return range(self.offset, min(len(self.rows), self.offset + self.visible + self.buffer))
+
+    def max_offset(self):
+        return max(0, len(self.rows) - self.visible)
+
+    def scroll_to(self, offset):
+        """滚动到指定行；返回可见窗口是否发生变化。"""
+        offset = max(0, min(int(offset), self.max_offset()))
+        changed = offset != self.offset
+        self.offset = offset
+        return changed
+
+    def scroll_by(self, rows):
+        return self.scroll_to(self.offset + rows)
+
+    def moveto(self, fraction):
+        return self.scroll_to(round(float(fraction) * len(self.rows)))
+
+    def ensure_visible(self, index):
+        if index < self.offset:
+            return self.scroll_to(index)
+        if index >= self.offset + self.visible:
+            return self.scroll_to(index - self.visible + 1)
+        return False
+
+    def fractions(self):
+        """滚动条位置 (first, last)。"""
+        total = len(self.rows)
+        if not total:
+            return 0.0, 1.0
+        return self.offset / total, min(1.0, (self.offset + self.visible) / total)
+
+    def selected_row(self):
+        if self.selected is None or self.selected >= len(self.rows):
+            return None
+        return self.rows[self.selected]
+
+    def nearby(self, radius):
+        """预取顺序的行下标：选中行上下 radius 行 (由近到远，选中行在窗口内时)，然后是可见窗口，最后是窗口上下 radius 行。"""
+        total = len(self.rows)
+        window = self.window()
+        order = []
+        if self.selected is not None and self.selected in window:
+            for distance in range(1, radius + 1):
+                order += [i for i in (self.selected + distance, self.selected - distance) if 0 <= i < total]
+        order += window
+        order += range(window.stop, min(total, window.stop + radius))
+        order += range(max(0, window.start - radius), window.start)
+        seen = set()
+        return [i for i in order if not (i in seen or seen.add(i))]
+
+
+class VirtualTreeview:
+    """只为可见窗口创建条目的 Treeview 包装。
+
+    选中状态按数据下标记录：选中行滚出窗口后仍然保留，滚回来时重新选中。
+    on_select 在选中的数据行变化时调用，on_view_change 在可见窗口滚动或尺寸变化后调用。
+    """
+
+    def __init__(self, parent, columns, buffer=BUFFER_ROWS, on_select=None, on_view_change=None):
+        self.model = TableWindow(buffer)
+        self.on_select = on_select
+        self.on_view_change = on_view_change
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.tree.configure(yscrollcommand=self._on_tree_scrolled)
+        self._item_ids = []  # 复用的 Treeview 条目，依次对应 model.window()
+        self._shown = []  # 各条目当前显示的值，只改写发生变化的条目
+        self._row_top = DEFAULT_HEADER_HEIGHT
+        self._row_height = DEFAULT_ROW_HEIGHT
+        self.last_render_seconds = 0.0
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_configure)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+        for sequence in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            self.tree.bind(sequence, self._on_key)
+
+    @property
+    def rows(self):
+        return self.model.rows
+
+    def set_rows(self, rows, keep_selection=False):
+        """替换表格数据；只重新渲染可见窗口中内容变化的条目。"""
+        previous = self.model.selected_row()
+        self.model.set_rows(rows, keep_selection)
+        self.render()
+        if previous is not None and self.model.selected_row() != previous and self.on_select:
+            self.on_select()
+
+    def selected_row(self):
+        """返回选中行的数据 (如 (包名, 版本))，没有选中时返回 None。"""
+        return self.model.selected_row()
+
+    def item_id(self, index):
+        """数据行对应的 Treeview 条目；不在窗口内时返回 None。"""
+        position = index - self.model.offset
+        if 0 <= position < len(self._item_ids):
+            return self._item_ids[position]
+        return None
+
+    def selected_bbox(self, column):
+        """选中行指定列的位置 (x, y, width, height)；不可见时返回 None。"""
+        if self.model.selected is None:
+            return None
+        item_id = self.item_id(self.model.selected)
+        if item_id is None or self.model.selected >= self.model.offset + self.model.visible:
+            return None
+        return self.tree.bbox(item_id, column=column) or None
+
+    def select(self, index):
+        """选中数据行并滚动到可见位置。"""
+        if not self.model.rows:
+            return
+        index = max(0, min(index, len(self.model.rows) - 1))
+        changed = index != self.model.selected
+        self.model.selected = index
+        self.model.ensure_visible(index)
+        self.render()
+        item_id = self.item_id(index)
+        if item_id is not None:
+            self.tree.focus(item_id)
+        if changed and self.on_select:
+            self.on_select()
+
+    def render(self):
+        """把 model.window() 中的行写入复用的条目。"""
+        start = time.perf_counter()
+        model = self.model
+        indexes = model.window()
+        item_ids, shown = self._item_ids, self._shown
+        with span("table.render", rows=len(model.rows)) as s:
+            while len(item_ids) > len(indexes):
+                self.tree.delete(item_ids.pop())
+                shown.pop()
+            changed = 0
+            for position, index in enumerate(indexes):
+                values = model.rows[index]
+                if position == len(item_ids):
+                    item_ids.append(self.tree.insert("", "end", values=values))
+                    shown.append(values)
+                    changed += 1
+                elif shown[position] != values:
+                    self.tree.item(item_ids[position], values=values)
+                    shown[position] = values
+                    changed += 1
+            self._sync_selection()
+            if self.tree.yview()[0] > 0:
+                self.tree.yview_moveto(0)
+            self.scrollbar.set(*model.fractions())
+            s.set(changed=changed)
+        self.last_render_seconds = time.perf_counter() - start
+        if self.on_view_change:
+            self.on_view_change()
+
+    def _sync_selection(self):
+        selected = self.model.selected
+        item_id = self.item_id(selected) if selected is not None else None
+        current = self.tree.selection()
+        if item_id is not None:
+            if tuple(current) != (item_id,):
+                self.tree.selection_set(item_id)
+        elif current:
+            self.tree.selection_remove(*current)
+
+    def _measure_visible(self):
+        """根据控件高度和实际行高计算可完整显示的行数。"""
+        if self._item_ids:
+            bbox = self.tree.bbox(self._item_ids[0])
+            if bbox:
+                self._row_top, self._row_height = bbox[1], max(1, bbox[3])
+        return max(1, (self.tree.winfo_height() - self._row_top) // self._row_height)
+
+    def yview(self, *args):
+        """滚动条命令：按数据行滚动，而不是滚动 Treeview 自身。"""
+        if not args:
+            return self.model.fractions()
+        if args[0] == "moveto":
+            changed = self.model.moveto(args[1])
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.model.visible
+            changed = self.model.scroll_by(amount)
+        else:
+            return None
+        if changed:
+            self.render()
+        return None
+
+    def _on_configure(self, event=None):
+        rendered = False
+        for _ in range(2):  # 第一次渲染后才能测得真实行高
+            visible = self._measure_visible()
+            if visible == self.model.visible:
+                break
+            self.model.visible = visible
+            self.model.scroll_to(self.model.offset)
+            self.render()
+            rendered = True
+        if not rendered and self.on_view_change:
+            self.on_view_change()
+
+    def _on_tree_scrolled(self, first, last):
+        # Treeview 自身被滚动 (例如 see() 或拖动选择) 时，换算成数据行偏移并复位
+        first = float(first)
+        if first > 0 and self._item_ids:
+            shift = round(first * len(self._item_ids))
+            self.tree.yview_moveto(0)
+            if self.model.scroll_by(shift):
+                self.render()
+
+    def _on_tree_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return  # 选中行滚出窗口时由 _sync_selection 清除，数据上仍保持选中
+        try:
+            index = self.model.offset + self._item_ids.index(selection[0])
+        except ValueError:
+            return
+        if index < len(self.model.rows) and index != self.model.selected:
+            self.model.selected = index
+            if self.on_select:
+                self.on_select()
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            rows = -WHEEL_ROWS
+        elif event.num == 5:
+            rows = WHEEL_ROWS
+        elif abs(event.delta) >= 120:  # Windows: 每格 120
+            rows = -(event.delta // 120) * WHEEL_ROWS
+        else:  # macOS: delta 为较小的整数
+            rows = -event.delta
+        if self.model.scroll_by(rows):
+            self.render()
+        return "break"
+
+    def _on_key(self, event):
+        model = self.model
+        if not model.rows:
+            return "break"
+        current = model.selected if model.selected is not None else model.offset - 1
+        if event.keysym == "Home":
+            target = 0
+        elif event.keysym == "End":
+            target = len(model.rows) - 1
+        else:
+            step = {"Up": -1, "Down": 1, "Prior": -model.visible, "Next": model.visible}[event.keysym]
+            target = current + step
+        self.select(target)
+        return "break"
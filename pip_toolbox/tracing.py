@@ -0,0 +1,181 @@
+"""轻量的耗时追踪 (span)。
+
+默认关闭，此时 span() 返回一个共享的空上下文，开销可以忽略。设置环境变量 PIP_TOOLBOX_TRACE=<文件.json>
+(或命令行参数 --trace) 后开启：记录各阶段 (子进程启动、网络请求、解析、缓存、表格渲染等) 的耗时，
+进程退出时导出为 Chrome trace-event JSON (可在 chrome://tracing 或 https://ui.perfetto.dev 中打开)，
+并在 stderr 打印按阶段汇总的百分位数表。
+
+    with span("http.request", host=host) as s:
+        ...
+        s.set(status=status)
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+MAX_EVENTS = 200000  # 记录的 span 上限，超出后只计数不再记录，避免长时间运行时内存增长
+PERCENTILES = (50, 90, 99)
+
+
+class _NullSpan:
+    """追踪关闭时使用的空 span。"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """一个计时区间；退出时把 (名称, 开始时间, 耗时, 线程, 参数) 交给 Tracer 记录。"""
+
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+    def set(self, **args):
+        """补充 span 的参数 (如状态码、缓存是否命中)。"""
+        self.args.update(args)
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数；sorted_values 须已升序排列。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))  # 向上取整
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Tracer:
+    """线程安全的 span 记录器。"""
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.events = []  # (名称, 开始时间, 耗时, 线程 id, 参数)
+        self.dropped = 0
+        self._threads = {}  # 线程 id -> 线程名
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._finish_registered = False
+
+    def enable(self, path=None):
+        """开启追踪；path 为导出文件，进程退出时自动导出并打印摘要。"""
+        self.enabled = True
+        self.path = path or self.path
+        if not self._finish_registered:
+            atexit.register(self.finish)
+            self._finish_registered = True
+
+    def span(self, name, **args):
+        return Span(self, name, args) if self.enabled else _NULL_SPAN
+
+    def record(self, name, start, duration, args=None):
+        tid = threading.get_ident()
+        with self._lock:
+            if len(self.events) >= MAX_EVENTS:
+                self.dropped += 1
+                return
+            self.events.append((name, start, duration, tid, args or {}))
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+
+    def durations(self):
+        """返回 {名称: 升序排列的耗时列表}。"""
+        with self._lock:
+            events = list(self.events)
+        grouped = {}
+        for name, _, duration, _, _ in events:
+            grouped.setdefault(name, []).append(duration)
+        for values in grouped.values():
+            values.sort()
+        return grouped
+
+    def summary(self):
+        """按总耗时从高到低排列的百分位数表 (毫秒)。"""
+        grouped = self.durations()
+        if not grouped:
+            return "追踪: 没有记录到任何 span。"
+        header = f"{'阶段':28} {'次数':>7} {'总计':>10}" + "".join(f" {'p' + str(p):>9}" for p in PERCENTILES) + f" {'最大':>9}"
+        lines = [header]
+        for name, values in sorted(grouped.items(), key=lambda item: -sum(item[1])):
+            row = f"{name:28} {len(values):>7} {sum(values) * 1000:10.1f}"
+            row += "".join(f" {percentile(values, p) * 1000:9.2f}" for p in PERCENTILES)
+            lines.append(row + f" {values[-1] * 1000:9.2f}")
+        if self.dropped:
+            lines.append(f"(超出 {MAX_EVENTS} 个 span 的上限，另有 {self.dropped} 个未记录)")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """返回 Chrome trace-event 格式的字典 (时间单位为微秒)。"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in threads.items()]
+        for name, start, duration, tid, args in events:
+            trace_events.append({"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+                                 "ts": round((start - self._origin) * 1e6, 1), "dur": round(duration * 1e6, 1),
+                                 "args": {k: str(v) for k, v in args.items()}})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path=None):
+        """把记录写入 Chrome trace JSON 文件，返回文件路径。"""
+        import json
+        path = path or self.path
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        return path
+
+    def finish(self):
+        """导出追踪文件并在 stderr 打印摘要 (进程退出时自动调用)。"""
+        if not self.enabled or not self.events:
+            return
+        print(self.summary(), file=sys.stderr)
+        if self.path:
+            try:
+                print(f"追踪已导出到 {self.export_chrome_trace()}", file=sys.stderr)
+            except OSError as e:
+                print(f"导出追踪失败: {e}", file=sys.stderr)
+
+
+tracer = Tracer()
+
+
+def span(name, **args):
+    """开始一个 span (用作 with 语句)；追踪关闭时几乎没有开销。"""
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return Span(tracer, name, args)
+
+
+def enable(path=None):
+    tracer.enable(path)
+
+
+if os.environ.get("PIP_TOOLBOX_TRACE"):
+    enable(os.environ["PIP_TOOLBOX_TRACE"])
@@ -0,0 +1,80 @@
+"""工作线程 → 界面线程的事件总线。
+
+Tk 控件只能在界面线程中访问。工作线程不直接调用 root.after 或控件方法，而是把类型化的事件投递到
+EventBus；界面线程按固定频率调用 dispatch() 取出并处理。进度类事件按通道合并，只保留最新的一个，
+因此无论结果到达得多快，每个刷新周期每个通道最多处理一次进度。
+"""
+import threading
+from collections import deque, namedtuple
+
+# --- 事件类型 ---
+Call = namedtuple("Call", "func args")  # 在界面线程中调用 func(*args)
+Progress = namedtuple("Progress", "channel done total current suffix")  # 可合并的进度
+# error 不为 None 时 values 只包含这条说明，组合框中没有可安装的版本
+VersionsLoaded = namedtuple("VersionsLoaded", "pkg_name target values selected error")  # 版本列表已就绪
+
+MAX_EVENTS_PER_DISPATCH = 500  # 每次 dispatch 最多处理的有序事件数，其余留到下一次，避免界面卡顿
+
+
+class EventBus:
+    """线程安全的事件队列：post() 保证顺序，post_latest() 按通道只保留最新事件。"""
+
+    def __init__(self):
+        self._queue = deque()
+        self._latest = {}  # 通道 -> 最新事件
+        self._lock = threading.Lock()
+        self._handlers = {Call: lambda event: event.func(*event.args)}
+        self.posted = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.max_backlog = 0
+
+    def subscribe(self, event_type, handler):
+        """注册某一事件类型的处理函数 (在界面线程中调用)。"""
+        self._handlers[event_type] = handler
+
+    def post(self, event):
+        with self._lock:
+            self._queue.append(event)
+            self.posted += 1
+            self.max_backlog = max(self.max_backlog, len(self._queue))
+
+    def post_latest(self, channel, event):
+        """投递可合并的事件：同一通道中尚未处理的旧事件被替换。"""
+        with self._lock:
+            if channel in self._latest:
+                self.coalesced += 1
+            self._latest[channel] = event
+            self.posted += 1
+
+    def call(self, func, *args):
+        """在界面线程中调用 func(*args)，代替 root.after(0, func, *args)。"""
+        self.post(Call(func, args))
+
+    def drain(self, max_events=MAX_EVENTS_PER_DISPATCH):
+        """取出待处理的事件：先是合并后的进度，再是按投递顺序的事件。"""
+        with self._lock:
+            events = list(self._latest.values())
+            self._latest.clear()
+            for _ in range(min(max_events, len(self._queue))):
+                events.append(self._queue.popleft())
+        return events
+
+    def dispatch(self, max_events=MAX_EVENTS_PER_DISPATCH):
+        """在界面线程中处理待处理的事件，返回处理的数量。处理函数的异常被打印，不影响其余事件。"""
+        events = self.drain(max_events)
+        for event in events:
+            handler = self._handlers.get(type(event))
+            if handler is None:
+                print(f"警告: 没有处理 {type(event).__name__} 事件的函数。")
+                continue
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"处理界面事件 {type(event).__name__} 出错: {e}")
+        self.dispatched += len(events)
+        return len(events)
+
+    def summary(self):
+        return (f"界面事件: 投递 {self.posted}，合并 {self.coalesced}，处理 {self.dispatched}，"
+                f"最大积压 {self.max_backlog}")
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# --- 配置 ---
+DEFAULT_TTL = 300  # 成功结果的有效期 (秒)
+DEFAULT_NEGATIVE_TTL = 60  # 失败结果的有效期 (秒)，较短以便尽快重试
+DEFAULT_MAX_ENTRIES = 4096
+
+# error 不为 None 表示查询失败，此时 versions 为空列表；not_found 为 True 表示索引明确答复没有该项目；
+# source 为给出结果的索引 URL (对冲查询时可能是备用索引)，未知时为 None
+CachedLookup = namedtuple("CachedLookup", "versions error not_found source", defaults=(False, None))
+
+
+class _Flight:
+    """一个正在进行的查询，其它请求相同键的线程等待它的结果。"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class VersionCache:
+    """线程安全的内存版本缓存。
+
+    - 同一个键同时只会执行一次加载 (single-flight)，其余调用者共享结果；
+    - 成功与失败结果使用不同的有效期；
+    - 条目数量超过上限时按最近最少使用 (LRU) 淘汰。
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # 键 -> (CachedLookup, 过期时间)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evictions = 0
+
+    def peek(self, key):
+        """返回未过期的缓存结果 (不触发加载)，没有时返回 None。"""
+        with self._lock:
+            return self._lookup_locked(key)
+
+    def _lookup_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        result, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def get(self, key, loader):
+        """返回键对应的结果；缓存未命中时调用 loader() 加载。
+
+        loader 返回版本列表 (或已带有来源等信息的 CachedLookup)；抛出的异常被记录为失败结果
+        (error 为异常消息，not_found 与 source 取自异常的同名属性)。
+        """
+        with self._lock:
+            result = self._lookup_locked(key)
+            if result is not None:
+                self.hits += 1
+                return result
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.deduplicated += 1
+                owner = False
+            else:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                owner = True
+        if not owner:
+            flight.done.wait()
+            return flight.result
+        try:
+            try:
+                loaded = loader()
+                result = loaded if isinstance(loaded, CachedLookup) else CachedLookup(list(loaded), None)
+            except Exception as e:
+                result = CachedLookup([], str(e) or e.__class__.__name__, getattr(e, "not_found", False),
+                                      getattr(e, "source", None))
+            self.put(key, result)
+            flight.result = result
+        finally:
+            if flight.result is None:
+                flight.result = CachedLookup([], "查询被中断")
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return result
+
+    def put(self, key, result):
+        """写入一个结果，按结果是否成功选择有效期。"""
+        ttl = self.negative_ttl if result.error else self.ttl
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """删除一个键，或在 key 为 None 时清空缓存。"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """返回命中、未命中、合并请求和淘汰计数。"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "deduplicated": self.deduplicated,
+                    "evictions": self.evictions, "entries": len(self._entries)}
+
+    def summary(self):
+        s = self.stats()
+        return (f"版本缓存: 命中 {s['hits']}，未命中 {s['misses']}，合并重复请求 {s['deduplicated']}，"
+                f"淘汰 {s['evictions']}，条目 {s['entries']}")
@@ -0,0 +1,57 @@
+import re
+
+from packaging.version import Version, InvalidVersion
+
+# --- 版本类型 ---
+# post 版本 (1.0.post1) 视为正式版本
+VERSION_KINDS = ("final", "rc", "b", "a", "dev")
+KIND_LABELS = {"final": "正式版", "rc": "rc", "b": "beta", "a": "alpha", "dev": "dev"}
+DEFAULT_VERSION_KINDS = ("final", "rc")
+
+# 界面中的版本类型筛选选项 -> 包含的类型
+VERSION_KIND_FILTERS = {
+    "正式版与 rc": ("final", "rc"),
+    "仅正式版": ("final",),
+    "全部 (含 a/b/dev)": VERSION_KINDS,
+}
+
+
+def normalize_name(name):
+    """按 PEP 503 规范化项目名称。"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def version_kind(version_str):
+    """返回版本的类型: final / rc / b / a / dev；无法解析时返回 None。"""
+    try:
+        v = Version(version_str)
+    except InvalidVersion:
+        return None
+    if v.is_devrelease:
+        return "dev"
+    if v.pre is not None:
+        return v.pre[0]
+    return "final"
+
+
+def tag_versions(version_strings):
+    """为版本列表中的每个版本标注类型，返回 [(版本, 类型)]，保持原顺序。"""
+    tagged = []
+    for v_str in version_strings:
+        kind = version_kind(v_str)
+        if kind:
+            tagged.append((v_str, kind))
+    return tagged
+
+
+def filter_versions(version_strings, kinds=DEFAULT_VERSION_KINDS):
+    """只保留属于给定类型的版本。"""
+    return [v for v, kind in tag_versions(version_strings) if kind in kinds]
+
+
+def latest_version(version_strings, kinds=DEFAULT_VERSION_KINDS):
+    """返回 (已按从新到旧排序的) 列表中属于给定类型的最新版本。"""
+    for v, kind in tag_versions(version_strings):
+        if kind in kinds:
+            return v
+    return None
@@ -0,0 +1,122 @@
+import os
+import subprocess
+
+from pip_toolbox.config import PIP_TIMEOUT, DOWNLOAD_WORKERS, pip_command
+from pip_toolbox.disk_cache import user_cache_dir
+from pip_toolbox.scheduler import LookupScheduler
+from pip_toolbox.tracing import span
+from pip_toolbox.versions import normalize_name
+
+
+def wheelhouse_dir():
+    """本地 wheelhouse 目录，下载的发行文件保留在这里供之后重装或回滚使用。"""
+    path = os.environ.get("PIP_TOOLBOX_WHEELHOUSE") or os.path.join(user_cache_dir(), "wheelhouse")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def download_command(target, dest):
+    """只下载目标本身 (不含依赖)，以便多个下载并行进行。"""
+    return pip_command("download", "--no-deps", "--dest", dest, target)
+
+
+def offline_install_command(*targets, dest=None):
+    """只从 wheelhouse 安装，不访问索引。"""
+    return pip_command("install", "--upgrade", "--no-index", "--find-links", dest or wheelhouse_dir(), *targets)
+
+
+def online_install_command(*targets, dest=None):
+    """可以访问索引 (用于 wheelhouse 中缺少新依赖的情况)，但仍优先查找 wheelhouse。"""
+    return pip_command("install", "--upgrade", "--find-links", dest or wheelhouse_dir(), *targets)
+
+
+def restore_command(*targets, dest=None):
+    """只从 wheelhouse 安装且不解析依赖，用于把环境恢复到快照中的确切版本。
+
+    使用 --force-reinstall，版本未变但内容被替换的包也会重新安装。
+    """
+    return pip_command("install", "--no-index", "--no-deps", "--force-reinstall", "--find-links",
+                       dest or wheelhouse_dir(), *targets)
+
+
+def _file_sizes(directory):
+    sizes = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    sizes[entry.name] = entry.stat().st_size
+    except OSError:
+        pass
+    return sizes
+
+
+class PrefetchResult:
+    """一次预下载的结果与吞吐统计。"""
+
+    def __init__(self, downloaded, failed, new_files, new_bytes, seconds, workers, busy_seconds=0.0):
+        self.downloaded = downloaded  # 成功的目标 (已在 wheelhouse 中)
+        self.failed = failed  # [(目标, 错误信息)]
+        self.new_files = new_files
+        self.new_bytes = new_bytes
+        self.seconds = seconds
+        self.workers = workers
+        self.busy_seconds = busy_seconds  # 各下载耗时之和，约等于串行下载所需时间
+
+    def summary(self):
+        megabytes = self.new_bytes / (1024 * 1024)
+        rate = megabytes / self.seconds if self.seconds > 0 else 0.0
+        reused = len(self.downloaded) - self.new_files
+        return (f"📦 预下载完成: {len(self.downloaded)} 个成功，{len(self.failed)} 个失败；"
+                f"新下载 {self.new_files} 个文件 {megabytes:.1f}MB，用时 {self.seconds:.1f}秒 "
+                f"({rate:.2f}MB/s，并发 {self.workers})，复用 wheelhouse 中已有文件 {max(reused, 0)} 个。")
+
+
+def find_in_wheelhouse(target, file_names):
+    """若 wheelhouse 中已有 'name==version' 对应的发行文件则返回文件名，否则返回 None。"""
+    from pip_toolbox.index_client import version_from_filename
+    name, sep, version = target.partition("==")
+    if not sep:
+        return None
+    for file_name in file_names:
+        if version_from_filename(file_name, name) == version and \
+                normalize_name(file_name).startswith(normalize_name(name) + "-"):
+            return file_name
+    return None
+
+
+def _download_one(target, dest, existing=()):
+    if find_in_wheelhouse(target, existing):
+        return None
+    try:
+        with span("pip.download", target=target):
+            result = subprocess.run(download_command(target, dest), capture_output=True, text=True,
+                                    encoding='utf-8', errors='replace', timeout=PIP_TIMEOUT,
+                                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+    except subprocess.TimeoutExpired:
+        return "下载超时"
+    if result.returncode != 0:
+        lines = (result.stderr or result.stdout).strip().splitlines()
+        return lines[-1] if lines else f"pip download 失败 (Code: {result.returncode})"
+    return None
+
+
+def prefetch(targets, on_log=print, workers=None, dest=None):
+    """并行把目标 (如 'pkg==1.0') 下载到 wheelhouse，返回 PrefetchResult。"""
+    dest = dest or wheelhouse_dir()
+    before = _file_sizes(dest)
+    scheduler = LookupScheduler(lambda target: _download_one(target, dest, before),
+                                max_workers=workers or DOWNLOAD_WORKERS)
+    on_log(f"⏳ 预下载 {len(targets)} 个目标到 {dest} (并发 {scheduler.max_workers})...")
+    downloaded, failed = [], []
+    for target, error, exception in scheduler.run(targets):
+        error = error or (str(exception) if exception else None)
+        if error:
+            failed.append((target, error))
+            on_log(f"⚠️ 预下载 {target} 失败: {error}")
+        else:
+            downloaded.append(target)
+    after = _file_sizes(dest)
+    new_names = [name for name in after if before.get(name) != after[name]]
+    return PrefetchResult(downloaded, failed, len(new_names), sum(after[n] for n in new_names),
+                          scheduler.elapsed, scheduler.max_workers, scheduler.busy_time)
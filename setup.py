@@ -17,7 +17,7 @@ setup(
     ],
     entry_points={
         "console_scripts": [
-            "pip-toolbox=pip_toolbox.main:main",
+            "pip-toolbox=pip_toolbox.cli:main",
         ],
     },
 )
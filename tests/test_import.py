@@ -0,0 +1,19 @@
+"""导入耗时预算与无界面导入的回归测试 (见 pip_toolbox.bench 的 import-time 子命令)。"""
+import subprocess
+import sys
+
+import pytest
+
+from pip_toolbox.bench import HEADLESS_MODULES, check_import_budget
+
+
+@pytest.mark.parametrize("module", HEADLESS_MODULES)
+def test_core_modules_do_not_import_tkinter(module):
+    code = f"import sys, {module}; print('tkinter' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_import_budget():
+    violations = [(module, seconds, problem) for module, seconds, _, problem in check_import_budget() if problem]
+    assert violations == []